@@ -0,0 +1,73 @@
+"""Compare the per-frame cost of annotating frames, old approach vs. the Annotator.
+
+The "old" approach mirrors what TimestampedVideoEncoder used to do after every frame: format
+`datetime.now()` and push the text to the camera. The Annotator only formats the time once per
+second and only pushes when the text changes. Pushing to MMAL can't be measured off the Pi, so
+its cost is emulated with a busy-wait of --push-us microseconds:
+
+    $ python -m benchmarks.annotation --seconds 60 --framerate 30 --push-us 100
+"""
+
+import argparse
+import datetime
+import time
+
+from src.annotate import Annotator
+from src.enums import AnnotateField
+
+
+def _push(push_us: float):
+    def push(text: str) -> None:
+        deadline = time.perf_counter_ns() + push_us * 1_000
+        while time.perf_counter_ns() < deadline:
+            pass
+
+    return push
+
+
+def _old(frames: int, push) -> None:
+    for _ in range(frames):
+        text = f"camera - {datetime.datetime.now():%d/%m/%Y %H:%M:%S}"
+        push(text)
+
+
+def _annotator(frames: int, framerate: int, push, fields) -> Annotator:
+    annotator = Annotator(push, camera_name="camera", fields=fields)
+    # frames are timestamped as if they were produced in real time
+    start = time.time()
+    for i in range(frames):
+        annotator.frame_end(start + i / framerate)
+    return annotator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=60, help="length of video to annotate")
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--push-us", type=float, default=100, help="emulated cost of a push")
+    args = parser.parse_args()
+
+    frames = args.seconds * args.framerate
+    push = _push(args.push_us)
+
+    start = time.perf_counter_ns()
+    _old(frames, push)
+    old_ns = (time.perf_counter_ns() - start) / frames
+    print(f"{'old':>16}: {old_ns / 1_000:7.2f}μs/frame, {frames} pushes")
+
+    for name, fields in [
+        ("name+time", [AnnotateField.NAME, AnnotateField.TIME]),
+        ("name+time+fps", [AnnotateField.NAME, AnnotateField.TIME, AnnotateField.FPS]),
+    ]:
+        start = time.perf_counter_ns()
+        annotator = _annotator(frames, args.framerate, push, fields)
+        new_ns = (time.perf_counter_ns() - start) / frames
+        stats = annotator.stats()
+        print(
+            f"{name:>16}: {new_ns / 1_000:7.2f}μs/frame, {stats['pushes']} pushes, "
+            f"mean update {stats['mean_update_us']:.2f}μs, mean push {stats['mean_push_us']:.1f}μs"
+        )
+
+
+if __name__ == "__main__":
+    main()
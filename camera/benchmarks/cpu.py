@@ -0,0 +1,67 @@
+"""Measure the cost of reading every tracked thread's CPU time, as a scrape or sample does.
+
+Threads standing in for the camera's own are tracked, most of them waiting like idle outputs
+and one spinning like an output busy with a frame. This times reading every thread's clock, and
+checks that the rate reported for the busy thread matches the CPU it was given:
+
+    $ python -m benchmarks.cpu --threads 16
+"""
+
+import argparse
+import threading
+import time
+
+from src import cpu, metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    registry = metrics.Registry()
+    accounting = cpu.CPUAccounting(registry=registry)
+    stop = threading.Event()
+
+    def idle():
+        with accounting.track("network"):
+            stop.wait()
+
+    def busy():
+        with accounting.track("motion"):
+            while not stop.is_set():
+                sum(range(100))
+
+    threads = [
+        threading.Thread(target=idle, name=f"IdleThread-{i}") for i in range(args.threads - 1)
+    ]
+    threads.append(threading.Thread(target=busy, name="BusyThread"))
+    for thread in threads:
+        thread.start()
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(args.iterations):
+            accounting.seconds()
+        seconds_us = (time.perf_counter_ns() - start) / args.iterations / 1_000
+        start = time.perf_counter_ns()
+        for _ in range(args.iterations // 10):
+            registry.render()
+        render_us = (time.perf_counter_ns() - start) / (args.iterations // 10) / 1_000
+        result = accounting.sample(2)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    print(f"reading {args.threads} threads' CPU time: {seconds_us:.1f}μs")
+    print(f"rendering their counters for a scrape: {render_us:.1f}μs")
+    busy_cores = result["threads"][0]["cores"]
+    print(
+        f"busy thread: {busy_cores:.2f} cores of {result['process']:.2f} used by the process, "
+        f"{result['untracked']:.2f} untracked"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure what each server-sent event costs, as the number of subscribers grows.
+
+Subscribers read the event stream on an event loop in its own thread, as they would in the web
+server, whilst events are published from another thread, as the camera's threads do. This times
+publishing each event, the time taken by the event loop to hand every event to every
+subscriber, and how long it takes for an event to reach the last subscriber:
+
+    $ python -m benchmarks.events --events 5000
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from src import events
+
+
+def _run(subscribers: int, count: int):
+    bus = events.EventBus(capacity=count, interval=0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    done = threading.Event()
+    loop_cpu = []
+    latencies = []
+
+    async def subscriber(last: bool):
+        received = 0
+        async for chunk in bus.stream():
+            received += chunk.count(b"\n\n")
+            if last:
+                latencies.append(time.perf_counter())
+            if received >= count:
+                return
+
+    async def main():
+        tasks = [loop.create_task(subscriber(i == subscribers - 1)) for i in range(subscribers)]
+        await asyncio.sleep(0.1)
+        ready.set()
+        start = time.thread_time()
+        await asyncio.gather(*tasks)
+        loop_cpu.append(time.thread_time() - start)
+        done.set()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(main(),))
+    thread.start()
+    ready.wait()
+
+    published = []
+    publish_ns = 0
+    for i in range(count):
+        start = time.perf_counter_ns()
+        bus.publish("stats", {"fps": {"main": 30.0, "motion": 30.0}, "frame": i})
+        publish_ns += time.perf_counter_ns() - start
+        published.append(time.perf_counter())
+        # roughly the rate of a busy camera's events, so that each is delivered on its own
+        time.sleep(0.0005)
+    done.wait()
+    thread.join()
+    loop.close()
+
+    # events which arrived together share the arrival time of their chunk
+    delays = [arrival - sent for sent, arrival in zip(published, latencies)]
+    return publish_ns / count, loop_cpu[0] / count, statistics.median(delays) if delays else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000)
+    args = parser.parse_args()
+
+    for subscribers in [1, 4, 16, 64]:
+        publish_ns, loop_s, delay = _run(subscribers, args.events)
+        print(
+            f"{subscribers:>3} subscribers: publish {publish_ns / 1000:5.1f}μs, "
+            f"event loop {loop_s * 1e6:6.1f}μs per event ({loop_s * 1e6 / subscribers:4.1f}μs "
+            f"per subscriber), delivered to the last within {delay * 1e6:.0f}μs (median)"
+        )
+
+
+if __name__ == "__main__":
+    main()
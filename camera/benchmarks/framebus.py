@@ -0,0 +1,143 @@
+"""Compare serving frames to another process over TCP, as NetworkOutput does, vs. the FrameBus.
+
+A reader process consumes a synthetic H264 stream (a 100KB I-frame every 30 frames, 15KB
+P-frames otherwise) as fast as the writer can produce it. Over TCP, every byte is copied into
+the kernel by the writer and back out again by the reader. Over the frame bus, each frame is
+copied once, into shared memory, and the reader is only sent a small descriptor. The more
+readers there are, the more copies TCP makes:
+
+    $ python -m benchmarks.framebus --frames 20000 --readers 3
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from src import framebus
+
+
+def _frames(count: int):
+    i_frame = b"\x00\x00\x00\x01\x25" + os.urandom(100_000)
+    p_frame = b"\x00\x00\x00\x01\x21" + os.urandom(15_000)
+    header = b"\x00\x00\x00\x01\x27" + os.urandom(16)
+    yield header, framebus.FRAME_TYPE_SPS_HEADER
+    for i in range(count - 1):
+        yield (i_frame, 1) if i % 30 == 0 else (p_frame, 0)
+
+
+def _tcp_reader(port: int, results) -> None:
+    start_cpu = time.process_time()
+    buf = bytearray(1024 * 1024)
+    received = 0
+    with socket.create_connection(("127.0.0.1", port)) as conn:
+        while True:
+            n = conn.recv_into(buf)
+            if not n:
+                break
+            received += n
+    # every frame is received, but TCP doesn't preserve their boundaries
+    results.put((received, 0, time.process_time() - start_cpu))
+
+
+def _bus_reader(socket_path: str, results) -> None:
+    start_cpu = time.process_time()
+    received = frames = invalid = 0
+    with framebus.FrameBusReader(socket_path) as reader:
+        for frame in reader:
+            # touch the frame, as a consumer would
+            frame.data[-1]
+            if not reader.is_valid(frame):
+                invalid += 1
+            received += len(frame.data)
+            frames += 1
+        del frame
+    if invalid:
+        print(f"bus reader {os.getpid()}: {invalid} frames overwritten before use")
+    results.put((received, frames, time.process_time() - start_cpu))
+
+
+def _collect(results, readers):
+    received = frames = reader_cpu = 0
+    for _ in readers:
+        reader_received, reader_frames, cpu = results.get()
+        received += reader_received
+        frames += reader_frames
+        reader_cpu += cpu
+    for reader in readers:
+        reader.join()
+    return received, frames, reader_cpu
+
+
+def bench_tcp(count: int, readers: int):
+    results = multiprocessing.Queue()
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(readers)
+    processes = [
+        multiprocessing.Process(target=_tcp_reader, args=(server.getsockname()[1], results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    conns = [server.accept()[0] for _ in processes]
+
+    start, start_cpu = time.perf_counter(), time.process_time()
+    for data, _frame_type in _frames(count):
+        for conn in conns:
+            conn.sendall(data)
+    for conn in conns:
+        conn.close()
+    received, _, reader_cpu = _collect(results, processes)
+    elapsed = time.perf_counter() - start
+    server.close()
+    return received, count * readers, elapsed, time.process_time() - start_cpu, reader_cpu
+
+
+def bench_bus(count: int, readers: int):
+    results = multiprocessing.Queue()
+    directory = tempfile.mkdtemp(dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    bus = framebus.FrameBus(
+        shm_path=os.path.join(directory, "frames"),
+        socket_path=os.path.join(directory, "frames.sock"),
+    )
+    processes = [
+        multiprocessing.Process(target=_bus_reader, args=(bus.socket_path, results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    while bus.readers < readers:
+        time.sleep(0.01)
+
+    start, start_cpu = time.perf_counter(), time.process_time()
+    for i, (data, frame_type) in enumerate(_frames(count)):
+        bus.write(framebus.KIND_VIDEO, data, i, time.time(), frame_type=frame_type)
+    bus.close()
+    received, frames, reader_cpu = _collect(results, processes)
+    elapsed = time.perf_counter() - start
+    os.rmdir(directory)
+    return received, frames, elapsed, time.process_time() - start_cpu, reader_cpu
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20_000)
+    parser.add_argument("--readers", type=int, default=1)
+    args = parser.parse_args()
+
+    for name, bench in [("tcp", bench_tcp), ("framebus", bench_bus)]:
+        received, frames, elapsed, writer_cpu, reader_cpu = bench(args.frames, args.readers)
+        # a reader which falls behind the bus misses frames, rather than slowing the writer down
+        delivered = f"{frames}/{args.frames * args.readers} frames delivered, " if frames else ""
+        print(
+            f"{name:>10}: {received / elapsed / 1e6:7.1f}MB/s to {args.readers} readers, "
+            f"{delivered}writer {writer_cpu / args.frames * 1e6:.1f}μs CPU/frame, "
+            f"readers {reader_cpu / args.frames * 1e6:.1f}μs CPU/frame in total"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure how long full garbage collections stall the camera, with and without `gc.freeze`.
+
+The camera's modules, and the objects created whilst starting up, stand in for the long-lived
+heap which every full collection scans. The pause of a full collection is timed before and
+after freezing them, along with the cost of timing every collection through `gc.callbacks`:
+
+    $ python -m benchmarks.memory --objects 200000 --repeat 20
+"""
+
+import argparse
+import gc
+import statistics
+import time
+
+# the modules imported by the running camera make up most of its long-lived heap
+import fastapi  # noqa: F401
+import numpy  # noqa: F401
+import pydantic  # noqa: F401
+
+from src import memory, metrics, schema, tracing  # noqa: F401
+
+
+def _pause(generation: int, repeat: int) -> float:
+    """Return the median time taken to collect `generation`, in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        gc.collect(generation)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # e.g. configuration, buffered frame metadata and the like
+    long_lived = [{"frame": i, "sizes": [i, i]} for i in range(args.objects)]
+    gc.collect()
+    print(f"{len(gc.get_objects()):,d} objects tracked by the garbage collector")
+
+    young = _pause(0, args.repeat * 10)
+    full = _pause(2, args.repeat)
+    memory.GC.install()
+    young_timed = _pause(0, args.repeat * 10)
+    full_timed = _pause(2, args.repeat)
+    print(f"youngest generation: {young * 1000:.1f}μs, {young_timed * 1000:.1f}μs whilst timed")
+    print(f"    full collection: {full:.2f}ms, {full_timed:.2f}ms whilst timed")
+
+    frozen = memory.freeze()
+    full_frozen = _pause(2, args.repeat)
+    print(
+        f"after freezing {frozen:,d} objects: {full_frozen:.2f}ms per full collection "
+        f"({1 - full_frozen / full:.0%} shorter)"
+    )
+    gc.unfreeze()
+    memory.GC.uninstall()
+    del long_lived
+
+
+if __name__ == "__main__":
+    main()
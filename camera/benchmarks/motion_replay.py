@@ -0,0 +1,96 @@
+"""Replay recorded motion vectors through the motion detector, faster than real time.
+
+Record the camera's motion vectors with `POST /debug/motion/recording`, copy the recording off
+the Pi, and replay it with the detector's parameters to try:
+
+    $ python -m benchmarks.motion_replay data/motion_vectors.npy --sensitivity 10 --min-blocks 6
+
+This prints each motion event detected, how much faster than real time the replay ran, and the
+distribution of the time taken by each stage of the detector. Without a recording, a synthetic
+one of a block moving across the frame now and then is generated and replayed:
+
+    $ python -m benchmarks.motion_replay --minutes 10
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import math
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from src.motion_recording import MotionRecorder, load, replay
+from src.outputs.motion_output import DetectMotion
+from src.types import MotionFrame, motion_dtype
+
+
+def generate(path: Path, minutes: float, framerate: int = 30, rows: int = 77, cols: int = 104):
+    """Record a synthetic scene of noise, with a block moving across it for a few seconds in
+    every minute, and return the intervals in which it was moving.
+
+    Now and then, a patch of the scene flickers for a second, as leaves in the wind would.
+    """
+    frames = int(minutes * 60 * framerate)
+    recorder = MotionRecorder(path, capacity=frames)
+    rng = np.random.default_rng(0)
+    start = datetime.datetime(2021, 1, 1).timestamp()
+    for i in range(frames):
+        motion = np.zeros((rows, cols), dtype=motion_dtype)
+        # the jitter of a still scene
+        motion["x"] = rng.integers(-2, 3, (rows, cols))
+        motion["y"] = rng.integers(-2, 3, (rows, cols))
+        second = (i / framerate) % 60
+        if second < 3:
+            col = int(second / 3 * (cols - 8))
+            motion[30:38, col : col + 8] = (12, 2, 500)
+        if (i / framerate) % 17 < 1:
+            motion["x"][50:56, 80:86] = rng.integers(-10, 11, (6, 6))
+            motion["y"][50:56, 80:86] = rng.integers(-10, 11, (6, 6))
+        recorder.write(MotionFrame(motion, i, start + i / framerate))
+    recorder.close()
+    return [(start + minute * 60, start + minute * 60 + 3) for minute in range(math.ceil(minutes))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", nargs="?", help="A recording of motion vectors, in .npy")
+    parser.add_argument("--minutes", type=float, default=5, help="of synthetic motion vectors")
+    parser.add_argument("--sensitivity", type=int, default=10)
+    parser.add_argument("--min-blocks", type=int, default=6)
+    parser.add_argument("--min-frames", type=int, default=6)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+    # the detector logs the timings of every frame with an event
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.recording
+        if path is None:
+            path = Path(directory) / "motion_vectors.npy"
+            generate(path, args.minutes)
+        detector = DetectMotion(args.sensitivity, args.min_blocks, args.min_frames)
+        result = replay(load(path), detector)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for event in result["events"]:
+        time = datetime.datetime.fromtimestamp(event["timestamp"]).strftime("%H:%M:%S.%f")[:-3]
+        print(f"frame {event['frame_num']:>7} at {time}: {len(event['boxes'])} box(es)")
+    print(
+        f"{len(result['events'])} events in {result['frames']} frames "
+        f"({result['recorded_seconds']:.0f}s), replayed in {result['replay_seconds']:.2f}s, "
+        f"{result['speedup']}x faster than real time"
+    )
+    for stage, latency in result["latency"].items():
+        print(
+            f"{stage:>14}: mean {latency['mean']:7.1f}μs, p50 {latency['p50']:7.1f}μs, "
+            f"p99 {latency['p99']:7.1f}μs, max {latency['max']:7.1f}μs ({latency['count']} runs)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Find the best motion detection settings for a recording, by sweeping every combination.
+
+Every combination of the given sensitivities, min_blocks and min_frames is evaluated over the
+recording in a single vectorised pass, which is then compared with replaying the recording
+through the detector for each combination in turn:
+
+    $ python -m benchmarks.motion_sweep data/motion_vectors.npy --truth truth.json
+
+`truth.json` is an optional list of the [start, end] timestamps of the intervals in which there
+really was motion, against which each combination is scored. Without a recording, a synthetic
+one is generated, along with its intervals of motion:
+
+    $ python -m benchmarks.motion_sweep --minutes 5
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.motion_replay import generate
+from src.motion_recording import load, load_chunks, replay
+from src.motion_sweep import sweep
+from src.outputs.motion_output import DetectMotion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", nargs="?", help="A recording of motion vectors, in .npy")
+    parser.add_argument("--truth", help="A JSON list of [start, end] timestamps of motion")
+    parser.add_argument("--minutes", type=float, default=5, help="of synthetic motion vectors")
+    parser.add_argument("--sensitivities", type=int, nargs="+", default=list(range(4, 22, 2)))
+    parser.add_argument("--min-blocks", type=int, nargs="+", default=[2, 4, 6, 8, 12, 16, 24, 32])
+    parser.add_argument("--min-frames", type=int, nargs="+", default=list(range(1, 11)))
+    parser.add_argument("--top", type=int, default=10, help="The number of combinations to show")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+    # the detector logs the timings of every frame with an event
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.recording
+        truth = json.loads(Path(args.truth).read_text()) if args.truth else None
+        if path is None:
+            path = Path(directory) / "motion_vectors.npy"
+            truth = generate(path, args.minutes)
+        result = sweep(
+            load_chunks(path), args.sensitivities, args.min_blocks, args.min_frames, truth
+        )
+        # the same, one combination at a time, for as long as it takes to estimate its speed
+        sequential_start = time.perf_counter()
+        replayed = 0
+        while replayed < 3 or time.perf_counter() - sequential_start < 2:
+            combination = result["combinations"][replayed % len(result["combinations"])]
+            replay(
+                load(path),
+                DetectMotion(
+                    combination["sensitivity"], combination["min_blocks"], combination["min_frames"]
+                ),
+            )
+            replayed += 1
+        sequential = (time.perf_counter() - sequential_start) / replayed
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    combinations = result["combinations"]
+    if truth is not None:
+        # the best first
+        combinations = sorted(combinations, key=lambda c: (c["f1"], c["precision"]), reverse=True)
+    for c in combinations[: args.top]:
+        scores = (
+            f", precision {c['precision']:.2f}, recall {c['recall']:.2f}, F1 {c['f1']:.2f}"
+            if truth is not None
+            else ""
+        )
+        print(
+            f"sensitivity {c['sensitivity']:>3}, min_blocks {c['min_blocks']:>3}, "
+            f"min_frames {c['min_frames']:>2}: {c['events']:>5} events{scores}"
+        )
+    timings = result["timings"]
+    print(
+        f"{len(combinations)} combinations over {result['frames']} frames "
+        f"({result['recorded_seconds']:.0f}s) in {timings['total']:.2f}s "
+        f"(load {timings['load']:.2f}s, areas {timings['areas']:.2f}s, "
+        f"events {timings['events']:.2f}s), {timings['per_combination_ms']:.1f}ms per combination; "
+        f"replaying each in turn would take {sequential * len(combinations):.0f}s "
+        f"({sequential:.2f}s per combination)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure the bandwidth and encoding cost of streaming motion vectors to the server.
+
+Synthetic motion vector frames stand in for the encoder's output in three scenes: a still
+scene, a still scene where 10% of blocks jitter by up to 2 pixels, and the same with an object
+moving across the frame. Each is encoded at several dead-zones (`min_magnitude`) and compared
+with sending the raw motion_dtype arrays:
+
+    $ python -m benchmarks.motion_vectors --resolution 1640x1232 --framerate 30
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.motion_vectors import MotionVectorEncoder
+from src.types import MotionFrame
+
+MOTION_DTYPE = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "u2")])
+
+
+def synthetic_frames(scene: str, width: int, height: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # the encoder produces one more column than there are macroblocks
+    rows, cols = (height + 15) // 16, (width + 15) // 16 + 1
+    for i in range(count):
+        motion_data = np.zeros((rows, cols), dtype=MOTION_DTYPE)
+        motion_data["sad"] = rng.integers(0, 400, (rows, cols))
+        if scene in ("jitter", "moving"):
+            jitter = rng.random((rows, cols)) < 0.1
+            motion_data["x"][jitter] = rng.integers(-2, 3, jitter.sum())
+            motion_data["y"][jitter] = rng.integers(-2, 3, jitter.sum())
+        if scene == "moving":
+            # an object of about a fifth of the frame's height, crossing it every few seconds
+            size = rows // 5
+            x = (i * 2) % (cols - size)
+            y = rows // 2
+            motion_data["x"][y : y + size, x : x + size] = 12 + rng.integers(-2, 3, (size, size))
+            motion_data["y"][y : y + size, x : x + size] = -4 + rng.integers(-2, 3, (size, size))
+        yield MotionFrame(motion_data, i, time.time())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="1640x1232")
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+    width, height = map(int, args.resolution.split("x"))
+
+    for scene in ["still", "jitter", "moving"]:
+        frames = list(synthetic_frames(scene, width, height, args.frames))
+        raw_kbps = frames[0].motion_data.nbytes * args.framerate * 8 / 1_000
+        print(f"{scene}: raw {raw_kbps:,.0f}kbps")
+        for min_magnitude in [0, 2, 3]:
+            encoder = MotionVectorEncoder(min_magnitude=min_magnitude)
+            start = time.perf_counter_ns()
+            for frame in frames:
+                encoder.encode(frame)
+            encode_us = (time.perf_counter_ns() - start) / len(frames) / 1_000
+            print(
+                f"    min_magnitude={min_magnitude}: "
+                f"{encoder.bytes_encoded / len(frames):7,.0f} bytes/frame, "
+                f"{encoder.bytes_encoded / len(frames) * args.framerate * 8 / 1_000:6,.1f}kbps, "
+                f"{encoder.empty_frames}/{len(frames)} empty, encode {encode_us:.0f}μs/frame"
+            )
+
+
+if __name__ == "__main__":
+    main()
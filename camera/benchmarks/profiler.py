@@ -0,0 +1,72 @@
+"""Measure how much the sampling profiler slows the camera down whilst it runs.
+
+A number of threads stand in for the camera's own: most wait on events, like the output
+handlers, and one spins in pure Python, like an output busy processing a frame. The work done
+by the spinning thread is compared with and without a profile being taken at each rate, along
+with the share of time which the profiler reports having spent sampling:
+
+    $ python -m benchmarks.profiler --threads 12 --repeat 7
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from src import profiler
+
+
+def _work(stop: threading.Event, done: list) -> None:
+    count = 0
+    while not stop.is_set():
+        sum(range(100))
+        count += 1
+    done.append(count)
+
+
+def _run(seconds: float, idle_threads: int, rate: float = 0):
+    stop = threading.Event()
+    waiters = [
+        threading.Thread(target=stop.wait, name=f"Waiter{i}", daemon=True)
+        for i in range(idle_threads)
+    ]
+    done: list = []
+    worker = threading.Thread(target=_work, args=(stop, done), name="Worker")
+    for thread in waiters + [worker]:
+        thread.start()
+    if rate:
+        result = profiler.profile(seconds, rate)
+    else:
+        time.sleep(seconds)
+        result = None
+    stop.set()
+    worker.join()
+    return done[0], result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1)
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    for rate in [50, 100, 200, 1000]:
+        # runs with and without a profile are interleaved, and compared in pairs, so that
+        # anything else happening on the machine affects both alike
+        slowdowns, overheads, sample_rates = [], [], []
+        for _ in range(args.repeat):
+            baseline, _ = _run(args.seconds, args.threads)
+            work, result = _run(args.seconds, args.threads, rate)
+            slowdowns.append(1 - work / baseline)
+            overheads.append(result.overhead)
+            sample_rates.append(result.samples / (args.threads + 1) / result.duration)
+        print(
+            f"{rate:>5}Hz: {statistics.median(sample_rates):5.0f} samples/s per thread, "
+            f"{statistics.median(overheads):.2%} spent sampling, "
+            f"worker slowed by {statistics.median(slowdowns):.2%} (medians)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Measure how long the video stream is interrupted for by changes to the camera's configuration.
+
+A client stays connected to the network output of a camera running on the fake backend, and
+records when each chunk of the stream arrives, reconnecting if the connection is dropped. Each
+change is applied as `Config.apply` does it, restarting only the recordings ("warm"), and then
+as it used to, by stopping the camera and all of its outputs and starting them again ("cold"):
+
+    $ python -m benchmarks.reconfigure --repeat 5
+
+The fake encoder starts instantly, so this measures what the outputs add on top of restarting
+the recordings themselves.
+"""
+
+import argparse
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.camera import Camera
+from src.config import Config
+from src.fake_camera import FakePiCamera
+
+CHANGES = [
+    ("bitrate", [2_000_000, 3_000_000]),
+    ("framerate", [25, 30]),
+    ("resolution", ["1920x1080", "1640x1232"]),
+]
+
+
+class _Client(threading.Thread):
+    """Reads the stream from a TCP port, noting when each chunk arrives."""
+
+    def __init__(self, port: int):
+        super().__init__(daemon=True)
+        self.port = port
+        self.arrivals = []
+        self.reconnects = 0
+        self.closed = False
+        self.start()
+
+    def run(self) -> None:
+        while not self.closed:
+            try:
+                conn = socket.create_connection(("127.0.0.1", self.port), timeout=1)
+            except OSError:
+                time.sleep(0.01)
+                continue
+            with conn:
+                while not self.closed:
+                    try:
+                        data = conn.recv(65536)
+                    except socket.timeout:
+                        continue
+                    except OSError:
+                        break
+                    if not data:
+                        break
+                    self.arrivals.append(time.monotonic())
+            self.reconnects += 1
+
+    def longest_gap(self, start: float, end: float) -> float:
+        arrivals = [arrival for arrival in self.arrivals if arrival >= start - 1]
+        gaps = [b - a for a, b in zip(arrivals, arrivals[1:]) if b >= start and a <= end]
+        return max(gaps, default=float("nan"))
+
+
+def _warm(camera: Camera, settings: dict) -> None:
+    camera.reconfigure(settings)
+
+
+def _cold(camera: Camera, settings: dict) -> None:
+    camera.stop()
+    for attr, val in settings.items():
+        setattr(camera, "_" + attr, val)
+    camera.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    config_path = Path(directory) / "camera_config.toml"
+    shutil.copy(Config.CONFIG_TEMPLATE_PATH, config_path)
+    camera = Camera(config_path, backend=FakePiCamera)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure(
+        {
+            # the network output can only be enabled once the camera has a server, although
+            # nothing is sent to it
+            "server_address": {"ip": "127.0.0.1", "port": 8080},
+            "outputs": {"network": {"enabled": True, "socket_port": port}},
+        }
+    )
+    camera.start()
+    client = _Client(port)
+    time.sleep(1)
+
+    try:
+        for attr, values in CHANGES:
+            for name, apply in [("warm", _warm), ("cold", _cold)]:
+                reconnects = client.reconnects
+                gaps, durations = [], []
+                for i in range(args.repeat):
+                    start = time.monotonic()
+                    apply(camera, {attr: values[i % 2]})
+                    end = time.monotonic()
+                    durations.append(end - start)
+                    time.sleep(1)
+                    gaps.append(client.longest_gap(start, end))
+                print(
+                    f"{attr:>10} {name}: stream down for {statistics.median(gaps) * 1000:6.0f}ms, "
+                    f"applied in {statistics.median(durations) * 1000:6.0f}ms (medians), "
+                    f"{client.reconnects - reconnects}/{args.repeat} reconnections"
+                )
+    finally:
+        client.closed = True
+        camera.stop()
+        camera.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
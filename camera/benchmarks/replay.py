@@ -0,0 +1,147 @@
+"""Measure how fast the whole pipeline can stream a replayed recording, without a camera.
+
+A recording is generated with ffmpeg, along with motion data of a block moving across the frame,
+and replayed by the fake camera backend with the network output enabled and a client reading
+the stream. It is replayed in real time, and then faster and faster, to find out how many frames
+a second the pipeline keeps up with before its output threads start dropping frames:
+
+    $ python -m benchmarks.replay --resolution 1640x1232 --seconds 5
+
+Any recording can be replayed instead, for example one made on a Pi with
+`raspivid -o video.h264 -x motion.vec`:
+
+    $ python -m benchmarks.replay --video video.h264 --motion motion.vec
+"""
+
+import argparse
+import functools
+import logging
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import ffmpeg
+import numpy as np
+
+from src import metrics
+from src.camera import Camera
+from src.config import Config
+from src.fake_camera import BUFFER_SIZE, FakePiCamera, Recording
+from src.types import motion_dtype
+
+
+def _generate(directory: Path, resolution: str, framerate: int, bitrate: int):
+    video_path = directory / "video.h264"
+    (
+        ffmpeg.input(f"testsrc=size={resolution}:rate={framerate}", f="lavfi", t=4)
+        # noise, so that the video is anywhere near as hard to compress as a real scene
+        .filter("noise", alls=20, allf="t")
+        .output(str(video_path), vcodec="libx264", g=framerate, video_bitrate=bitrate)
+        .run(quiet=True)
+    )
+    width, height = (int(x) for x in resolution.split("x"))
+    rows, cols = (height + 15) // 16, (width + 15) // 16 + 1
+    motion = np.zeros((framerate * 4, rows, cols), dtype=motion_dtype)
+    for i, frame in enumerate(motion):
+        col = i % (cols - 4)
+        frame[rows // 2 : rows // 2 + 4, col : col + 4] = (8, 0, 100)
+    motion_path = directory / "motion.vec"
+    motion_path.write_bytes(motion.tobytes())
+    return video_path, motion_path
+
+
+def _drain(port: int, received: list):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        while True:
+            chunk = sock.recv(1 << 20)
+            if not chunk:
+                return
+            received[0] += len(chunk)
+
+
+def _replay(config_path: Path, recording: Recording, resolution: str, speed: float, seconds: float):
+    camera = Camera(config_path, backend=functools.partial(FakePiCamera, recording, speed=speed))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure(
+        {
+            "server_address": {"ip": "127.0.0.1", "port": 8080},
+            "camera": {"resolution": resolution},
+            "outputs": {"network": {"enabled": True, "socket_port": port}},
+        }
+    )
+    camera.start()
+    received = [0]
+    client = threading.Thread(target=_drain, args=(port, received), daemon=True)
+    time.sleep(0.5)
+    client.start()
+    time.sleep(0.5)
+
+    frames_before, bytes_before = camera.video_output.frame.frame_num, received[0]
+    dropped_before = metrics.FRAMES_DROPPED.values()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    frames = camera.video_output.frame.frame_num - frames_before
+    dropped = {
+        labels[0]: int(count - dropped_before.get(labels, 0))
+        for labels, count in metrics.FRAMES_DROPPED.values().items()
+    }
+    streamed = received[0] - bytes_before
+    camera.stop()
+    camera.close()
+    return frames / elapsed, dropped, streamed / elapsed, cpu / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", help="An H.264 recording to replay, rather than generating one")
+    parser.add_argument("--motion", help="The motion data recorded alongside --video")
+    parser.add_argument("--resolution", default="1640x1232")
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--bitrate", type=int, default=10_000_000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+    # the outputs log every frame they drop
+    logging.disable(logging.WARNING)
+
+    directory = Path(tempfile.mkdtemp())
+    config_path = directory / "camera_config.toml"
+    shutil.copy(Config.CONFIG_TEMPLATE_PATH, config_path)
+    try:
+        if args.video:
+            video_path, motion_path = args.video, args.motion
+        else:
+            video_path, motion_path = _generate(
+                directory, args.resolution, args.framerate, args.bitrate
+            )
+        recording = Recording(video_path, motion_path)
+        split = sum(len(data) > BUFFER_SIZE for data, _ in recording.frames)
+        print(
+            f"{len(recording.frames)} buffers to replay, of which {split} are split across "
+            f"several writes"
+        )
+        for speed in args.speeds:
+            fps, dropped, rate, cpu = _replay(
+                config_path, recording, args.resolution, speed, args.seconds
+            )
+            dropped = ", ".join(
+                f"{count} by {handler}" for handler, count in dropped.items() if count
+            )
+            print(
+                f"{speed:4g}x: {fps:6.1f} frames/s published, {rate / 1e6:5.2f}MB/s streamed, "
+                f"using {cpu:4.0%} of a core, frames dropped: {dropped or 'none'}"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Soak the camera's pipeline for a simulated day, in minutes, failing if anything grows or drifts.
+
+The camera runs on a fake camera and an accelerated clock (see `src/soak.py`), with the network,
+timelapse and motion outputs enabled, uploading to a local stand-in for the server. Each sample
+is printed as it is taken, and the soak exits with a non-zero status if any series grew faster
+than its limit once warmed up, or if the timelapse captures slipped from their schedule. To soak
+a day in 15 minutes, saving every sample:
+
+    $ python -m benchmarks.soak --hours 24 --minutes 15 --output soak.json
+
+Limits can be changed with `--limit`, e.g. `--limit rss_bytes=2097152` to allow resident memory
+to grow by 2MiB per simulated hour. A recording can be replayed in place of synthetic frames:
+
+    $ python -m benchmarks.soak --replay video.h264 --replay-motion motion.bin
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+from src import soak
+from src.fake_camera import Recording
+
+
+def _limit(value: str):
+    name, _, limit = value.partition("=")
+    if name not in soak.Limits._fields:
+        raise argparse.ArgumentTypeError(f"{name!r} isn't one of {', '.join(soak.Limits._fields)}")
+    return name, float(limit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24, help="of simulated time")
+    parser.add_argument("--minutes", type=float, default=15, help="of real time")
+    parser.add_argument("--framerate", type=int, default=5)
+    parser.add_argument("--bitrate", type=int, default=1_000_000)
+    parser.add_argument("--capture-interval", type=int, default=60, help="of timelapse images")
+    parser.add_argument("--outputs", nargs="+", default=["network", "timelapse", "motion"])
+    parser.add_argument("--sample-every", type=float, default=300, help="simulated seconds")
+    parser.add_argument("--warmup", type=float, default=0.1, help="fraction of the soak")
+    parser.add_argument("--replay", metavar="VIDEO", help="Replay a recorded H.264 file")
+    parser.add_argument("--replay-motion", metavar="MOTION")
+    parser.add_argument("--limit", type=_limit, action="append", default=[], metavar="NAME=VALUE")
+    parser.add_argument("--output", help="Save the samples and the report to this JSON file")
+    args = parser.parse_args()
+    # frames are dropped, and logged, far more often than usual at these speeds
+    logging.disable(logging.WARNING)
+
+    recording = Recording(args.replay, args.replay_motion) if args.replay else None
+    with tempfile.TemporaryDirectory() as directory:
+        run = soak.Soak(
+            Path(directory),
+            hours=args.hours,
+            minutes=args.minutes,
+            framerate=args.framerate,
+            bitrate=args.bitrate,
+            capture_interval=args.capture_interval,
+            outputs=args.outputs,
+            sample_every=args.sample_every,
+            recording=recording,
+        )
+        print(f"soaking {args.hours:g} hours in {args.minutes:g} minutes ({run.speed:g}x)")
+
+        def progress(sample: dict) -> None:
+            print(
+                f"{sample['time'] / 3600:6.2f}h: rss {sample['rss_bytes'] / 2 ** 20:7.1f}MiB, "
+                f"{sample['threads']:3.0f} threads, {sample['open_fds']:4.0f} fds, "
+                f"buffers {sample['buffer_bytes'] / 2 ** 20:6.1f}MiB, "
+                f"{sample['frames_dropped']:.0f}/{sample['frames_handled']:.0f} frames dropped"
+            )
+
+        result = run.run(progress)
+
+    report = soak.analyse(result, warmup=args.warmup)
+    failed = soak.failures(report, soak.Limits()._replace(**dict(args.limit)))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps({**result, "report": report}, indent=2) + "\n")
+    for failure in failed:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measure how long a cold start of the camera service takes, until /ping and the first frame.
+
+Each start runs in a fresh process, timed from when the process was started, with a camera on
+the fake backend streaming to the network output. Starts importing only what is used, as the
+service does now ("lazy"), are compared with starts importing every output, and the modules
+they depend on, up front as it used to ("eager"):
+
+    $ python -m benchmarks.startup --repeat 5
+
+The old service couldn't answer /ping until the camera had been constructed, whereas it now
+answers as soon as the app has been imported. The fake camera opens instantly, so this
+measures the cost of importing and starting the pipeline alone.
+"""
+
+import argparse
+import json
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+STAGES = ["imported", "camera_constructed", "first_frame"]
+
+
+def _child(eager: bool, config_path: str) -> None:
+    if eager:
+        import ffmpeg  # noqa: F401
+        import requests  # noqa: F401
+
+        from src.outputs import (  # noqa: F401
+            LocalOutput,
+            MotionDetectionOutput,
+            MotionVectorOutput,
+            NetworkOutput,
+            TimelapseOutput,
+            YouTubeOutput,
+        )
+    import fastapi  # noqa: F401
+
+    from src import startup
+    from src.camera import Camera
+    from src.fake_camera import FakePiCamera
+
+    startup.reached("imported")
+    camera = Camera(config_path, backend=FakePiCamera)
+    startup.reached("camera_constructed")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure(
+        {
+            "server_address": {"ip": "127.0.0.1", "port": 8080},
+            "outputs": {"network": {"enabled": True, "socket_port": port}},
+        }
+    )
+    camera.start()
+    while "first_frame" not in startup.stages():
+        camera.video_output.event.wait(1)
+    print(json.dumps(startup.stages()))
+    camera.stop()
+    camera.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child == "eager", args.config)
+        return
+
+    from src.config import Config
+
+    directory = tempfile.mkdtemp()
+    config_path = Path(directory) / "camera_config.toml"
+    shutil.copy(Config.CONFIG_TEMPLATE_PATH, config_path)
+    try:
+        for mode in ["eager", "lazy"]:
+            results = []
+            for _ in range(args.repeat):
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.startup", "--child", mode]
+                    + ["--config", str(config_path)],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    check=True,
+                )
+                results.append(json.loads(proc.stdout.decode().splitlines()[-1]))
+            medians = {stage: statistics.median(r[stage] for r in results) for stage in STAGES}
+            ping = medians["imported" if mode == "lazy" else "camera_constructed"]
+            print(
+                f"{mode:>5}: /ping answered after {ping:.2f}s, camera constructed after "
+                f"{medians['camera_constructed']:.2f}s, first frame after "
+                f"{medians['first_frame']:.2f}s (medians)"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Benchmark the camera's frame path, saving the results as JSON to compare across Pis and versions.
+
+Each case is measured with synthetic inputs, or with recorded ones if given: an H.264 recording,
+such as one made with `raspivid -o video.h264`, and motion vectors recorded with
+`POST /debug/motion/recording`.
+
+- recording_output: writing the encoder's buffers to `_RecordingOutput.write`, which gathers
+  them into frames and publishes them from the `VideoOutput`, injecting SEI
+- frame_buffer: `FrameBuffer.append`, `final_group`, `concatenate` and `raw_bytes`, on a buffer
+  the size of the motion output's
+- detect_motion: `DetectMotion.detect`, on a still scene, one with motion, and the recording
+- remove_subboxes: `Boxes.remove_subboxes`, with increasing numbers of boxes
+- network_output: the throughput of a `NetworkOutput` stream to a client on a local socket
+
+For example, to save the results of a run, and then compare a later run with them:
+
+    $ python -m benchmarks.suite --output pi4-before.json
+    $ python -m benchmarks.suite --video video.h264 --motion motion.npy --compare pi4-before.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import threading
+import time
+import timeit
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+from src.camera import VideoOutput
+from src.fake_camera import FakePiCamera, Recording, _FakeEncoder
+from src.motion_recording import load
+from src.outputs.motion_output import DetectMotion
+from src.outputs.network_output import _NetworkStream
+from src.sei import SEIInjector
+from src.types import Box, Boxes, FrameBuffer, MotionFrame, VideoFrame, motion_dtype
+
+FRAMERATE = 30
+
+
+def _per_call(function: t.Callable[[], t.Any], seconds: float = 0.5) -> t.Dict[str, float]:
+    """Return the median and fastest time taken by a call to `function`, in microseconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    repeat = max(int(seconds / (timer.timeit(number) or 1e-9)), 3)
+    times = [elapsed / number * 1e6 for elapsed in timer.repeat(min(repeat, 20), number)]
+    return {"median_us": round(statistics.median(times), 3), "min_us": round(min(times), 3)}
+
+
+def _synthetic_stream(frames: int, i_frame: int = 100_000, p_frame: int = 15_000):
+    """Return (data, frame type) pairs of an H.264-shaped stream, with a key frame a second."""
+    stream = []
+    for i in range(frames):
+        if i % FRAMERATE == 0:
+            stream.append((b"\x00\x00\x00\x01\x27" + os.urandom(16), 2))
+            stream.append((b"\x00\x00\x00\x01\x25" + os.urandom(i_frame), 1))
+        else:
+            stream.append((b"\x00\x00\x00\x01\x21" + os.urandom(p_frame), 0))
+    return stream
+
+
+def _video_frames(stream) -> t.List[VideoFrame]:
+    return [
+        VideoFrame(data, i, i / FRAMERATE, frame_type)
+        for i, (data, frame_type) in enumerate(stream)
+    ]
+
+
+def recording_output(stream) -> t.Dict[str, t.Any]:
+    camera = FakePiCamera()
+    video_output = VideoOutput(camera, sei=SEIInjector(), name="benchmark")
+    # the encoder is driven directly, splitting large frames across writes just as MMAL does
+    encoder = _FakeEncoder(camera, video_output.recording_output(), 1, None, 0, 1)
+    camera._encoders[1] = encoder
+    size = sum(len(data) for data, _ in stream)
+    rounds = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < 2 or rounds < 3:
+        for data, frame_type in stream:
+            encoder._write(data, frame_type)
+        rounds += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "frames_per_s": round(rounds * len(stream) / elapsed),
+        "us_per_frame": round(elapsed / (rounds * len(stream)) * 1e6, 2),
+        "mb_per_s": round(rounds * size / elapsed / 1e6, 1),
+    }
+
+
+def frame_buffer(stream) -> t.Dict[str, t.Any]:
+    frames = _video_frames(stream)
+    # the motion output keeps a few seconds of video from before the motion
+    maxlen = 5 * FRAMERATE
+    full = FrameBuffer(maxlen)
+    for frame in frames[:maxlen]:
+        full.append(frame)
+    other = FrameBuffer(maxlen)
+    for frame in frames[maxlen : 2 * maxlen]:
+        other.append(frame)
+    appending = FrameBuffer(maxlen)
+    frame = frames[-1]
+    return {
+        "append": _per_call(lambda: appending.append(frame)),
+        "final_group": _per_call(full.final_group),
+        "concatenate": _per_call(lambda: full.concatenate(other)),
+        "raw_bytes": {
+            **_per_call(full.raw_bytes),
+            "bytes": full.nbytes,
+        },
+    }
+
+
+def _motion(moving: bool, rows: int = 77, cols: int = 104) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    motion = np.zeros((rows, cols), dtype=motion_dtype)
+    motion["x"] = rng.integers(-2, 3, (rows, cols))
+    motion["y"] = rng.integers(-2, 3, (rows, cols))
+    if moving:
+        motion[30:40, 40:52] = (12, 4, 500)
+        motion[60:64, 10:14] = (-11, 0, 300)
+    return motion
+
+
+def detect_motion(motion_path: t.Optional[str]) -> t.Dict[str, t.Any]:
+    results = {}
+    for case, moving in [("still", False), ("moving", True)]:
+        detector = DetectMotion(sensitivity=10, min_blocks=6, min_frames=6)
+        frame = MotionFrame(_motion(moving), 0, 0)
+        results[case] = _per_call(lambda: detector.detect(frame))
+    if motion_path is not None:
+        detector = DetectMotion(sensitivity=10, min_blocks=6, min_frames=6)
+        times = []
+        for frame in load(motion_path):
+            start = time.perf_counter_ns()
+            detector.detect(frame)
+            times.append((time.perf_counter_ns() - start) / 1000)
+        p50, p99 = np.percentile(times, [50, 99])
+        results["recorded"] = {
+            "frames": len(times),
+            "median_us": round(float(p50), 3),
+            "p99_us": round(float(p99), 3),
+        }
+    return results
+
+
+def remove_subboxes() -> t.Dict[str, t.Any]:
+    rng = random.Random(0)
+    results = {}
+    for count in [5, 20, 100]:
+        boxes = []
+        for _ in range(count):
+            x0, y0 = rng.randrange(0, 1600, 16), rng.randrange(0, 1200, 16)
+            boxes.append(
+                Box(x0, y0, x0 + rng.randrange(16, 320, 16), y0 + rng.randrange(16, 320, 16))
+            )
+        results[f"{count}_boxes"] = _per_call(lambda: Boxes(list(boxes)).remove_subboxes())
+    return results
+
+
+def network_output(stream, seconds: float = 3) -> t.Dict[str, t.Any]:
+    camera = FakePiCamera()
+    video_output = VideoOutput(camera, name="benchmark")
+    encoder = _FakeEncoder(camera, video_output.recording_output(), 1, None, 0, 1)
+    camera._encoders[1] = encoder
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    network_stream = _NetworkStream(video_output, port, "Benchmark")
+    received = [0]
+
+    def read():
+        with socket.create_connection(("127.0.0.1", port)) as client:
+            while True:
+                chunk = client.recv(1 << 20)
+                if not chunk:
+                    return
+                received[0] += len(chunk)
+
+    threading.Thread(target=read, daemon=True).start()
+    # each frame is published once the previous one has been sent, as publishing them any faster
+    # only measures how many are skipped, rather than how quickly they are sent. one published
+    # before the socket thread is waiting for it again is never sent, so that isn't waited on
+    frames_out = network_stream.frames_out
+    network_stream.stats.take()
+    published = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for data, frame_type in stream:
+            before = frames_out.get()
+            encoder._write(data, frame_type)
+            published += 1
+            deadline = time.perf_counter() + 0.002
+            while frames_out.get() == before and time.perf_counter() < deadline:
+                time.sleep(0)
+    elapsed = time.perf_counter() - start
+    window = network_stream.stats.take()
+    network_stream.close()
+    return {
+        "mb_per_s": round(received[0] / elapsed / 1e6, 1),
+        "frames_per_s": round(window.frames / elapsed),
+        "send_us_per_frame": round(window.send_time / window.frames * 1e6, 2),
+        "frames_unsent": published - window.frames,
+    }
+
+
+def _metadata() -> t.Dict[str, t.Any]:
+    def read(path: str) -> t.Optional[str]:
+        try:
+            return Path(path).read_text().strip("\x00\n ")
+        except OSError:
+            return None
+
+    def git(*args: str) -> t.Optional[str]:
+        try:
+            return (
+                subprocess.check_output(["git", *args], stderr=subprocess.DEVNULL).decode().strip()
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    cpuinfo = read("/proc/cpuinfo") or ""
+    cpu_model = next(
+        (
+            line.split(":", 1)[1].strip()
+            for line in cpuinfo.splitlines()
+            if line.startswith("model name")
+        ),
+        platform.processor(),
+    )
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        # e.g. "Raspberry Pi 4 Model B Rev 1.4", on a Pi
+        "model": read("/proc/device-tree/model"),
+        "cpu": cpu_model,
+        "cpus": os.cpu_count(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def _flatten(results: t.Dict[str, t.Any], prefix: str = "") -> t.Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _compare(base: t.Dict[str, t.Any], report: t.Dict[str, t.Any]) -> None:
+    meta = base["meta"]
+    print(f"compared with {meta['commit']} on {meta['model'] or meta['cpu']}:")
+    if meta["inputs"] != report["meta"]["inputs"]:
+        print(f"  (with different inputs: {meta['inputs']})")
+    before, after = _flatten(base["results"]), _flatten(report["results"])
+    for key, value in after.items():
+        if key in before and before[key]:
+            print(f"  {key:<45} {before[key]:>12g} -> {value:>12g} ({value / before[key]:6.2f}x)")
+
+
+CASES = ["recording_output", "frame_buffer", "detect_motion", "remove_subboxes", "network_output"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", help="An H.264 recording to use, rather than synthetic frames")
+    parser.add_argument("--motion", help="Motion vectors to use, as recorded by the camera")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with those saved in this file")
+    args = parser.parse_args()
+    # the outputs log every frame they drop, and the detector every motion event
+    logging.disable(logging.WARNING)
+
+    if args.video:
+        stream = Recording(args.video).frames
+    else:
+        stream = _synthetic_stream(2 * 5 * FRAMERATE)
+
+    results = {}
+    for case in args.cases:
+        if case == "detect_motion":
+            results[case] = detect_motion(args.motion)
+        elif case == "remove_subboxes":
+            results[case] = remove_subboxes()
+        else:
+            results[case] = globals()[case](stream)
+        print(f"{case}: {json.dumps(results[case])}")
+
+    report = {
+        "meta": {
+            **_metadata(),
+            "inputs": {"video": args.video or "synthetic", "motion": args.motion or "synthetic"},
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        _compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measure the overhead of tracing frames through the pipeline, and of exporting a trace.
+
+Times a span (a call to `tracing.start` and to `tracing.end`) with tracing disabled, as it is
+almost all of the time, and enabled. Then fills a ring for each of a typical number of threads
+with 10 seconds' worth of spans, and exports them as Chrome trace-event JSON:
+
+    $ python -m benchmarks.tracing --framerate 30 --threads 8
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from src import tracing
+
+
+def _span_ns(count: int) -> float:
+    start = time.perf_counter_ns()
+    for i in range(count):
+        traced = tracing.start()
+        tracing.end("process_frame", traced, i)
+    return (time.perf_counter_ns() - start) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tracer = tracing.TRACER
+    disabled_ns = _span_ns(args.iterations)
+    tracer.enable()
+    enabled_ns = _span_ns(args.iterations)
+    print(f"span disabled: {disabled_ns:.0f}ns, enabled: {enabled_ns:.0f}ns")
+    # each frame passes through roughly four traced stages on each of the threads
+    per_second = args.framerate * args.threads * 4
+    print(
+        f"{per_second} spans/s: {enabled_ns * per_second / 1e9:.4%} of a core whilst tracing, "
+        f"{disabled_ns * per_second / 1e9:.4%} otherwise"
+    )
+
+    # start again, with a ring per thread, each holding 10 seconds of spans
+    tracer.enable(capacity=args.framerate * 4 * 10)
+    now = time.monotonic_ns()
+
+    def fill():
+        for i in range(args.framerate * 4 * 10):
+            at = now - 10 * 10**9 + i * 10**9 // (args.framerate * 4)
+            tracer.add("process_frame", at, at + 100_000, i // 4)
+
+    threads = [threading.Thread(target=fill, name=f"Thread{i}") for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    start = time.perf_counter()
+    trace = tracer.export(seconds=10)
+    export_s = time.perf_counter() - start
+    start = time.perf_counter()
+    encoded = json.dumps(trace)
+    encode_s = time.perf_counter() - start
+    print(
+        f"exporting 10s ({len(trace['traceEvents']):,d} events): {export_s * 1000:.0f}ms, "
+        f"encoding: {encode_s * 1000:.0f}ms, {len(encoded) / 1e6:.1f}MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
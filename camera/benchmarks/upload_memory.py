@@ -0,0 +1,151 @@
+"""Compare the peak memory used when uploading a motion clip, old approach vs. streaming.
+
+The "join" approach mirrors what MotionDetectionOutput used to do: concatenate the event buffers,
+join every frame into a single bytes object and let requests build the multipart body in
+memory. The "stream" approach sends a MultipartBody straight from the frame memoryviews.
+
+Each approach is run in a fresh subprocess so that their peak RSS can be compared fairly:
+
+    $ python -m benchmarks.upload_memory --seconds 300 --bitrate 17000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.multipart import FilePart, MultipartBody
+from src.types import FrameBuffer, VideoFrame, VideoFrameType
+
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    """Read and discard the request body."""
+
+    def do_POST(self):
+        remaining = int(self.headers["Content-Length"])
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _make_buffers(seconds: int, bitrate: int, framerate: int):
+    """Return pre and post event buffers filled with random frames, one SPS header per second."""
+    frame_size = bitrate // 8 // framerate
+    pre_event_buffer = FrameBuffer(maxlen=framerate * 5)
+    post_event_buffer = FrameBuffer(maxlen=framerate * seconds)
+    frame_num = 0
+    for buffer in [pre_event_buffer, post_event_buffer]:
+        while not buffer.full:
+            if frame_num % framerate == 0:
+                frame_type = VideoFrameType.sps_header
+            elif frame_num % framerate == 1:
+                frame_type = VideoFrameType.key_frame
+            else:
+                frame_type = VideoFrameType.frame
+            buffer.append(VideoFrame(os.urandom(frame_size), frame_num, time.time(), frame_type))
+            frame_num += 1
+    return pre_event_buffer, post_event_buffer
+
+
+def _join(url, pre_event_buffer, post_event_buffer):
+    trigger_frame_group = pre_event_buffer.final_group()
+    full_event = pre_event_buffer.concatenate(post_event_buffer)
+    full_event.trim_start()
+    files = {
+        "motion_video": ("motion_video.h264", full_event.raw_bytes(), "video/h264"),
+        "frame_group": ("frame_group.h264", trigger_frame_group.raw_bytes(), "video/h264"),
+    }
+    requests.post(url, files=files).raise_for_status()
+
+
+def _stream(url, pre_event_buffer, post_event_buffer):
+    trigger_frame_group = pre_event_buffer.final_group()
+    full_event = pre_event_buffer.concatenate(post_event_buffer)
+    full_event.trim_start()
+    body = MultipartBody(
+        files={
+            "motion_video": FilePart.from_buffers(
+                "motion_video.h264", "video/h264", full_event.buffers()
+            ),
+            "frame_group": FilePart.from_buffers(
+                "frame_group.h264", "video/h264", trigger_frame_group.buffers()
+            ),
+        }
+    )
+    requests.post(url, data=body, headers={"Content-Type": body.content_type}).raise_for_status()
+
+
+APPROACHES = {"join": _join, "stream": _stream}
+
+
+def _run_one(args) -> None:
+    """Run a single approach and print its memory usage as JSON. Runs in a subprocess."""
+    pre_event_buffer, post_event_buffer = _make_buffers(args.seconds, args.bitrate, args.framerate)
+    clip_bytes = pre_event_buffer.nbytes + post_event_buffer.nbytes
+    baseline = _peak_rss_bytes()
+    start = time.perf_counter()
+    APPROACHES[args.approach](args.url, pre_event_buffer, post_event_buffer)
+    duration = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "approach": args.approach,
+                "clip_bytes": clip_bytes,
+                "baseline_rss_bytes": baseline,
+                "peak_rss_bytes": _peak_rss_bytes(),
+                "extra_peak_bytes": _peak_rss_bytes() - baseline,
+                "duration_s": duration,
+            }
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=60, help="length of the clip")
+    parser.add_argument("--bitrate", type=int, default=17_000_000)
+    parser.add_argument("--framerate", type=int, default=25)
+    parser.add_argument("--approach", choices=APPROACHES, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.approach is not None:
+        _run_one(args)
+        return
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _SinkHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/process-new-motion-event"
+
+    for approach in APPROACHES:
+        cmd = [sys.executable, "-m", "benchmarks.upload_memory", "--approach", approach]
+        cmd += ["--url", url, "--seconds", str(args.seconds), "--bitrate", str(args.bitrate)]
+        cmd += ["--framerate", str(args.framerate)]
+        result = json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout)
+        print(
+            f"{approach:>6}: clip {result['clip_bytes'] / 1e6:7.1f}MB, "
+            f"extra peak RSS {result['extra_peak_bytes'] / 1e6:7.1f}MB, "
+            f"{result['duration_s']:.2f}s"
+        )
+
+    httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
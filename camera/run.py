@@ -1,6 +1,7 @@
 #!.venv/bin/python
 import argparse
 import asyncio
+import os
 
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
@@ -14,10 +15,35 @@ parser.add_argument(
     action="store_true",
     help="Specify the whether the client is being run in the production environment",
 )
+parser.add_argument(
+    "--gc-freeze",
+    action="store_true",
+    help="Stop the garbage collector from scanning the objects created whilst starting up",
+)
+parser.add_argument(
+    "--replay",
+    metavar="VIDEO",
+    help="Replay a recorded H.264 file rather than opening the camera, e.g. without a camera",
+)
+parser.add_argument(
+    "--replay-motion", metavar="MOTION", help="Replay the motion data recorded alongside the video"
+)
+parser.add_argument(
+    "--replay-speed",
+    type=float,
+    default=1.0,
+    help="How many times faster than real time to replay the video, or 0 for as fast as possible",
+)
 args: argparse.Namespace = parser.parse_args()
 
 if __name__ == "__main__":
     is_dev: bool = not args.production
+    if args.gc_freeze:
+        os.environ["PICAMERA_GC_FREEZE"] = "1"
+    if args.replay:
+        os.environ["PICAMERA_REPLAY"] = args.replay
+        os.environ["PICAMERA_REPLAY_MOTION"] = args.replay_motion or ""
+        os.environ["PICAMERA_REPLAY_SPEED"] = str(args.replay_speed)
 
     # import app here as it is necessary to set up the environment variables above, first
     from src.api import app  # noqa: E402
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+import typing as t
+
+from . import cpu
+
+if t.TYPE_CHECKING:
+    from .camera import Camera
+
+
+def merge_config(base: dict, update: dict) -> dict:
+    """Return `base` with `update` merged into it, recursing into nested sections.
+
+    Nested sections are always copied, as `Config.update` consumes the dict it is given.
+    """
+    merged = dict(base)
+    for key, val in update.items():
+        if isinstance(val, dict):
+            existing = merged.get(key)
+            merged[key] = merge_config(existing if isinstance(existing, dict) else {}, val)
+        else:
+            merged[key] = val
+    return merged
+
+
+class _Configure(t.NamedTuple):
+    config: dict
+    future: concurrent.futures.Future
+
+
+class _Call(t.NamedTuple):
+    fn: t.Callable
+    args: tuple
+    kwargs: dict
+    future: concurrent.futures.Future
+
+
+_STOP = object()
+
+
+class CameraActor(threading.Thread):
+    """Runs every change to the camera, in order, on a single thread named "CameraActorThread".
+
+    Changing the camera's configuration can stop and restart recording, join output threads and
+    write to disk, none of which should happen on the event loop. Instead, the API queues a
+    command and awaits the `concurrent.futures.Future` which is returned for it.
+
+    Consecutive `configure` commands are coalesced. Once one is taken off the queue, any more
+    which arrive within `coalesce_window` seconds, or which queued up whilst the previous
+    command was running, are merged and applied as one, so a burst of changes restarts the
+    camera at most once. If the merged change is rejected, each is applied on its own instead,
+    so that one bad change can't fail the others.
+
+    If given a callable which returns the camera instead, such as the `Camera` class itself,
+    the camera is constructed on the actor's thread before any command is run, so that opening
+    it doesn't hold up whoever created the actor. `ready` is set once it has been constructed,
+    or has failed to be, in which case every command fails with the same error.
+    """
+
+    def __init__(
+        self, camera: t.Union[Camera, t.Callable[[], Camera]], coalesce_window: float = 0.05
+    ):
+        super().__init__(daemon=True, name="CameraActorThread")
+        self._factory: t.Optional[t.Callable[[], Camera]] = None
+        self.camera: t.Optional[Camera] = None
+        if callable(camera):
+            self._factory = camera
+        else:
+            self.camera = camera
+        self.ready = threading.Event()
+        self.error: t.Optional[Exception] = None
+        self.coalesce_window = coalesce_window
+        self._queue: queue.Queue = queue.Queue()
+        # a command taken off the queue whilst coalescing, which must run next
+        self._next: t.Any = None
+        self._lock = threading.Lock()
+        # a description of the command currently being run, if any
+        self._running: t.Optional[str] = None
+        self._running_since: t.Optional[float] = None
+        self.commands = 0
+        self.configure_commands = 0
+        self.applies = 0
+        self.last_duration: t.Optional[float] = None
+        self.start()
+
+    def configure(self, config: dict) -> concurrent.futures.Future:
+        """Queue a change to the camera's configuration, as for `Camera.configure`."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put(_Configure(config, future))
+        return future
+
+    def submit(self, fn: t.Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Queue any other change to the camera, to be run as `fn(*args, **kwargs)`."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put(_Call(fn, args, kwargs, future))
+        return future
+
+    def _get(self) -> t.Any:
+        if self._next is not None:
+            command, self._next = self._next, None
+            return command
+        return self._queue.get()
+
+    def _run(self, description: str, fn: t.Callable, *args, **kwargs) -> t.Any:
+        with self._lock:
+            self._running = description
+            self._running_since = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.last_duration = time.monotonic() - self._running_since
+                self._running = self._running_since = None
+
+    def _configure(self, batch: t.List[_Configure]) -> None:
+        # the API's handlers await these futures, so any whose handler has since been cancelled,
+        # e.g. as the client disconnected, are dropped rather than applied
+        batch = [command for command in batch if command.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        merged: dict = {}
+        for command in batch:
+            merged = merge_config(merged, command.config)
+        self.applies += 1
+        try:
+            self._run(f"configure ({len(batch)} coalesced)", self.camera.configure, merged)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            logging.warning("Coalesced configuration rejected; applying each change separately")
+            for command in batch:
+                self.applies += 1
+                try:
+                    self._run("configure", self.camera.configure, merge_config({}, command.config))
+                except Exception as e:
+                    command.future.set_exception(e)
+                else:
+                    command.future.set_result(None)
+        else:
+            for command in batch:
+                command.future.set_result(None)
+
+    @cpu.tracked()
+    def run(self) -> None:
+        if self._factory is not None:
+            try:
+                self.camera = self._run("construct camera", self._factory)
+            except Exception as e:
+                logging.exception("Unable to construct the camera")
+                self.error = e
+        self.ready.set()
+
+        while True:
+            command = self._get()
+            if command is _STOP:
+                break
+            self.commands += 1
+            try:
+                self._handle(command)
+            except Exception as e:
+                # nothing may end the thread, as every later command would then wait forever
+                logging.exception("Unexpected error whilst running %r", command)
+                if not command.future.done():
+                    command.future.set_exception(e)
+
+    def _handle(self, command: t.Union[_Configure, _Call]) -> None:
+        if self.error is not None:
+            if command.future.set_running_or_notify_cancel():
+                command.future.set_exception(self.error)
+            return
+
+        if isinstance(command, _Configure):
+            batch = [command]
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                try:
+                    following = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if not isinstance(following, _Configure):
+                    self._next = following
+                    break
+                self.commands += 1
+                batch.append(following)
+            self.configure_commands += len(batch)
+            if len(batch) > 1:
+                logging.info("Coalescing %d configuration changes", len(batch))
+            self._configure(batch)
+            return
+
+        if not command.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self._run(command.fn.__name__, command.fn, *command.args, **command.kwargs)
+        except Exception as e:
+            command.future.set_exception(e)
+        else:
+            command.future.set_result(result)
+
+    def stats(self) -> dict:
+        """Return what the actor is doing, and what it has done."""
+        with self._lock:
+            return {
+                "running": self._running,
+                "running_for": (
+                    time.monotonic() - self._running_since
+                    if self._running_since is not None
+                    else None
+                ),
+                "queued": self._queue.qsize() + (self._next is not None),
+                "commands": self.commands,
+                "configure_commands": self.configure_commands,
+                "applies": self.applies,
+                "last_duration": self.last_duration,
+            }
+
+    def close(self) -> None:
+        """Run any commands already queued, then stop.
+
+        This method is called by MainThread.
+        """
+        self._queue.put(_STOP)
+        self.join()
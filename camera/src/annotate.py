@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import threading
+import time
+import typing as t
+
+from . import clock
+from .enums import AnnotateField
+
+
+class Annotator:
+    """Builds the text annotated onto video frames, and pushes it to the camera only on change.
+
+    `frame_end` is called by the encoder after every frame. The time is only formatted once per
+    second of wall-clock time, and the text is only rebuilt when the second, the motion state or
+    the annotated fields change, so most calls amount to an integer comparison. Pushing the text
+    to the camera is comparatively expensive, as it goes through MMAL, so it only happens when
+    the rebuilt text actually differs.
+
+    As this all runs on the encoder callback thread, the cost of every call is accounted for and
+    is available from `stats`.
+    """
+
+    TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+    def __init__(
+        self,
+        push: t.Callable[[str], None],
+        camera_name: t.Optional[str] = None,
+        fields: t.Iterable[AnnotateField] = (AnnotateField.NAME, AnnotateField.TIME),
+    ):
+        self.push = push
+        self._camera_name = camera_name
+        self._fields = list(fields)
+        self._motion = False
+        # frames per second, as counted over the most recent whole second
+        self.fps = 0
+        self._lock = threading.Lock()
+        self._second: t.Optional[int] = None
+        self._time_text = ""
+        self._frames_this_second = 0
+        # the text is rebuilt whenever this key changes
+        self._key: t.Optional[tuple] = None
+        self._version = 0
+        self.text: t.Optional[str] = None
+
+        self.updates = 0
+        self.pushes = 0
+        self.update_ns = 0
+        self.push_ns = 0
+        self.max_push_ns = 0
+
+    @property
+    def camera_name(self) -> t.Optional[str]:
+        return self._camera_name
+
+    @camera_name.setter
+    def camera_name(self, camera_name: t.Optional[str]) -> None:
+        self._camera_name = camera_name
+        self._version += 1
+
+    @property
+    def fields(self) -> t.List[AnnotateField]:
+        return list(self._fields)
+
+    @fields.setter
+    def fields(self, fields: t.Iterable[AnnotateField]) -> None:
+        self._fields = list(fields)
+        self._version += 1
+
+    @property
+    def motion(self) -> bool:
+        return self._motion
+
+    @motion.setter
+    def motion(self, motion: bool) -> None:
+        """Set whether motion is currently being detected.
+
+        This method is called by Camera.set_motion_active.
+        """
+        self._motion = motion
+
+    def _build(self) -> str:
+        parts = []
+        for field in self._fields:
+            if field == AnnotateField.NAME:
+                if self._camera_name:
+                    parts.append(self._camera_name)
+            elif field == AnnotateField.TIME:
+                parts.append(self._time_text)
+            elif field == AnnotateField.FPS:
+                parts.append(f"{self.fps}fps")
+            elif field == AnnotateField.MOTION:
+                if self._motion:
+                    parts.append("MOTION")
+        return " - ".join(parts)
+
+    def _update(self, now: float, force: bool = False, frame_end: bool = False) -> None:
+        start = time.perf_counter_ns()
+        with self._lock:
+            self.updates += 1
+            second = int(now)
+            if second != self._second:
+                if frame_end:
+                    # the count is only meaningful if the previous second had frames throughout
+                    self.fps = self._frames_this_second if self._second == second - 1 else 0
+                self._frames_this_second = 0
+                self._time_text = time.strftime(self.TIME_FORMAT, time.localtime(second))
+                self._second = second
+            if frame_end:
+                self._frames_this_second += 1
+
+            key = (second, self._motion, self._version)
+            if force or key != self._key:
+                self._key = key
+                text = self._build()
+                if force or text != self.text:
+                    self.text = text
+                    push_start = time.perf_counter_ns()
+                    self.push(text)
+                    push_ns = time.perf_counter_ns() - push_start
+                    self.pushes += 1
+                    self.push_ns += push_ns
+                    self.max_push_ns = max(self.max_push_ns, push_ns)
+            self.update_ns += time.perf_counter_ns() - start
+
+    def frame_end(self, now: t.Optional[float] = None) -> None:
+        """Update the annotation after a frame has been encoded.
+
+        The text set here appears on the subsequent frame.
+
+        This method is called by the encoder callback thread.
+        """
+        self._update(clock.now() if now is None else now, frame_end=True)
+
+    def refresh(self) -> None:
+        """Push the current annotation to the camera, regardless of whether it has changed.
+
+        This method is called just before recording starts.
+        """
+        self._update(clock.now(), force=True)
+
+    def stats(self) -> dict:
+        """Return the number and cost of annotation updates."""
+        with self._lock:
+            updates, pushes = self.updates, self.pushes
+            return {
+                "text": self.text,
+                "fps": self.fps,
+                "updates": updates,
+                "pushes": pushes,
+                "mean_update_us": self.update_ns / updates / 1_000 if updates else 0,
+                "mean_push_us": self.push_ns / pushes / 1_000 if pushes else 0,
+                "max_push_us": self.max_push_ns / 1_000,
+                "total_update_ms": self.update_ns / 1_000_000,
+            }
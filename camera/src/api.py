@@ -1,9 +1,19 @@
+import asyncio
+import functools
 import logging
+import os
+import typing as t
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+from . import cpu, enums, events, exceptions, memory, metrics, profiler, startup, tracing, types
+from .actor import CameraActor
 from .camera import Camera
+from .motion_recording import MAX_CAPACITY, MotionRecorder
+from .shadow import ShadowDetector
+from .snapshot import MAX_WIDTH, SnapshotCache
 
 
 class Output(BaseModel):
@@ -15,6 +25,34 @@ class RegisterPayload(BaseModel):
     camera_name: str
 
 
+class TracePayload(BaseModel):
+    enabled: bool
+    # the number of spans to keep per thread
+    capacity: t.Optional[int] = None
+
+
+class TracemallocPayload(BaseModel):
+    enabled: bool
+    # the number of frames of each allocation's traceback to record
+    frames: int = 1
+
+
+class MotionRecordingPayload(BaseModel):
+    enabled: bool
+    # the number of frames to keep, after which the oldest are overwritten
+    capacity: int = 18_000
+
+
+class MotionShadowPayload(BaseModel):
+    enabled: bool
+    # the settings of the candidate detector, which default to those of the live one
+    sensitivity: t.Optional[int] = None
+    min_blocks: t.Optional[int] = None
+    min_frames: t.Optional[int] = None
+    # the fraction of one core which the candidate may use
+    cpu_budget: float = 0.05
+
+
 class RestartYouTubeStreamPayload(BaseModel):
     # the number of seconds of grace to give the YouTube output before
     # forcing it to restart
@@ -23,37 +61,103 @@ class RestartYouTubeStreamPayload(BaseModel):
 
 app = FastAPI()
 
-# instantiate the camera instance. The saved configuration should be transparently
-# loaded at this point
-cam = Camera()
-# now, cam is fully configured, but it won't begin doing anything until we call .start()
 
+def _construct_camera() -> Camera:
+    # instantiate the camera instance. The saved configuration should be transparently
+    # loaded at this point
+    backend = None
+    if os.environ.get("PICAMERA_REPLAY"):
+        # replay a recording instead of opening the camera, to run on a machine without one
+        from .fake_camera import FakePiCamera, Recording
 
-@app.on_event("startup")
-def startup():
+        recording = Recording(
+            os.environ["PICAMERA_REPLAY"], os.environ.get("PICAMERA_REPLAY_MOTION") or None
+        )
+        speed = float(os.environ.get("PICAMERA_REPLAY_SPEED", 1))
+        backend = functools.partial(FakePiCamera, recording, speed=speed)
+    cam = Camera(backend=backend)
+    startup.reached("camera_constructed")
+    # now, cam is fully configured, but it won't begin doing anything until we call .start()
+    return cam
+
+
+# every change to the camera runs on the actor's thread, so that handlers never block the event
+# loop whilst the camera restarts, and so that changes are never applied concurrently. Opening
+# the camera takes a while too, so it is constructed on the actor's thread, and the app answers
+# /ping in the meantime. Changes made before then are queued until it has been constructed
+actor = CameraActor(_construct_camera)
+
+
+def _camera() -> Camera:
+    """Return the camera, or respond with 503 Service Unavailable if it isn't open yet."""
+    if not actor.ready.is_set():
+        raise HTTPException(status_code=503, detail="The camera is still starting up")
+    if actor.camera is None:
+        raise HTTPException(status_code=503, detail=f"The camera failed to start: {actor.error}")
+    return actor.camera
+
+
+def _key_frame():
+    return actor.camera.video_output.key_frame if actor.camera is not None else None
+
+
+# many dashboard clients may poll for thumbnails at once, so decoded snapshots are shared
+snapshots = SnapshotCache(_key_frame)
+
+startup.reached("imported")
+
+
+def _start() -> None:
+    cam = actor.camera
     # start the outputs running if we are registered with a server
     if cam.server_address:
         cam.start()
 
 
+@app.on_event("startup")
+def on_startup():
+    startup.reached("serving")
+    memory.GC.install()
+    actor.submit(_start)
+    # the camera's long-lived objects have all been created once it has started, and needn't be
+    # scanned by every full collection whilst streaming. This runs on the actor's thread, so
+    # that it happens after the camera has started
+    if os.environ.get("PICAMERA_GC_FREEZE"):
+        actor.submit(memory.freeze)
+
+
 @app.on_event("shutdown")
 def shutdown():
     # we need to ensure we free up the camera when shutting down
     logging.info("Closing camera")
+    actor.close()
+    cam = actor.camera
+    if cam is None:
+        return
     if cam.running:
         cam.stop()
     cam.close()
 
 
 @app.get("/ping")
-def ping():
-    cam.configure({"camera": {"vflip": not cam.vflip}})
+async def ping():
     return "pong"
 
 
-@app.post("/register")
-async def register(payload: RegisterPayload, request: Request):
-    """Called when this camera receives a request to be paired with the server."""
+@app.get("/startup")
+async def get_startup():
+    """Return whether the camera is open yet, and how many seconds after the process started
+    each stage of startup (e.g. "first_frame") was reached.
+    """
+    return {
+        "ready": actor.camera is not None,
+        "error": str(actor.error) if actor.error is not None else None,
+        "stages": startup.stages(),
+    }
+
+
+def _register(server_address: dict, camera_name: str) -> None:
+    cam = actor.camera
     if cam.server_address:
         logging.warning(
             "This camera is already registered with a server located at %s - previous "
@@ -66,14 +170,9 @@ async def register(payload: RegisterPayload, request: Request):
     # double check that the config file is initially set to its default values
     cam.config.reset()
 
-    # compile the basic parameters to save for the new camera
-    server_ip = request.client.host
-    server_port = payload.port
-    server_address = {"ip": server_ip, "port": server_port}
-
     new_cam_config = {
         "server_address": server_address,
-        "camera": {"name": payload.camera_name},
+        "camera": {"name": camera_name},
         # TODO: rather than hard coding a port, we could use an OS-designated port when
         # initialising the network output socket and set that as a config parameter. The
         # server could then just ask for the config and the port would be there
@@ -85,27 +184,340 @@ async def register(payload: RegisterPayload, request: Request):
     logging.info("Camera successfully registered with the server located at %s", server_address)
     cam.start()
 
+
+@app.post("/register")
+async def register(payload: RegisterPayload, request: Request):
+    """Called when this camera receives a request to be paired with the server."""
+    # compile the basic parameters to save for the new camera
+    server_address = {"ip": request.client.host, "port": payload.port}
+    await asyncio.wrap_future(actor.submit(_register, server_address, payload.camera_name))
+
     return {"status": "success", "message": f"Registered camera at {request.headers['host']}"}
 
 
-@app.post("/unregister")
-async def unregister(request: Request):
+def _unregister() -> None:
+    cam = actor.camera
     # reset the config file to defaults so it's nice and fresh when it is re-registered
     cam.stop()
     cam.config.clear()
+
+
+@app.post("/unregister")
+async def unregister(request: Request):
+    await asyncio.wrap_future(actor.submit(_unregister))
     logging.info("Camera successfully unregistered")
     return {"status": "success", "message": f"Unregistered camera at {request.headers['host']}"}
 
 
+def _state() -> dict:
+    cam = actor.camera
+    if cam is None:
+        return {"ready": False}
+    return {
+        "ready": True,
+        "running": cam.running,
+        "outputs": [output.value for output in enums.OutputName if cam.output_enabled(output)],
+        "motion": cam.sei.motion,
+        "config_version": cam.config.version,
+        "config": cam.config.to_dict(),
+    }
+
+
+@app.get("/events")
+async def get_events(request: Request):
+    """Stream changes to the camera's state, and its telemetry, as server-sent events.
+
+    A "state" event describing the camera as it is now is sent first, followed by each "camera",
+    "output", "motion", "config" and "stats" event as it happens. Clients reconnecting with the
+    Last-Event-ID header are sent the events they missed instead.
+    """
+    try:
+        last_id: t.Optional[int] = int(request.headers["last-event-id"])
+    except (KeyError, ValueError):
+        last_id = None
+
+    async def stream() -> t.AsyncIterator[bytes]:
+        since = last_id
+        if since is None:
+            # any event published whilst the state is being read is sent straight after it
+            since = events.EVENTS.last_id
+            yield events.format_event("state", _state())
+        async for chunk in events.EVENTS.stream(since):
+            yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # stop proxies, e.g. nginx, from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/config")
 async def get_config():
-    return cam.config.to_dict()
+    return _camera().config.to_dict()
+
+
+@app.get("/snapshot")
+def get_snapshot(width: t.Optional[int] = Query(None, gt=0, le=MAX_WIDTH)):
+    """Return a JPEG of the most recent key frame, optionally scaled to the given width.
+
+    This is deliberately not an async function, so that decoding runs in the threadpool rather
+    than blocking the event loop.
+    """
+    try:
+        snapshot = snapshots.get(width)
+    except exceptions.SnapshotDecodeFailed as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="No key frame available yet")
+    return Response(
+        content=snapshot.jpeg,
+        media_type="image/jpeg",
+        headers={"X-Frame-Num": str(snapshot.frame_num)},
+    )
+
+
+@app.get("/spool")
+async def get_spool_metrics():
+    """Return the depth and drain rate of the queue of uploads waiting to be sent to the server."""
+    return _camera().spool.metrics()
+
+
+@app.get("/annotation")
+async def get_annotation_stats():
+    """Return the current annotation text, and how often and how expensively it is updated."""
+    return _camera().annotator.stats()
+
+
+@app.get("/sei")
+async def get_sei_stats():
+    """Return how many frames have had metadata embedded, and the cost of doing so."""
+    return _camera().sei.stats()
+
+
+@app.get("/actor")
+async def get_actor_stats():
+    """Return what the camera's actor thread is doing, and how many changes it has coalesced."""
+    return actor.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Return the health of the pipeline, in Prometheus's text exposition format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/trace")
+async def set_tracing(payload: TracePayload):
+    """Start or stop tracing frames through the pipeline."""
+    if payload.enabled:
+        tracing.TRACER.enable(payload.capacity)
+    else:
+        tracing.TRACER.disable()
+    return tracing.TRACER.stats()
+
+
+@app.get("/trace")
+def get_trace(seconds: float = 10):
+    """Return the spans traced in the last `seconds`, as Chrome trace-event JSON.
+
+    Save the response to a file and open it in ui.perfetto.dev or chrome://tracing. This is
+    deliberately not an async function, as a long trace takes a while to build.
+    """
+    # the response is built directly, as FastAPI's own encoding is slow for so many events
+    return JSONResponse(tracing.TRACER.export(seconds))
+
+
+@app.post("/debug/profile")
+def post_profile(seconds: float = 10, rate: float = 100):
+    """Sample the stack of every thread for `seconds`, at `rate` samples per second.
+
+    The stacks are returned in the collapsed format read by flame graph tools, such as
+    flamegraph.pl or speedscope. This is deliberately not an async function, so that sampling
+    runs in the threadpool rather than blocking the event loop.
+    """
+    if not 0 < seconds <= 300 or not 0 < rate <= 1000:
+        raise HTTPException(
+            status_code=400, detail="seconds must be in (0, 300] and rate in (0, 1000]"
+        )
+    try:
+        result = profiler.profile(seconds, rate)
+    except exceptions.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        content=result.collapsed(),
+        media_type="text/plain",
+        headers={
+            "X-Profile-Samples": str(result.samples),
+            # the fraction of the time spent sampling, rather than running the camera
+            "X-Profile-Overhead": f"{result.overhead:.4f}",
+        },
+    )
+
+
+@app.get("/debug/cpu")
+def get_cpu(seconds: float = 2):
+    """Return the number of cores used by each output, thread, and helper process (e.g. ffmpeg),
+    measured over `seconds`.
+
+    This is deliberately not an async function, so that it waits in the threadpool rather than
+    blocking the event loop.
+    """
+    if not 0 < seconds <= 60:
+        raise HTTPException(status_code=400, detail="seconds must be in (0, 60]")
+    return cpu.ACCOUNTING.sample(seconds)
+
+
+def _set_motion_recording(payload: MotionRecordingPayload) -> dict:
+    motion_output = actor.camera.motion_output
+    recorder = None
+    if payload.enabled:
+        recorder = MotionRecorder(Camera.MOTION_RECORDING_PATH, payload.capacity)
+        try:
+            recorder.check_space(*types.motion_shape(*motion_output.camera.resolution))
+        except exceptions.InsufficientSpace as e:
+            raise HTTPException(status_code=507, detail=str(e))
+
+    # the last recording is closed before the next is started, as they share the same file
+    previous, motion_output.recorder = motion_output.recorder, None
+    if previous is not None:
+        previous.close()
+    motion_output.recorder = recorder
+    return recorder.stats() if recorder is not None else {}
+
+
+@app.post("/debug/motion/recording")
+async def set_motion_recording(payload: MotionRecordingPayload):
+    """Start or stop recording every frame of motion vectors to disk, for tuning the motion
+    detector offline with benchmarks/motion_replay.py.
+
+    Starting a recording replaces the last one, unless there isn't the space for it. The size of
+    the recording's file is returned in `bytes`. Like any other change to the camera, this is run
+    by the camera's actor, so that it can't interleave with a restart or reconfiguration.
+    """
+    _camera()
+    if payload.enabled and not 1 <= payload.capacity <= MAX_CAPACITY:
+        raise HTTPException(status_code=400, detail=f"capacity must be in [1, {MAX_CAPACITY}]")
+    return await asyncio.wrap_future(actor.submit(_set_motion_recording, payload))
+
+
+@app.get("/debug/motion/recording")
+def get_motion_recording():
+    recorder = _camera().motion_output.recorder
+    return recorder.stats() if recorder is not None else {}
+
+
+def _set_motion_shadow(payload: MotionShadowPayload) -> dict:
+    cam = actor.camera
+    motion_output = cam.motion_output
+    if payload.enabled and not cam.output_enabled(enums.OutputName.MOTION):
+        raise HTTPException(status_code=409, detail="The motion output isn't enabled")
+    shadow, motion_output.shadow = motion_output.shadow, None
+    if shadow is not None:
+        shadow.close()
+    if payload.enabled:
+        # imported here, as it imports scipy, which is slow to import and may never be needed
+        from .outputs.motion_output import DetectMotion
+
+        live = cam.config.output(enums.OutputName.MOTION)
+        settings = {}
+        for name in ("sensitivity", "min_blocks", "min_frames"):
+            value = getattr(payload, name)
+            settings[name] = value if value is not None else getattr(live, name)
+        shadow = motion_output.shadow = ShadowDetector(DetectMotion(**settings), payload.cpu_budget)
+    return shadow.stats() if shadow is not None else {}
+
+
+@app.post("/debug/motion/shadow")
+async def set_motion_shadow(payload: MotionShadowPayload):
+    """Start or stop running a candidate motion detector alongside the live one, to compare
+    their decisions and costs on the camera's own frames. The candidate never triggers a
+    recording.
+
+    Starting a candidate replaces the last one. Like any other change to the camera, this is run
+    by the camera's actor.
+    """
+    _camera()
+    if payload.enabled and not 0 < payload.cpu_budget <= 1:
+        raise HTTPException(status_code=400, detail="cpu_budget must be in (0, 1]")
+    return await asyncio.wrap_future(actor.submit(_set_motion_shadow, payload))
+
+
+@app.get("/debug/motion/shadow")
+def get_motion_shadow():
+    shadow = _camera().motion_output.shadow
+    return shadow.stats() if shadow is not None else {}
+
+
+@app.post("/debug/memory/tracemalloc")
+async def set_tracemalloc(payload: TracemallocPayload):
+    """Start or stop tracing allocations, which snapshots need."""
+    if payload.enabled:
+        if not 1 <= payload.frames <= 64:
+            raise HTTPException(status_code=400, detail="frames must be in [1, 64]")
+        memory.SNAPSHOTS.start(payload.frames)
+    else:
+        memory.SNAPSHOTS.stop()
+    return memory.SNAPSHOTS.stats()
+
+
+@app.get("/debug/memory/tracemalloc")
+async def get_tracemalloc():
+    return memory.SNAPSHOTS.stats()
+
+
+@app.post("/debug/memory/snapshots")
+def take_memory_snapshot(top: int = 20, group_by: str = "lineno"):
+    """Take a tracemalloc snapshot, returning its id and the places holding the most memory.
+
+    This is deliberately not an async function, as taking a snapshot takes a while.
+    """
+    try:
+        return memory.SNAPSHOTS.top(memory.SNAPSHOTS.take(), top, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/debug/memory/snapshots/{snapshot_id}")
+def get_memory_snapshot(
+    snapshot_id: int, top: int = 20, group_by: str = "lineno", compare_to: t.Optional[int] = None
+):
+    """Return the places holding the most memory in a snapshot or, given another snapshot's id
+    to `compare_to`, those whose memory grew or shrank the most since it was taken.
+    """
+    try:
+        if compare_to is None:
+            return memory.SNAPSHOTS.top(snapshot_id, top, group_by)
+        return memory.SNAPSHOTS.diff(snapshot_id, compare_to, top, group_by)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/debug/memory/buffers")
+async def get_memory_buffers():
+    """Return the bytes held by each buffer, the process's resident memory, and its open files."""
+    return memory.buffers()
+
+
+@app.get("/debug/gc")
+async def get_gc_stats():
+    """Return how often garbage has been collected, and for how long each collection paused."""
+    return memory.GC.stats()
+
+
+@app.post("/debug/gc/freeze")
+async def freeze_gc():
+    """Stop the garbage collector from scanning any object which is currently alive."""
+    return {"frozen": memory.freeze()}
 
 
 @app.post("/config")
 async def set_config(new_config: dict):
     print(new_config)
-    cam.config.update(new_config)
+    await asyncio.wrap_future(actor.configure(new_config))
 
 
 @app.post("/enable-output")
@@ -118,7 +530,7 @@ async def enable_output(output: Output, request: Request):
     if "youtube_ingestion_url" in extra:
         settings_to_update["youtube_ingestion_url"] = extra["youtube_ingestion_url"]
 
-    cam.config.update(settings_to_update)
+    await asyncio.wrap_future(actor.configure(settings_to_update))
 
     return f"{output.output_type} output enabled"
 
@@ -127,7 +539,7 @@ async def enable_output(output: Output, request: Request):
 async def disable_output(output: Output):
     try:
         out = output.output_type
-        cam.config.update({f"{out}_enabled": False})
+        await asyncio.wrap_future(actor.configure({f"{out}_enabled": False}))
     except Exception:  # noqa
         print(f"error whilst disabling {output.output_type} output")
         import traceback
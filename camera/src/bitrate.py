@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import typing as t
+from collections import deque
+
+from . import cpu
+
+
+class SendWindow(t.NamedTuple):
+    """Network send statistics gathered over a single window of time."""
+
+    duration: float
+    frames: int
+    # total time spent blocked in `socket.sendall`
+    send_time: float
+    # frames which were produced but never sent, because the previous frame was still sending
+    skipped: int
+    # bytes sitting unsent in the kernel's socket buffer at the start and end of the window
+    queued_start: int
+    queued_end: int
+
+    @property
+    def send_utilisation(self) -> float:
+        """Return the fraction of the window that was spent sending."""
+        return self.send_time / self.duration if self.duration else 0
+
+    @property
+    def skipped_ratio(self) -> float:
+        """Return the fraction of frames produced in the window which were never sent."""
+        produced = self.frames + self.skipped
+        return self.skipped / produced if produced else 0
+
+    @property
+    def queue_growth(self) -> int:
+        return self.queued_end - self.queued_start
+
+
+class SendStats:
+    """Accumulates per-frame send statistics from a network stream's socket thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset(queued=0)
+
+    def _reset(self, queued: int) -> None:
+        self._started_at = time.monotonic()
+        self._frames = 0
+        self._send_time = 0.0
+        self._skipped = 0
+        self._queued_start = self._queued_end = queued
+
+    def record(self, send_time: float, skipped: int, queued: int) -> None:
+        """Record the sending of a single frame.
+
+        This method is called by the socket thread.
+        """
+        with self._lock:
+            self._frames += 1
+            self._send_time += send_time
+            self._skipped += skipped
+            self._queued_end = queued
+
+    def take(self) -> SendWindow:
+        """Return the statistics gathered since the last call, and start a new window.
+
+        This method is called by BitrateControllerThread.
+        """
+        with self._lock:
+            window = SendWindow(
+                duration=time.monotonic() - self._started_at,
+                frames=self._frames,
+                send_time=self._send_time,
+                skipped=self._skipped,
+                queued_start=self._queued_start,
+                queued_end=self._queued_end,
+            )
+            self._reset(queued=self._queued_end)
+        return window
+
+
+class Decision(t.NamedTuple):
+    """The outcome of evaluating a single window of send statistics."""
+
+    action: str  # one of "down", "up" or "hold"
+    old_bitrate: int
+    new_bitrate: int
+    reason: str
+    window: SendWindow
+
+
+class BitrateController(threading.Thread):
+    """Adapts the bitrate of a video stream to the throughput of the network it is sent over.
+
+    Every `window` seconds, the send statistics of the stream are evaluated. A window is
+    congested if frames were skipped, if most of it was spent blocked on sending or if the
+    kernel's send queue grew significantly. It is healthy if nothing was skipped and sending
+    was comfortably quick. Anything in between leaves the bitrate alone.
+
+    The bitrate steps down multiplicatively after `down_after` consecutive congested windows
+    and steps back up, more gently, only after `up_after` consecutive healthy windows, so that
+    it doesn't oscillate around the link's capacity. It always stays within
+    [`min_bitrate`, `max_bitrate`].
+    """
+
+    def __init__(
+        self,
+        stats: SendStats,
+        get_bitrate: t.Callable[[], int],
+        set_bitrate: t.Callable[[int], str],
+        min_bitrate: int,
+        max_bitrate: int,
+        window: float = 2,
+        down_after: int = 1,
+        up_after: int = 5,
+        down_factor: float = 0.7,
+        up_factor: float = 1.15,
+        congested_utilisation: float = 0.8,
+        healthy_utilisation: float = 0.4,
+        congested_skipped_ratio: float = 0.05,
+        congested_queue_bytes: int = 64 * 1024,
+    ):
+        super().__init__(daemon=True, name="BitrateControllerThread")
+        self.stats = stats
+        self.get_bitrate = get_bitrate
+        # applies the new bitrate and returns a short description of how it was applied
+        self.set_bitrate = set_bitrate
+        self.min_bitrate = min_bitrate
+        self.max_bitrate = max_bitrate
+        self.window = window
+        self.down_after = down_after
+        self.up_after = up_after
+        self.down_factor = down_factor
+        self.up_factor = up_factor
+        self.congested_utilisation = congested_utilisation
+        self.healthy_utilisation = healthy_utilisation
+        self.congested_skipped_ratio = congested_skipped_ratio
+        self.congested_queue_bytes = congested_queue_bytes
+        # recent decisions, most recent last
+        self.decisions: t.Deque[Decision] = deque(maxlen=100)
+        self._congested_windows = 0
+        self._healthy_windows = 0
+        self._closed = threading.Event()
+        self.start()
+
+    def _clamp(self, bitrate: float) -> int:
+        # round to the nearest 10kbps to keep the logs readable
+        bitrate = int(round(bitrate, -4))
+        return max(self.min_bitrate, min(self.max_bitrate, bitrate))
+
+    def evaluate(self, window: SendWindow, bitrate: int) -> Decision:
+        """Decide what the bitrate should be, given the statistics of the most recent window."""
+        if window.skipped_ratio > self.congested_skipped_ratio:
+            congested = f"{window.skipped} frames skipped"
+        elif window.send_utilisation > self.congested_utilisation:
+            congested = f"send utilisation {window.send_utilisation:.0%}"
+        elif window.queue_growth > 0 and window.queued_end > self.congested_queue_bytes:
+            congested = f"send queue grew to {window.queued_end} bytes"
+        else:
+            congested = None
+        healthy = (
+            congested is None
+            and window.skipped == 0
+            and window.send_utilisation < self.healthy_utilisation
+            and window.queued_end < self.congested_queue_bytes
+        )
+
+        if congested is not None:
+            self._congested_windows += 1
+            self._healthy_windows = 0
+        elif healthy:
+            self._healthy_windows += 1
+            self._congested_windows = 0
+        else:
+            self._congested_windows = self._healthy_windows = 0
+
+        action, new_bitrate = "hold", bitrate
+        if congested is not None:
+            reason = congested
+            if self._congested_windows >= self.down_after:
+                new_bitrate = self._clamp(bitrate * self.down_factor)
+                if new_bitrate < bitrate:
+                    action = "down"
+                else:
+                    reason += "; already at minimum"
+        elif healthy:
+            reason = f"healthy for {self._healthy_windows} windows"
+            if self._healthy_windows >= self.up_after:
+                new_bitrate = self._clamp(bitrate * self.up_factor)
+                if new_bitrate > bitrate:
+                    action = "up"
+        else:
+            reason = "neither congested nor healthy"
+
+        if action != "hold":
+            # hysteresis starts afresh after every change
+            self._congested_windows = self._healthy_windows = 0
+        else:
+            new_bitrate = bitrate
+
+        return Decision(action, bitrate, new_bitrate, reason, window)
+
+    @cpu.tracked("network")
+    def run(self) -> None:
+        while not self._closed.wait(self.window):
+            window = self.stats.take()
+            if not window.frames:
+                # nobody is connected, so there is nothing to adapt to
+                continue
+
+            decision = self.evaluate(window, self.get_bitrate())
+            self.decisions.append(decision)
+            applied_by = "-"
+            if decision.action != "hold":
+                try:
+                    applied_by = self.set_bitrate(decision.new_bitrate)
+                except Exception:
+                    logging.exception("Failed to change bitrate to %d", decision.new_bitrate)
+                    continue
+
+            logging.info(
+                "Bitrate %s %d -> %d (applied by: %s) because %s: frames=%d send_time=%.3fs "
+                "send_util=%.2f skipped=%d queued=%d->%d",
+                decision.action,
+                decision.old_bitrate,
+                decision.new_bitrate,
+                applied_by,
+                decision.reason,
+                window.frames,
+                window.send_time,
+                window.send_utilisation,
+                window.skipped,
+                window.queued_start,
+                window.queued_end,
+            )
+
+    def close(self) -> None:
+        """Stop adapting the bitrate.
+
+        This method is called by MainThread.
+        """
+        self._closed.set()
+        self.join()
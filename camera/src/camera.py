@@ -2,92 +2,183 @@ from __future__ import annotations
 
 import logging
 import threading
-import time
 import typing as t
+from pathlib import Path
 
 import numpy as np
-import picamerax
-from picamerax.array import PiMotionAnalysis
 
-from . import encoders, enums, exceptions, outputs
+from . import clock, enums, events, exceptions, metrics, outputs, startup, tracing
+from .annotate import Annotator
 from . import schema as s
 from . import types
 from .config import Config
+from .motion_recording import MotionRecorder
 from .outputs import bases
+from .sei import SEIInjector
+from .shadow import ShadowDetector
+from .spool import UploadSpool
 
 if t.TYPE_CHECKING:
+    import picamerax
+
     from .config import ServerAddress
 
 
-class _TimestampedPiCamera(picamerax.PiCamera):
-    """PiCamera object which includes timestamps on captures and videos by default."""
+class _RecordingOutput:
+    """The custom output passed to `PiCamera.start_recording` for a single splitter port.
 
-    def _get_image_encoder(self, camera_port, output_port, format_, resize, **options):
-        """Add a timestamp to every captured image."""
-        return encoders.TimestampedImageEncoder(
-            self, camera_port, output_port, format_, resize, **options
-        )
+    The `write` method is called repeatedly by the owning `PiCamera` instance when recording
+    is active, and receives the most recently recorded frame data as a sequence of bytes.
+    During each execution of the `write` method, we can find out more about the current
+    frame from the encoder attached to the splitter port, which returns a PiVideoFrame object.
+    More often than not, a single call to `write` will contain all the data for a single frame,
+    although, occassionally a frame may be split across mutliple `write` calls if it is
+    especially large. For convenience, we gather combine data across multiple calls to `write`,
+    so that the `VideoOutput` always receives a full frame.
+
+    `PiCamera.frame` isn't used, because when more than one recording is active it may describe
+    a frame from any of them.
+    """
+
+    def __init__(self, video_output: VideoOutput, splitter_port: int):
+        self.video_output = video_output
+        self.splitter_port = splitter_port
+        self._current_frame_data = b""
+
+    def write(self, frame_part: bytes) -> None:
+        start = tracing.start()
+        self._current_frame_data += frame_part
+        pi_frame = self.video_output.camera._encoders[self.splitter_port].frame
+        if pi_frame.complete:
+            data = self._current_frame_data
+            self._current_frame_data = b""
+            self.video_output.publish(self.splitter_port, data, pi_frame.frame_type)
+        tracing.end("encoder_write", start)
 
-    def _get_video_encoder(self, camera_port, output_port, format_, resize, **options):
-        """Add a timestamp to video recordings."""
-        return encoders.TimestampedVideoEncoder(
-            self, camera_port, output_port, format_, resize, **options
-        )
+
+class _GatedMotionOutput:
+    """Forwards motion data to a `MotionOutput` only whilst its recording is the active one."""
+
+    def __init__(self, motion_output: MotionOutput, video_output: VideoOutput, splitter_port: int):
+        self.motion_output = motion_output
+        self.video_output = video_output
+        self.splitter_port = splitter_port
+
+    def write(self, motion_data: bytes) -> None:
+        if self.video_output.splitter_port == self.splitter_port:
+            self.motion_output.write(motion_data)
 
 
 class VideoOutput:
     """This class is intended to be used as a custom output when recording video.
 
     It works in unison with subclasses of `BaseOutput` to coordinate the processing of video
-    data.
-
-    The `write` method is called repeatedly by the owning `PiCamera` instance when recording
-    is active, and receives the most recently recorded frame data as a sequence of bytes.
-    During each execution of the `write` method, we can find out more about the current
-    frame from the `PiCamera.frame` attribute, which returns a PiVideoFrame object. More often
-    than not, a single call to `write` will contain all the data for a single frame, although,
-    occassionally a frame may be split across mutliple `write` calls if it is especially large.
-    For convenience, we gather combine data across multiple calls to `write`, so that anything
-    downstream knows that it will always receive a full frame.
+    data. Complete frames are published to it by the `_RecordingOutput` of the recording on
+    `splitter_port`, which is obtained from `recording_output`.
 
     A `threading.Event` object is the central synchronisation primitive, which we use to
     notify any other interested parties that a new frame is available. Rather than just make the
     frame data available as raw bytes, we package it into a `Frame` object which contains additional
     useful metadata such as a timestamp and the frame type.
+
+    The recording can be handed over to another splitter port, for example to change the bitrate
+    without stopping the stream. Frames from the new recording are discarded until its first SPS
+    header, from which point frames from the old recording are discarded instead. Downstream
+    parties see a single, continuously numbered sequence of frames throughout.
+
+    If given an `SEIInjector`, every frame other than SPS headers is prefixed with an SEI NAL
+    unit carrying its capture time, frame number and the motion state.
+
+    Published frames are counted in the metrics under `name`.
     """
 
-    def __init__(self, camera: Camera):
+    def __init__(
+        self,
+        camera: Camera,
+        splitter_port: int = 1,
+        sei: t.Optional[SEIInjector] = None,
+        name: str = "main",
+    ):
         self.camera = camera
+        self.splitter_port = splitter_port
+        self.sei = sei
+        self._frames_published = metrics.FRAMES_PUBLISHED.labels(name)
         self.event = threading.Event()
         self.frame: t.Optional[types.VideoFrame] = None
+        # the most recent SPS header and the I-frame which immediately followed it. Together,
+        # they can be decoded to an image without reference to any other frames
+        self.key_frame: t.Optional[t.Tuple[types.VideoFrame, types.VideoFrame]] = None
+        # the splitter port of a recording which is about to take over from the current one
+        self.pending_splitter_port: t.Optional[int] = None
+        # set once the pending recording has taken over
+        self.handed_over = threading.Event()
+        # frames may be published from two recordings at once during a handover
+        self._lock = threading.Lock()
         self._frame_num = 0
-        self._current_frame_data = b""
 
-    def write(self, frame_part: bytes) -> None:
+    def recording_output(self) -> _RecordingOutput:
+        """Return the output to record to on the current splitter port."""
+        return _RecordingOutput(self, self.splitter_port)
+
+    def hand_over(self, splitter_port: int) -> _RecordingOutput:
+        """Return the output to record to on `splitter_port`, which will take over at its first
+        SPS header.
+        """
+        with self._lock:
+            self.handed_over.clear()
+            self.pending_splitter_port = splitter_port
+        return _RecordingOutput(self, splitter_port)
+
+    def cancel_hand_over(self) -> bool:
+        """Abandon a pending handover, returning False if it has in fact already happened."""
+        with self._lock:
+            self.pending_splitter_port = None
+            return not self.handed_over.is_set()
+
+    def publish(self, splitter_port: int, data: bytes, frame_type: int) -> None:
         """Notify parties of a new, complete frame being available."""
-        self._current_frame_data += frame_part
-        pi_frame = self.camera.frame
-        if pi_frame.complete:
+        start = tracing.start()
+        with self._lock:
+            if splitter_port != self.splitter_port:
+                if (
+                    splitter_port != self.pending_splitter_port
+                    or frame_type != types.VideoFrameType.sps_header
+                ):
+                    return
+                self.splitter_port = splitter_port
+                self.pending_splitter_port = None
+                self.handed_over.set()
+
+            prev_frame = self.frame
+            timestamp = clock.now()
+            if self.sei is not None and frame_type != types.VideoFrameType.sps_header:
+                data = self.sei.inject(data, self._frame_num, timestamp)
             self.frame = types.VideoFrame(
-                data=self._current_frame_data,
+                data=data,
                 frame_num=self._frame_num,
-                timestamp=time.time(),
-                frame_type=pi_frame.frame_type,
+                timestamp=timestamp,
+                frame_type=frame_type,
             )
-            self._current_frame_data = b""
+            if self._frame_num == 0:
+                startup.reached("first_frame", timestamp)
             self._frame_num += 1
+            self._frames_published.inc()
+            if self.frame.key_frame and prev_frame is not None and prev_frame.sps_header:
+                self.key_frame = (prev_frame, self.frame)
             self.event.set()
             self.event.clear()
+            tracing.end("publish", start, self.frame.frame_num)
 
 
-class MotionOutput(PiMotionAnalysis):
+class MotionOutput:
     """Stub output attached to the PiCamera recording motion output.
 
     This class simply takes the motion vector data (in np.ndarray form) and sends out a notification
     to any interested parties when a new array of motion data (i.e. a frame) is available.
 
-    By subclassing PiMotionAnalysis, this motion data is nicely pre-parsed into a numpy array
-    for further processing.
+    As with picamerax's PiMotionAnalysis, which isn't subclassed so that picamerax needn't be
+    imported, the motion data written by the encoder is parsed into a numpy array, with a record
+    for each macroblock, plus an extra column.
 
     Attributes:
         event: a threading.Event object which can by waited upon by interested parties. This
@@ -96,17 +187,37 @@ class MotionOutput(PiMotionAnalysis):
     """
 
     def __init__(self, camera: picamerax.PiCamera):
-        super().__init__(camera)
+        self.camera = camera
+        # the shape of the motion data, which is worked out from the first frame
+        self.rows: t.Optional[int] = None
+        self.cols: t.Optional[int] = None
         self.event = threading.Event()
         self.motion_frame: t.Optional[types.MotionFrame] = None
         self._frame_num = 0
+        self._frames_published = metrics.FRAMES_PUBLISHED.labels("motion")
+        # if set, every frame is recorded to disk, e.g. for tuning the motion detector offline
+        self.recorder: t.Optional[MotionRecorder] = None
+        # if set, a candidate detector is run alongside the motion output's, for comparison
+        self.shadow: t.Optional[ShadowDetector] = None
+
+    def write(self, data: bytes) -> int:
+        if self.cols is None:
+            self.rows, self.cols = types.motion_shape(*self.camera.resolution)
+        self.analyze(np.frombuffer(data, dtype=types.motion_dtype).reshape(self.rows, self.cols))
+        return len(data)
 
     def analyze(self, motion_data: np.ndarray):
         """Notify parties of a new frame's worth of motion vector data is available."""
-        self.motion_frame = types.MotionFrame(motion_data, self._frame_num, time.time())
+        start = tracing.start()
+        self.motion_frame = types.MotionFrame(motion_data, self._frame_num, clock.now())
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(self.motion_frame)
         self._frame_num += 1
+        self._frames_published.inc()
         self.event.set()
         self.event.clear()
+        tracing.end("analyze", start, self.motion_frame.frame_num)
 
 
 class Camera:
@@ -123,26 +234,74 @@ class Camera:
 
     _outputs: t.Dict[str, bases.BaseOutput] = {}
 
-    def __init__(self, config_path: str = None):
+    SPOOL_DIR = Path("data/spool")
+
+    # where motion vectors are recorded to, whilst recording them is enabled
+    MOTION_RECORDING_PATH = Path("data/motion_vectors.npy")
+
+    # the splitter port used to record the optional, lower resolution secondary stream
+    SECONDARY_SPLITTER_PORT = 2
+
+    # the splitter ports which the main video stream may be recorded from. Port 0 is left free
+    # for captures, and the secondary stream always uses its own port
+    SPLITTER_PORTS = (1, 3)
+
+    # how long to wait for a new recording to produce its first SPS header during a handover
+    HANDOVER_TIMEOUT = 2
+
+    def __init__(self, config_path: str = None, backend: t.Callable[[], picamerax.PiCamera] = None):
         logging.info("Initialising camera")
-        try:
-            self._camera = _TimestampedPiCamera()
-        except picamerax.PiCameraMMALError:
-            raise exceptions.CameraNotAvailable()
+        # a different backend, such as `fake_camera.FakePiCamera`, can be used to run without any
+        # camera hardware
+        if backend is not None:
+            self._camera = backend()
+            # the errors raised by the backend, beyond RuntimeErrors
+            self._camera_errors: t.Tuple[t.Type[Exception], ...] = ()
+        else:
+            # picamerax is only imported for the real camera, as it needs the Pi's own libraries
+            import picamerax
+
+            from .encoders import TimestampedPiCamera
+
+            try:
+                self._camera = TimestampedPiCamera()
+            except picamerax.PiCameraMMALError:
+                raise exceptions.CameraNotAvailable()
+            self._camera_errors = (picamerax.PiCameraError,)
 
         # check we are running a supported camera i.e. the V2 module or the HQ camera
         self._ensure_camera_supported()
 
         self.running = False
 
+        # guards starting and stopping recordings, which may happen from outside MainThread
+        self._recording_lock = threading.RLock()
+        self._effective_bitrate: t.Optional[int] = None
+
+        # embeds the capture time, frame number and motion state of each frame into the stream
+        self.sei = SEIInjector()
+
         # initialise the outputs we will use with the `camera.start_recording` method
-        self.video_output = VideoOutput(self._camera)
+        self.video_output = VideoOutput(self._camera, sei=self.sei)
+        self.secondary_video_output = VideoOutput(
+            self._camera, splitter_port=self.SECONDARY_SPLITTER_PORT, sei=self.sei, name="secondary"
+        )
         self.motion_output = MotionOutput(self._camera)
 
+        # builds the timestamp, and any other text, which is annotated onto every frame
+        self.annotator = Annotator(push=self._annotate)
+
         # load the config
         self.config = Config(self, config_path)
         self.config.init()
 
+        # payloads destined for the server (e.g. motion videos and timelapse images) are written
+        # to disk first, so that they aren't lost if the server can't be reached
+        self.spool = UploadSpool(self.SPOOL_DIR, base_url=self._server_url)
+        metrics.BUFFER_BYTES.labels("spool").set_function(
+            lambda: self.spool.metrics()["depth_bytes"]
+        )
+
         # more for debugging, really
         self._camera.annotate_frame_num = True
 
@@ -172,6 +331,13 @@ class Camera:
 
     _server_address = property(None, _server_address)
 
+    def _server_url(self) -> t.Optional[str]:
+        """Return the base url of the registered server, or None if we aren't registered."""
+        server_address = self.server_address
+        if server_address is None:
+            return None
+        return f"http://{server_address.ip}:{server_address.port}"
+
     @property
     def name(self) -> t.Optional[str]:
         """Return the textual name of the camera.
@@ -183,6 +349,7 @@ class Camera:
 
     def _name(self, name: str) -> None:
         self._camera_name = name
+        self.annotator.camera_name = name
 
     _name = property(None, _name)
 
@@ -213,6 +380,9 @@ class Camera:
 
     def _resolution(self, resolution: str) -> None:
         self._camera.resolution = resolution
+        # MotionOutput works out the shape of the motion data from the first frame it receives,
+        # which would otherwise be kept for frames at the new resolution
+        self.motion_output.rows = self.motion_output.cols = None
 
     _resolution = property(None, _resolution)
 
@@ -243,6 +413,14 @@ class Camera:
 
     _bitrate = property(None, _bitrate)
 
+    @property
+    def effective_bitrate(self) -> t.Optional[int]:
+        """Return the bitrate that the main video stream is actually being recorded at.
+
+        This is the configured `bitrate` unless it has since been changed by `change_bitrate`.
+        """
+        return self._effective_bitrate
+
     @property
     def awb_mode(self) -> enums.AWBMode:
         """Return the auto white balance mode of the camera.
@@ -282,35 +460,124 @@ class Camera:
 
     _vflip = property(None, _vflip)
 
-    def configure(self, config: dict):
-        self.config.update(config)
+    @property
+    def secondary_resolution(self) -> t.Optional[str]:
+        """Return the resolution of the secondary video stream, or None if it is disabled.
 
-    def start(self) -> None:
-        """Start the camera recording.
+        The value is a string in a format consistent with "WIDTHxHEIGHT".
 
-        h264 frames and motion vector frames are sent to the video output stub and motion
-        data stub respectively.
+        This attribute is read-only can only be configured using the `configure` method.
         """
-        logging.info("Camera starting")
-        # start the picamera producing frames
+        if hasattr(self, "_camera_secondary_resolution"):
+            return self._camera_secondary_resolution
+
+    def _secondary_resolution(self, secondary_resolution: t.Optional[str]) -> None:
+        self._camera_secondary_resolution = secondary_resolution
+
+    _secondary_resolution = property(None, _secondary_resolution)
+
+    @property
+    def secondary_bitrate(self) -> t.Optional[int]:
+        """Return the bitrate of the secondary video stream.
+
+        This attribute is read-only can only be configured using the `configure` method.
+        """
+        if hasattr(self, "_camera_secondary_bitrate"):
+            return self._camera_secondary_bitrate
+
+    def _secondary_bitrate(self, secondary_bitrate: int) -> None:
+        self._camera_secondary_bitrate = secondary_bitrate
+
+    _secondary_bitrate = property(None, _secondary_bitrate)
+
+    @property
+    def annotate_fields(self) -> t.List[enums.AnnotateField]:
+        """Return the fields which are annotated onto every frame, in order.
+
+        This attribute is read-only can only be configured using the `configure` method.
+        """
+        return self.annotator.fields
+
+    def _annotate_fields(self, annotate_fields: t.List[enums.AnnotateField]) -> None:
+        self.annotator.fields = annotate_fields
+
+    _annotate_fields = property(None, _annotate_fields)
+
+    def set_motion_active(self, active: bool) -> None:
+        """Record whether a motion event is currently being captured.
+
+        The state is shown in the frame annotation, if enabled, and embedded in the video stream.
+        """
+        if active != self.sei.motion:
+            events.EVENTS.publish("motion", {"active": active})
+        self.annotator.motion = active
+        self.sei.motion = active
+
+    def _annotate(self, text: str) -> None:
+        """Set the text annotated onto frames.
+
+        This method is called by the encoder callback thread.
+        """
+        self._camera.annotate_text = text
+
+    def configure(self, config: dict):
+        self.config.update(config)
+
+    def _start_main_recording(self, output: _RecordingOutput, bitrate: int) -> None:
         self._camera.start_recording(
-            self.video_output,
-            motion_output=self.motion_output,
+            output,
+            motion_output=_GatedMotionOutput(
+                self.motion_output, self.video_output, output.splitter_port
+            ),
             format="h264",
-            bitrate=self.bitrate,
+            splitter_port=output.splitter_port,
+            bitrate=bitrate,
             # aim for a key frame every ~0.5s
             # intra_period=max(int(self.framerate / 2), 1),
             intra_period=1,
-            camera_name=self.name,
+            annotator=self.annotator,
             sps_timing=True,
             sei=True,
         )
 
+    def _start_recording(self) -> None:
+        with self._recording_lock:
+            self._start_main_recording(self.video_output.recording_output(), self.bitrate)
+            self._effective_bitrate = self.bitrate
+            if self.secondary_resolution is not None:
+                # the secondary stream is resized by the splitter, so it costs no extra sensor time
+                self._camera.start_recording(
+                    self.secondary_video_output.recording_output(),
+                    format="h264",
+                    resize=self.secondary_resolution,
+                    splitter_port=self.SECONDARY_SPLITTER_PORT,
+                    bitrate=self.secondary_bitrate,
+                    intra_period=1,
+                    sps_timing=True,
+                )
+
+    def _stop_recording(self) -> None:
+        with self._recording_lock:
+            if self.SECONDARY_SPLITTER_PORT in self._camera._encoders:
+                self._camera.stop_recording(splitter_port=self.SECONDARY_SPLITTER_PORT)
+            self._camera.stop_recording(splitter_port=self.video_output.splitter_port)
+
+    def start(self) -> None:
+        """Start the camera recording.
+
+        h264 frames and motion vector frames are sent to the video output stub and motion
+        data stub respectively.
+        """
+        logging.info("Camera starting")
+        # start the picamera producing frames
+        self._start_recording()
+
         # and then initialise any enabled outputs
         for output_name, output_config in self.config.outputs:
             if output_config.enabled:
                 self.add_output(output_name)
         self.running = True
+        events.EVENTS.publish("camera", {"state": "started"})
 
     def stop(self) -> None:
         """Stop the camera recording.
@@ -319,24 +586,116 @@ class Camera:
         """
         # stop the actual picamera producing frames
         logging.info("Camera stopping")
-        self._camera.stop_recording()
+        self._stop_recording()
         # and stop any outputs which are currently active
         for output_name in self._outputs.copy():
             self.remove_output(output_name)
         self.running = False
+        events.EVENTS.publish("camera", {"state": "stopped"})
+
+    def reconfigure(self, settings: t.Dict[str, t.Any]) -> None:
+        """Change settings which can't be changed whilst recording, without stopping the outputs.
+
+        Only the recordings are restarted. The outputs stay attached to the same video and motion
+        outputs throughout, so network clients stay connected and buffers are kept, and frames
+        carry on being numbered from where they left off. Each recording starts again with an
+        SPS header, from which point decoders pick up the new parameters.
+
+        Each output is told which settings changed. Any which can't follow the change in place
+        are restarted.
+        """
+        logging.info("Camera reconfiguring %s", ", ".join(settings))
+        with self._recording_lock:
+            self._stop_recording()
+            try:
+                for attr, val in settings.items():
+                    setattr(self, "_" + attr, val)
+            finally:
+                self._start_recording()
+
+        changed = set(settings)
+        events.EVENTS.publish("camera", {"state": "reconfigured", "changed": sorted(changed)})
+        for output_name, output in self._outputs.copy().items():
+            if not output.camera_reconfigured(self, changed):
+                logging.info("Restarting %s output to follow the camera's changes", output_name)
+                self.restart_output(output_name)
 
     def close(self) -> None:
         """Release the underlying resources back to the operating system.
 
         Once closed, the camera has to be  completely re-initialised.
         """
+        self.spool.close()
         self._camera.close()
+        if self.motion_output.recorder is not None:
+            self.motion_output.recorder.close()
+        if self.motion_output.shadow is not None:
+            self.motion_output.shadow.close()
         self.running = False
 
+    def request_key_frame(self) -> None:
+        """Ask the encoder to produce an I-frame as soon as possible."""
+        self._camera.request_key_frame(splitter_port=self.video_output.splitter_port)
+
+    def change_bitrate(self, bitrate: int) -> str:
+        """Change the bitrate of the main video stream whilst recording.
+
+        Where possible, the new bitrate is applied without interrupting the stream, by starting
+        a new recording on a spare splitter port and handing over to it at its first SPS header
+        ("splitter swap"). If there is no spare port, or the encoder can't run a second recording
+        alongside the first, the main recording is restarted in place instead ("restart").
+
+        The configured `bitrate` is left unchanged. Returns how the change was applied.
+
+        This method is called by BitrateControllerThread.
+        """
+        with self._recording_lock:
+            old_port = self.video_output.splitter_port
+            if not self.running or old_port not in self._camera._encoders:
+                raise exceptions.CameraNotRunning()
+
+            spare_ports = [
+                port for port in self.SPLITTER_PORTS if port not in self._camera._encoders
+            ]
+            if spare_ports:
+                try:
+                    self._swap_main_recording(old_port, spare_ports[0], bitrate)
+                except (*self._camera_errors, RuntimeError, TimeoutError):
+                    logging.warning(
+                        "Unable to swap to splitter port %d; restarting recording instead",
+                        spare_ports[0],
+                        exc_info=True,
+                    )
+                else:
+                    self._effective_bitrate = bitrate
+                    return f"splitter swap {old_port}->{spare_ports[0]}"
+
+            self._camera.stop_recording(splitter_port=old_port)
+            self._start_main_recording(self.video_output.recording_output(), bitrate)
+            self._effective_bitrate = bitrate
+            return f"restart on port {old_port}"
+
+    def _swap_main_recording(self, old_port: int, new_port: int, bitrate: int) -> None:
+        output = self.video_output.hand_over(new_port)
+        try:
+            self._start_main_recording(output, bitrate)
+        except Exception:
+            self.video_output.cancel_hand_over()
+            raise
+        if not self.video_output.handed_over.wait(timeout=self.HANDOVER_TIMEOUT):
+            # the header may have arrived just after the wait timed out
+            if self.video_output.cancel_hand_over():
+                self._camera.stop_recording(splitter_port=new_port)
+                raise TimeoutError(f"No SPS header from splitter port {new_port}")
+        self._camera.stop_recording(splitter_port=old_port)
+
     def add_output(self, output: enums.OutputName) -> None:
         outputs_map = {
             enums.OutputName.NETWORK: outputs.NetworkOutput,
+            enums.OutputName.LOCAL: outputs.LocalOutput,
             enums.OutputName.MOTION: outputs.MotionDetectionOutput,
+            enums.OutputName.MOTION_VECTORS: outputs.MotionVectorOutput,
+            enums.OutputName.TIMELAPSE: outputs.TimelapseOutput,
             enums.OutputName.YOUTUBE: outputs.YouTubeOutput,
         }
 
@@ -346,14 +705,20 @@ class Camera:
 
         out = outputs_map[output]
         self._outputs[output] = out(self)
+        events.EVENTS.publish(
+            "output", {"output": enums.OutputName(output).value, "state": "started"}
+        )
 
     def remove_output(self, output: enums.OutputName) -> None:
         try:
-            output = self._outputs.pop(output)
+            output_name, output = output, self._outputs.pop(output)
         except KeyError:
             raise Exception(f"{output!r} output not found; cannot remove it from the camera.")
         else:
             output.close()
+            events.EVENTS.publish(
+                "output", {"output": enums.OutputName(output_name).value, "state": "stopped"}
+            )
 
     def restart_output(self, output: enums.OutputName) -> None:
         self.remove_output(output)
@@ -0,0 +1,54 @@
+"""The clock which the camera reads the time of day from.
+
+Frames are timestamped, annotated and uploaded, and the intervals between timelapse captures
+and motion events are measured, by `now()` rather than `time.time()`. Ordinarily that is the
+wall clock, but a soak test (see `src/soak.py`) swaps in an `AcceleratedClock` with `set_clock`,
+running alongside a fake camera producing frames just as much faster, so that a day's worth of
+frames passes through the pipeline in minutes, each stamped with the time it would have had.
+
+How long the code itself takes is always measured in real time, with `time.perf_counter` or
+`time.monotonic`, as are timeouts and the intervals between upload retries.
+"""
+
+from __future__ import annotations
+
+import time
+import typing as t
+
+
+class Clock:
+    """The wall clock."""
+
+    def now(self) -> float:
+        """Return the time, in seconds since the epoch."""
+        return time.time()
+
+
+class AcceleratedClock(Clock):
+    """A clock running `speed` times faster than the wall clock, from `start`.
+
+    `start` defaults to the current time.
+    """
+
+    def __init__(self, speed: float, start: t.Optional[float] = None):
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self._origin = time.monotonic()
+
+    def now(self) -> float:
+        return self.start + (time.monotonic() - self._origin) * self.speed
+
+
+CLOCK: Clock = Clock()
+
+
+def now() -> float:
+    """Return the time, according to the camera's clock."""
+    return CLOCK.now()
+
+
+def set_clock(clock: Clock) -> Clock:
+    """Replace the camera's clock, returning the clock it replaced."""
+    global CLOCK
+    previous, CLOCK = CLOCK, clock
+    return previous
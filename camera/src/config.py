@@ -7,6 +7,7 @@ from pathlib import Path
 
 import toml
 
+from . import events
 from . import exceptions as exc
 from . import schema as s
 
@@ -24,6 +25,9 @@ class Config:
             Path(config_path) if config_path is not None else self.DEFAULT_CONFIG_PATH
         )
         self._config = self.load(str(self.config_path))
+        # incremented every time the configuration is changed, so that subscribers to its
+        # changes can tell whether they have missed one
+        self.version = 0
         self.log_values()
 
     def init(self):
@@ -72,7 +76,7 @@ class Config:
         # attribute on the config schema
         new_config_outputs = new_config.pop("outputs", None)
         if new_config_outputs is not None:
-            for output in ["network", "timelapse", "motion", "youtube"]:
+            for output in ["network", "local", "timelapse", "motion", "motion_vectors", "youtube"]:
                 for attr, val in new_config_outputs.pop(output, {}).items():
                     try:
                         setattr(getattr(temp_config.outputs, output), attr, val)
@@ -89,6 +93,7 @@ class Config:
         self.apply()
 
         self.save()
+        self._changed()
 
     def apply(self) -> None:
         """Configure the camera with values provided."""
@@ -100,39 +105,46 @@ class Config:
         if self.camera.server_address is None and self._config.server_address is not None:
             camera_settings_to_update["server_address"] = self._config.server_address
 
-        need_to_start = False
-        if self.camera.running and any(
-            param in camera_settings_to_update for param in ["resolution", "bitrate", "framerate"]
-        ):
-            self.camera.stop()  # this also removes all outputs
-            need_to_start = True
+        # these can't be changed whilst the camera is recording
+        restart_recording = self.camera.running and any(
+            param in camera_settings_to_update
+            for param in [
+                "resolution",
+                "bitrate",
+                "framerate",
+                "secondary_resolution",
+                "secondary_bitrate",
+            ]
+        )
 
         for attr, val in camera_settings_to_update.items():
-            old_val = getattr(self.camera, attr)
-            setattr(self.camera, "_" + attr, val)
-            logging.info("camera.%s changed from %r to %r", attr, old_val, val)
+            logging.info("camera.%s changed from %r to %r", attr, getattr(self.camera, attr), val)
 
-        if need_to_start:
-            self.camera.start()  # this also starts all outputs
+        if restart_recording:
+            # the recordings are restarted underneath the outputs, which are kept running
+            self.camera.reconfigure(camera_settings_to_update)
         else:
-            # only need to do this if the camera is running, because they will all be started
-            # afresh when the camera itself is next started
-            if self.camera.running:
-                # otherwise we need to check individually if any of the outputs need managing
-                for output_name, output_conf in self.outputs:
-                    output_enabled = self.camera.output_enabled(output_name)
-                    if not output_enabled and output_conf.enabled:
-                        self.camera.add_output(output_name)
-                    elif output_enabled and not output_conf.enabled:
-                        self.camera.remove_output(output_name)
-                    elif output_enabled and output_conf.enabled:
-                        # the output is currently enabled and should remain enabled. The question is
-                        # whether we need to restart it due to a settings change.
-                        if self.camera.output_is_stale(output_name):
-                            self.camera.restart_output(output_name)
-                    else:
-                        # this output is both currently not active and should not be enabled
-                        pass
+            for attr, val in camera_settings_to_update.items():
+                setattr(self.camera, "_" + attr, val)
+
+        # only need to do this if the camera is running, because they will all be started
+        # afresh when the camera itself is next started
+        if self.camera.running:
+            # check individually if any of the outputs need managing
+            for output_name, output_conf in self.outputs:
+                output_enabled = self.camera.output_enabled(output_name)
+                if not output_enabled and output_conf.enabled:
+                    self.camera.add_output(output_name)
+                elif output_enabled and not output_conf.enabled:
+                    self.camera.remove_output(output_name)
+                elif output_enabled and output_conf.enabled:
+                    # the output is currently enabled and should remain enabled. The question is
+                    # whether we need to restart it due to a settings change.
+                    if self.camera.output_is_stale(output_name):
+                        self.camera.restart_output(output_name)
+                else:
+                    # this output is both currently not active and should not be enabled
+                    pass
 
     def save(self, path: t.Optional[Path] = None) -> None:
         """Persist the current in-memory configuration to disk, as a TOML file."""
@@ -147,6 +159,11 @@ class Config:
         self._config = self.load(config_path=self.CONFIG_TEMPLATE_PATH)
         self.apply()
         self.save()
+        self._changed()
+
+    def _changed(self) -> None:
+        self.version += 1
+        events.EVENTS.publish("config", {"version": self.version, "config": self.to_dict()})
 
     def to_dict(self, exclude: t.Optional[dict] = None) -> dict:
         """Convert the configuration schema from a pydantic model to a dictionary."""
@@ -167,8 +184,15 @@ class Config:
             logging.info("    no server address present")
         logging.info("camera")
         for attr, val in self.camera_settings:
-            logging.info("    %-10s -> %r", attr, val)
-        for output, pad in [("network", 11), ("timelapse", 16), ("motion", 21), ("youtube", 11)]:
+            logging.info("    %-20s -> %r", attr, val)
+        for output, pad in [
+            ("network", 21),
+            ("local", 14),
+            ("timelapse", 16),
+            ("motion", 21),
+            ("motion_vectors", 17),
+            ("youtube", 11),
+        ]:
             logging.info(output)
             for attr, val in getattr(self._config.outputs, output):
                 logging.info(f"    %-{pad}s -> %r", attr, val)
@@ -0,0 +1,187 @@
+"""Accounting of the CPU time used by each of the camera's threads, and the outputs they serve.
+
+Each thread accounts for itself, by running its body within `tracked`:
+
+    self.__t = Thread(target=cpu.tracked("motion")(self.__run), name="MotionVideoThread")
+
+which looks up the thread's CPU-time clock as it starts, so that any other thread can read how
+much CPU time it has used with a single `clock_gettime` call. Threads are looked up this way,
+rather than through /proc/self/task/*/stat, as Python 3.7 has no way of finding the kernel's id
+for a thread, which /proc is keyed by. Helper processes, such as ffmpeg, are read from
+/proc/<pid>/stat instead.
+
+The totals are exported as the picamera_cpu_seconds_total counter, whose rate is the number of
+cores used by each thread, and `sample` measures the same rates over a few seconds for a quick
+look at which outputs are keeping the Pi busy. CPU used by threads which aren't tracked, e.g.
+the encoder's callbacks on MMAL's own threads or the web server's event loop, is reported as
+"untracked".
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+import typing as t
+
+from . import metrics
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+# the thread or process's name, and the output it serves ("" if it serves none in particular)
+Key = t.Tuple[str, str]
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _process_seconds(pid: int) -> t.Optional[float]:
+    """Return the CPU time used by a process, or None if it has exited."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the process's name is in brackets, and may itself contain spaces or brackets. utime and
+    # stime are the 14th and 15th fields
+    fields = stat[stat.rindex(")") + 2 :].split()
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+class CPUAccounting:
+    def __init__(self, registry: t.Optional[metrics.Registry] = None):
+        # clocks of the tracked threads which are currently running, by thread ident
+        self._threads: t.Dict[int, t.Tuple[Key, int]] = {}
+        # helper processes which are currently running, by pid
+        self._processes: t.Dict[int, Key] = {}
+        # CPU time used by the threads and processes which have since finished, which is kept
+        # so that the totals never go down when, e.g. an output restarts
+        self._finished: t.Counter[Key] = collections.Counter()
+        # whether each key belongs to a "thread" or a "process"
+        self._kinds: t.Dict[Key, str] = {}
+        self._lock = threading.Lock()
+        self._metric = metrics.Counter(
+            "picamera_cpu_seconds_total",
+            "CPU time used by each of the camera's threads, and the processes it runs",
+            ["thread", "output"],
+            registry=registry,
+        )
+
+    @contextlib.contextmanager
+    def track(self, output: str = "") -> t.Iterator[None]:
+        """Account for the CPU time used by the calling thread, until the block exits."""
+        ident = threading.get_ident()
+        key = (threading.current_thread().name, output)
+        clock = time.pthread_getcpuclockid(ident)
+        with self._lock:
+            self._threads[ident] = (key, clock)
+            self._kinds[key] = "thread"
+            self._metric.labels(*key).set_function(functools.partial(self._seconds, key))
+        try:
+            yield
+        finally:
+            # the thread removes itself whilst holding the lock, so its clock is never read once
+            # it has exited
+            used = time.thread_time()
+            with self._lock:
+                del self._threads[ident]
+                self._finished[key] += used
+
+    def track_process(self, pid: int, name: str, output: str = "") -> None:
+        """Account for the CPU time used by a helper process, until `untrack_process` is called."""
+        key = (name, output)
+        with self._lock:
+            self._processes[pid] = key
+            self._kinds[key] = "process"
+            self._metric.labels(*key).set_function(functools.partial(self._seconds, key))
+
+    def untrack_process(self, pid: int) -> None:
+        """Stop accounting for a helper process, before it is killed."""
+        used = _process_seconds(pid)
+        with self._lock:
+            key = self._processes.pop(pid, None)
+            if key is not None and used is not None:
+                self._finished[key] += used
+
+    def seconds(self) -> t.Tuple[t.Dict[Key, float], t.Dict[Key, float]]:
+        """Return the CPU time used so far by each tracked thread, and by each helper process."""
+        with self._lock:
+            totals = collections.Counter(self._finished)
+            for key, clock in self._threads.values():
+                totals[key] += time.clock_gettime(clock)
+            running = list(self._processes.items())
+            kinds = dict(self._kinds)
+        for pid, key in running:
+            totals[key] += _process_seconds(pid) or 0.0
+        threads = {key: used for key, used in totals.items() if kinds[key] == "thread"}
+        processes = {key: used for key, used in totals.items() if kinds[key] == "process"}
+        return threads, processes
+
+    def _seconds(self, key: Key) -> float:
+        with self._lock:
+            used = self._finished[key]
+            for other, clock in self._threads.values():
+                if other == key:
+                    used += time.clock_gettime(clock)
+            pids = [pid for pid, other in self._processes.items() if other == key]
+        return used + sum(_process_seconds(pid) or 0.0 for pid in pids)
+
+    def sample(self, seconds: float) -> dict:
+        """Return the number of cores used by each tracked thread, helper process, and output,
+        measured over `seconds`.
+        """
+        start = time.perf_counter()
+        process_start = time.process_time()
+        threads_start, processes_start = self.seconds()
+        time.sleep(seconds)
+        threads_end, processes_end = self.seconds()
+        elapsed = time.perf_counter() - start
+        process = (time.process_time() - process_start) / elapsed
+
+        def rates(end: t.Dict[Key, float], start: t.Dict[Key, float]) -> t.Dict[Key, float]:
+            return {key: (used - start.get(key, 0.0)) / elapsed for key, used in end.items()}
+
+        threads = rates(threads_end, threads_start)
+        processes = rates(processes_end, processes_start)
+        outputs: t.Counter[str] = collections.Counter()
+        for (_, output), rate in list(threads.items()) + list(processes.items()):
+            if output:
+                outputs[output] += rate
+
+        def listing(rates: t.Dict[Key, float], kind: str) -> t.List[dict]:
+            return [
+                {kind: name, "output": output, "cores": rate}
+                for (name, output), rate in sorted(rates.items(), key=lambda item: -item[1])
+            ]
+
+        return {
+            "seconds": elapsed,
+            "cpu_count": os.cpu_count(),
+            # every thread in the camera process, tracked or not, but not its helper processes
+            "process": process,
+            "untracked": max(process - sum(threads.values()), 0.0),
+            "outputs": dict(outputs.most_common()),
+            "threads": listing(threads, "thread"),
+            "processes": listing(processes, "process"),
+        }
+
+
+ACCOUNTING = CPUAccounting()
+
+
+def tracked(output: str = "") -> t.Callable[[F], F]:
+    """Decorate the function run by a thread, so that the thread's CPU time is accounted for
+    against `output` whilst it runs.
+    """
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            with ACCOUNTING.track(output):
+                return fn(*args, **kwargs)
+
+        return t.cast(F, wrapper)
+
+    return decorator
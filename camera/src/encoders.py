@@ -3,34 +3,40 @@ import datetime
 import picamerax
 import picamerax.mmal as mmal
 
+from . import clock
+
 
 class TimestampedVideoEncoder(picamerax.PiCookedVideoEncoder):
-    """Extended video encoder which inserts timestamps on video frames."""
+    """Extended video encoder which inserts timestamps on video frames.
+
+    The text itself is managed by an `annotate.Annotator`, which is shared between recordings.
+    Annotations are applied by the camera rather than the encoder, so every recording carries
+    the same text and only one of them needs to be given the annotator.
+    """
 
     def __init__(self, parent, camera_port, input_port, format, resize, **options):
-        self.camera_name = options.pop("camera_name")
+        self.annotator = options.pop("annotator", None)
         super().__init__(parent, camera_port, input_port, format, resize, **options)
 
-    def stamp(self):
-        text = f"{self.camera_name} - {datetime.datetime.now():%d/%m/%Y %H:%M:%S}"
-        self.parent.annotate_text = text
-
     def start(self, output, motion_output=None):
         # this method is called once just before capturing commences, so here we can set
         # the initial timestamp
-        self.stamp()
+        if self.annotator is not None:
+            self.annotator.refresh()
         super().start(output, motion_output)
 
     def _callback_write(self, buf):
         # this method is called at least once per frame, so here we can update the timestamp.
-        # We will only do so after whole I frames and P frames, just to reduce the number of
-        # calls to .stamp() a little.
+        # We will only do so after whole I frames and P frames. The annotator only pushes new
+        # text to the camera when it has actually changed, which is about once a second.
         # Note that this actually sets the timestamp that will appear on the subsequent frame.
         ret = super()._callback_write(buf)
-        if (buf.flags & mmal.MMAL_BUFFER_HEADER_FLAG_FRAME_END) and not (
-            buf.flags & mmal.MMAL_BUFFER_HEADER_FLAG_CONFIG
+        if (
+            self.annotator is not None
+            and (buf.flags & mmal.MMAL_BUFFER_HEADER_FLAG_FRAME_END)
+            and not (buf.flags & mmal.MMAL_BUFFER_HEADER_FLAG_CONFIG)
         ):
-            self.stamp()
+            self.annotator.frame_end()
         return ret
 
 
@@ -38,7 +44,7 @@ class TimestampedImageEncoder(picamerax.PiCookedOneImageEncoder):
     """Extended image encoder which inserts timestamps on image frames."""
 
     def stamp(self):
-        stamp = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        stamp = datetime.datetime.fromtimestamp(clock.now()).strftime("%d/%m/%Y %H:%M:%S")
         self.parent.annotate_text = stamp
 
     def start(self, output):
@@ -46,3 +52,15 @@ class TimestampedImageEncoder(picamerax.PiCookedOneImageEncoder):
         # the initial timestamp
         self.stamp()
         super().start(output)
+
+
+class TimestampedPiCamera(picamerax.PiCamera):
+    """PiCamera object which includes timestamps on captures and videos by default."""
+
+    def _get_image_encoder(self, camera_port, output_port, format_, resize, **options):
+        """Add a timestamp to every captured image."""
+        return TimestampedImageEncoder(self, camera_port, output_port, format_, resize, **options)
+
+    def _get_video_encoder(self, camera_port, output_port, format_, resize, **options):
+        """Add a timestamp to video recordings."""
+        return TimestampedVideoEncoder(self, camera_port, output_port, format_, resize, **options)
@@ -7,7 +7,9 @@ class CameraRevision(str, Enum):
 
 
 class OutputName(str, Enum):
+    LOCAL = "local"
     MOTION = "motion"
+    MOTION_VECTORS = "motion_vectors"
     NETWORK = "network"
     TIMELAPSE = "timelapse"
     YOUTUBE = "youtube"
@@ -30,3 +32,10 @@ class AWBMode(str, Enum):
 class ViewportSize(str, Enum):
     VS_1200X900 = "1200x900"
     VS_640X480 = "640x480"
+
+
+class AnnotateField(str, Enum):
+    NAME = "name"
+    TIME = "time"
+    FPS = "fps"
+    MOTION = "motion"
@@ -0,0 +1,205 @@
+"""A stream of the camera's state changes and telemetry, served as server-sent events.
+
+Events are published from whichever thread they happen on:
+
+    events.EVENTS.publish("motion", {"active": True})
+
+and streamed to every subscriber of `GET /events` in the text/event-stream format, e.g.
+
+    id: 42
+    event: motion
+    data: {"active": true, "time": 1612345678.9}
+
+Each event is formatted once, into a ring of the most recent events which every subscriber
+reads from, so the cost of an event barely grows with the number of subscribers. Publishing
+never blocks on them either: the event loop is woken once per event, and subscribers which fall
+so far behind that the events they haven't read have left the ring are sent an "overflow" event,
+after which they should fetch the camera's state afresh. Subscribers which reconnect with the
+Last-Event-ID header are sent the events they missed, as long as they are still in the ring.
+
+Whilst anyone is subscribed, a "stats" event is published every `interval` seconds with the
+rate at which each stream is publishing frames, and the frames dropped by each output's thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+import json
+import threading
+import time
+import typing as t
+
+from . import clock, metrics
+
+
+def format_event(event: str, data: t.Any, event_id: t.Optional[int] = None) -> bytes:
+    """Return an event in the text/event-stream format."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    # JSON never contains a raw newline, so the data always fits on a single line
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+# sent when a subscriber has been idle for a while, so that proxies don't close the connection
+KEEPALIVE = b": keepalive\n\n"
+
+
+class EventBus:
+    def __init__(self, capacity: int = 1024, interval: float = 1.0, keepalive: float = 15.0):
+        self.interval = interval
+        self.keepalive = keepalive
+        # (id, formatted event) of the most recent events, oldest first
+        self._ring: t.Deque[t.Tuple[int, bytes]] = collections.deque(maxlen=capacity)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        # the futures which subscribers on each event loop are waiting on for the next event,
+        # along with the number of subscribers on that loop. Each subscriber waits on its own
+        # future, which is far cheaper than waiting with a timeout
+        self._waiters: t.Dict[asyncio.AbstractEventLoop, t.Set[asyncio.Future]] = {}
+        self._subscribers: t.Counter[asyncio.AbstractEventLoop] = collections.Counter()
+        # the stats task, and the keepalive timer, of each loop
+        self._timers: t.Dict[
+            asyncio.AbstractEventLoop, t.Tuple[t.Optional[asyncio.Task], asyncio.TimerHandle]
+        ] = {}
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def subscribers(self) -> int:
+        return sum(self._subscribers.values())
+
+    def publish(self, event: str, data: t.Dict[str, t.Any]) -> None:
+        """Send an event to every subscriber, from any thread.
+
+        The time the event happened is added to `data`, unless it already has one.
+        """
+        data.setdefault("time", clock.now())
+        with self._lock:
+            self._last_id += 1
+            self._ring.append((self._last_id, format_event(event, data, self._last_id)))
+            loops = list(self._waiters)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:
+                # the loop has been closed
+                pass
+
+    def _wake(self, loop: asyncio.AbstractEventLoop) -> None:
+        # called on `loop`, so never races with a subscriber on it checking for new events
+        waiters = self._waiters.get(loop)
+        if not waiters:
+            return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        waiters.clear()
+
+    def _since(self, last_id: int) -> t.Tuple[t.List[bytes], int, bool]:
+        """Return the events after `last_id`, the id of the last of them, and whether any events
+        after `last_id` have already left the ring.
+        """
+        with self._lock:
+            if not self._ring or last_id >= self._last_id:
+                return [], self._last_id, False
+            first_id = self._ring[0][0]
+            missed = last_id < first_id - 1
+            start = max(last_id - first_id + 1, 0)
+            events = [event for _, event in itertools.islice(self._ring, start, None)]
+            return events, self._last_id, missed
+
+    async def stream(self, last_id: t.Optional[int] = None) -> t.AsyncIterator[bytes]:
+        """Yield the events published from now on, or from after `last_id` if given, as they
+        happen. Several events are yielded together if they happened at once.
+        """
+        loop = asyncio.get_event_loop()
+        if last_id is None:
+            last_id = self._last_id
+        self._subscribe(loop)
+        waiters = self._waiters[loop]
+        sent = loop.time()
+        try:
+            while True:
+                # registered before checking for events, so that none can slip in between
+                waiter = loop.create_future()
+                waiters.add(waiter)
+                events, last_id, missed = self._since(last_id)
+                if missed:
+                    yield format_event("overflow", {"last_id": last_id})
+                if events:
+                    waiters.discard(waiter)
+                    yield b"".join(events)
+                    sent = loop.time()
+                    continue
+                if loop.time() - sent >= self.keepalive:
+                    yield KEEPALIVE
+                    sent = loop.time()
+                await waiter
+        finally:
+            waiters.discard(waiter)
+            self._unsubscribe(loop)
+
+    def _subscribe(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._subscribers[loop] += 1
+        if loop in self._waiters:
+            return
+        with self._lock:
+            self._waiters[loop] = set()
+        stats = loop.create_task(self._publish_stats()) if self.interval else None
+        self._timers[loop] = (stats, loop.call_later(self.keepalive, self._keep_alive, loop))
+
+    def _keep_alive(self, loop: asyncio.AbstractEventLoop) -> None:
+        # wake every subscriber now and then, so that those which have been idle for a while
+        # can send a keepalive
+        self._wake(loop)
+        stats, _ = self._timers[loop]
+        self._timers[loop] = (stats, loop.call_later(self.keepalive, self._keep_alive, loop))
+
+    def _unsubscribe(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._subscribers[loop] -= 1
+        if self._subscribers[loop] > 0:
+            return
+        del self._subscribers[loop]
+        with self._lock:
+            del self._waiters[loop]
+        stats, keepalive = self._timers.pop(loop)
+        keepalive.cancel()
+        if stats is not None:
+            stats.cancel()
+
+    async def _publish_stats(self) -> None:
+        published = metrics.FRAMES_PUBLISHED.values()
+        dropped = metrics.FRAMES_DROPPED.values()
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            elapsed, last = now - last, now
+            published_now = metrics.FRAMES_PUBLISHED.values()
+            dropped_now = metrics.FRAMES_DROPPED.values()
+            self.publish(
+                "stats",
+                {
+                    "fps": {
+                        labels[0]: round((count - published.get(labels, 0)) / elapsed, 2)
+                        for labels, count in published_now.items()
+                    },
+                    # since the last stats event, and in total
+                    "dropped": {
+                        labels[0]: int(count - dropped.get(labels, 0))
+                        for labels, count in dropped_now.items()
+                    },
+                    "dropped_total": {
+                        labels[0]: int(count) for labels, count in dropped_now.items()
+                    },
+                },
+            )
+            published, dropped = published_now, dropped_now
+
+
+EVENTS = EventBus()
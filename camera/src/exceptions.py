@@ -42,3 +42,30 @@ class InvalidParameterValue(Exception):
             message += f" {custom_message}"
 
         super().__init__(message)
+
+
+class CameraNotRunning(Exception):
+    def __init__(self):
+        message = "The camera must be recording to perform this action"
+        super().__init__(message)
+
+
+class ProfilerBusy(Exception):
+    def __init__(self):
+        message = "A profile is already being taken - wait for it to finish"
+        super().__init__(message)
+
+
+class SnapshotDecodeFailed(Exception):
+    def __init__(self, reason):
+        message = f"Unable to decode the most recent key frame: {reason or 'no image produced'}"
+        super().__init__(message)
+
+
+class InsufficientSpace(Exception):
+    def __init__(self, required, free):
+        message = (
+            f"{required / 2**20:.0f}MB is needed, but only {free / 2**20:.0f}MB can be used - "
+            f"try a smaller capacity"
+        )
+        super().__init__(message)
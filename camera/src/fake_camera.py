@@ -0,0 +1,379 @@
+"""A stand-in for the camera hardware, so that the whole pipeline can run on any Linux machine.
+
+`FakePiCamera` implements the parts of `picamerax.PiCamera` which `Camera` uses, without importing
+picamerax, which needs the Pi's own libraries. It is passed to `Camera` as its backend:
+
+    camera = Camera(config_path, backend=FakePiCamera)
+
+Each recording produces synthetic frames, which are shaped like the encoder's output but aren't
+decodable video. To exercise the outputs with real video, replay a recording instead, such as one
+made on a Pi with `raspivid -o video.h264 -x motion.vec`, or generated with ffmpeg:
+
+    $ ffmpeg -f lavfi -i testsrc=size=640x480:rate=30 -t 10 -c:v libx264 -g 30 video.h264
+
+    recording = Recording("video.h264", "motion.vec")
+    camera = Camera(config_path, backend=functools.partial(FakePiCamera, recording, speed=4))
+
+Recordings are looped, and replayed at the camera's framerate multiplied by `speed`, or as fast
+as the pipeline can take them if `speed` is 0. The frames are written to the recording's output
+just as MMAL hands them to picamerax: the SPS and PPS headers in a buffer of their own, ahead of
+every key frame, and frames larger than the encoder's buffers split across several writes, of
+which only the last is complete.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from .types import VideoFrameType, motion_dtype, motion_shape
+
+# the size of the video encoder's output buffers, beyond which MMAL splits a frame across several
+BUFFER_SIZE = 65536
+
+# H.264 NAL unit types
+_NAL_SLICE = 1
+_NAL_IDR_SLICE = 5
+_NAL_SEI = 6
+_NAL_SPS = 7
+_NAL_PPS = 8
+_NAL_AUD = 9
+
+
+class Resolution(t.NamedTuple):
+    """The width and height of a frame, as in `Resolution`."""
+
+    width: int
+    height: int
+
+    def __str__(self) -> str:
+        return f"{self.width}x{self.height}"
+
+
+class EncoderFrame(t.NamedTuple):
+    """The encoder's details of the frame being written, as in `picamerax.PiVideoFrame`."""
+
+    index: int
+    frame_type: int
+    frame_size: int
+    video_size: int
+    split_size: int
+    # in microseconds, or None for SPS headers
+    timestamp: t.Optional[int]
+    complete: bool
+
+
+class FakeCameraError(RuntimeError):
+    """Raised where picamerax raises one of its `PiCameraRuntimeError`s."""
+
+
+def _nal_units(data: bytes) -> t.Iterator[bytes]:
+    """Yield each NAL unit of an H.264 byte stream, along with its start code."""
+    starts = []
+    i = data.find(b"\x00\x00\x01")
+    while i != -1:
+        # the start code is four bytes long if it has a leading zero byte
+        starts.append(i - 1 if i > 0 and data[i - 1] == 0 else i)
+        i = data.find(b"\x00\x00\x01", i + 3)
+    for start, end in zip(starts, starts[1:] + [len(data)]):
+        yield data[start:end]
+
+
+def _nal_type(nal: bytes) -> int:
+    header = nal.index(b"\x00\x00\x01") + 3
+    return nal[header] & 0x1F if header < len(nal) else 0
+
+
+def split_h264(data: bytes) -> t.List[t.Tuple[bytes, int]]:
+    """Split an H.264 byte stream into the buffers MMAL produces, as (data, frame type) pairs.
+
+    Headers are gathered into a buffer of their own, as an SPS header. Each picture, along with
+    any delimiter or SEI units which precede it, forms a frame, which is a key frame if it is an
+    IDR picture.
+    """
+    frames = []
+    pending: t.List[bytes] = []
+    pending_type: t.Optional[int] = None
+
+    def flush():
+        nonlocal pending, pending_type
+        if pending and pending_type is not None:
+            frames.append((b"".join(pending), pending_type))
+            pending = []
+        pending_type = None
+
+    for nal in _nal_units(data):
+        nal_type = _nal_type(nal)
+        if nal_type in (_NAL_SPS, _NAL_PPS):
+            if pending_type != VideoFrameType.sps_header:
+                flush()
+                pending_type = VideoFrameType.sps_header
+        elif nal_type in (_NAL_SLICE, _NAL_IDR_SLICE):
+            # a slice starts a new picture if it begins at the first macroblock, which is coded
+            # as a single 1 bit at the start of the slice header
+            header = nal.index(b"\x00\x00\x01") + 3
+            first_slice = len(nal) > header + 1 and nal[header + 1] & 0x80
+            if first_slice or pending_type == VideoFrameType.sps_header:
+                flush()
+            pending_type = (
+                VideoFrameType.key_frame if nal_type == _NAL_IDR_SLICE else VideoFrameType.frame
+            )
+        elif nal_type in (_NAL_AUD, _NAL_SEI):
+            # these precede the picture they belong to
+            flush()
+        pending.append(nal)
+    flush()
+    return frames
+
+
+class Recording:
+    """H.264 video, and optionally the motion data recorded alongside it, to be replayed.
+
+    Motion data is in the format written by picamerax, and by raspivid: each frame holds a
+    `motion_dtype` record for every 16x16 macroblock, plus an extra column.
+    """
+
+    def __init__(self, video_path: t.Union[str, Path], motion_path: t.Union[str, Path] = None):
+        self.video_path = Path(video_path)
+        self.motion_path = Path(motion_path) if motion_path is not None else None
+        self.frames = split_h264(self.video_path.read_bytes())
+        if VideoFrameType.sps_header not in (frame_type for _, frame_type in self.frames):
+            raise ValueError(f"{self.video_path} doesn't contain an SPS header")
+        self._motion = self.motion_path.read_bytes() if self.motion_path is not None else None
+
+    def motion_frames(self, resolution: Resolution) -> t.Optional[t.List[bytes]]:
+        """Return each frame of motion data, if there is any, at `resolution`."""
+        if self._motion is None:
+            return None
+        size = _motion_frame_size(resolution)
+        if len(self._motion) % size or not self._motion:
+            raise ValueError(
+                f"{self.motion_path} doesn't hold a whole number of frames at {resolution}"
+            )
+        return [self._motion[i : i + size] for i in range(0, len(self._motion), size)]
+
+
+def _motion_frame_size(resolution: Resolution) -> int:
+    rows, cols = motion_shape(*resolution)
+    return rows * cols * motion_dtype.itemsize
+
+
+class _FakeEncoder(threading.Thread):
+    """Produces H264 frames, and optionally motion data, for a single splitter port.
+
+    The frames are replayed from a `Recording`, if given one, or are otherwise synthetic. Synthetic
+    data isn't decodable video, but it is shaped like the output of the real encoder: an SPS
+    header precedes every key frame, each frame is sized according to the bitrate and a frame of
+    motion data follows each video frame.
+    """
+
+    def __init__(
+        self,
+        camera: FakePiCamera,
+        output,
+        splitter_port: int,
+        resize: t.Optional[Resolution],
+        bitrate: int,
+        intra_period: int,
+        motion_output=None,
+        annotator=None,
+    ):
+        super().__init__(daemon=True, name=f"FakeEncoderThread-{splitter_port}")
+        self.camera = camera
+        self.output = output
+        self.splitter_port = splitter_port
+        self.resolution = resize or camera.resolution
+        self.bitrate = bitrate
+        self.intra_period = max(intra_period, 1)
+        self.motion_output = motion_output
+        # like TimestampedVideoEncoder, the annotation is updated after every frame
+        self.annotator = annotator
+        self.frame: t.Optional[EncoderFrame] = None
+        self.frames_written = 0
+        self._key_frame_requested = False
+        self._stopped = threading.Event()
+        self._video_size = 0
+        self._motion_frames = (
+            camera.recording.motion_frames(self.resolution)
+            if camera.recording is not None and motion_output is not None
+            else None
+        )
+
+    def request_key_frame(self) -> None:
+        self._key_frame_requested = True
+
+    def _write(self, data: bytes, frame_type: int) -> None:
+        """Write a frame to the output as MMAL would, in buffers of at most `BUFFER_SIZE`."""
+        # like picamerax, the frame's index only moves on once the previous frame is complete,
+        # and SPS headers carry no timestamp
+        index = self.frame.index + 1 if self.frame is not None else 0
+        timestamp = (
+            None if frame_type == VideoFrameType.sps_header else int(time.monotonic() * 1_000_000)
+        )
+        for offset in range(0, len(data), BUFFER_SIZE):
+            part = data[offset : offset + BUFFER_SIZE]
+            self._video_size += len(part)
+            complete = offset + BUFFER_SIZE >= len(data)
+            self.frame = EncoderFrame(
+                index=index,
+                frame_type=frame_type,
+                frame_size=offset + len(part),
+                video_size=self._video_size,
+                split_size=self._video_size,
+                timestamp=timestamp,
+                complete=complete,
+            )
+            self.output.write(part)
+        if self.annotator is not None and frame_type != VideoFrameType.sps_header:
+            self.annotator.frame_end()
+
+    def _synthetic_frames(self) -> t.Iterator[t.Tuple[bytes, int]]:
+        frame_size = max(self.bitrate // 8 // int(self.camera.framerate), 16)
+        frame_num = 0
+        while True:
+            if frame_num % self.intra_period == 0 or self._key_frame_requested:
+                self._key_frame_requested = False
+                yield b"\x00\x00\x00\x01\x27" + bytes(16), VideoFrameType.sps_header
+                yield b"\x00\x00\x00\x01\x25" + bytes(frame_size), VideoFrameType.key_frame
+            else:
+                yield b"\x00\x00\x00\x01\x21" + bytes(frame_size), VideoFrameType.frame
+            frame_num += 1
+
+    def _recorded_frames(self) -> t.Iterator[t.Tuple[bytes, int]]:
+        frames = self.camera.recording.frames
+        # like the encoder, the recording starts with a key frame, and loops back to it
+        first = i = next(
+            i for i, (_, frame_type) in enumerate(frames) if frame_type == VideoFrameType.sps_header
+        )
+        while True:
+            if self._key_frame_requested:
+                # the recording can't be re-encoded, so skip ahead to its next key frame instead
+                self._key_frame_requested = False
+                while frames[i][1] != VideoFrameType.sps_header:
+                    i = i + 1 if i + 1 < len(frames) else first
+            yield frames[i]
+            i = i + 1 if i + 1 < len(frames) else first
+
+    def run(self) -> None:
+        speed = self.camera.speed
+        interval = 1 / (int(self.camera.framerate) * speed) if speed else 0
+        frames = self._recorded_frames() if self.camera.recording else self._synthetic_frames()
+        next_frame_at = time.monotonic()
+        frame_num = 0
+        for data, frame_type in frames:
+            if self._stopped.is_set():
+                break
+            self._write(data, frame_type)
+            if frame_type == VideoFrameType.sps_header:
+                # the header and the frame arrive in separate buffer callbacks from the encoder,
+                # rather than immediately one after the other
+                if interval:
+                    self._stopped.wait(0.002 / speed)
+                continue
+            if self.motion_output is not None:
+                if self._motion_frames is not None:
+                    motion_data = self._motion_frames[frame_num % len(self._motion_frames)]
+                else:
+                    motion_data = bytes(_motion_frame_size(self.resolution))
+                self.motion_output.write(motion_data)
+            self.frames_written += 1
+            frame_num += 1
+
+            if interval:
+                next_frame_at += interval
+                self._stopped.wait(max(next_frame_at - time.monotonic(), 0))
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class FakePiCamera:
+    """A stand-in for `picamerax.PiCamera` which doesn't require any camera hardware.
+
+    Only the subset of the PiCamera interface used by `Camera` is implemented. Recordings may be
+    started on any splitter port, each of which produces its own stream of frames, replayed from
+    `recording` if given.
+    """
+
+    revision = "imx219"
+
+    def __init__(self, recording: t.Optional[Recording] = None, speed: float = 1.0):
+        self.recording = recording
+        self.speed = speed
+        self._encoders: t.Dict[int, _FakeEncoder] = {}
+        self._encoders_lock = threading.Lock()
+        self._resolution = Resolution(1640, 1232)
+        self.framerate = 30
+        self.awb_mode = "auto"
+        self.hflip = False
+        self.vflip = False
+        self.annotate_text = ""
+        self.annotate_frame_num = False
+        self.closed = False
+
+    @staticmethod
+    def _to_resolution(value) -> Resolution:
+        if isinstance(value, str):
+            width, height = value.lower().split("x")
+            return Resolution(int(width), int(height))
+        return Resolution(*value)
+
+    @property
+    def resolution(self) -> Resolution:
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value) -> None:
+        if self._encoders:
+            raise FakeCameraError("Cannot change the resolution whilst recording")
+        self._resolution = self._to_resolution(value)
+
+    @property
+    def frame(self) -> EncoderFrame:
+        # like the real camera, which encoder's frame is returned is arbitrary if there is more
+        # than one recording in progress
+        for encoder in self._encoders.values():
+            return encoder.frame
+        raise FakeCameraError("Cannot query frame information when camera is not recording")
+
+    def start_recording(self, output, format=None, resize=None, splitter_port=1, **options):
+        with self._encoders_lock:
+            if splitter_port in self._encoders:
+                raise FakeCameraError(f"The camera is already using port {splitter_port}")
+            logging.info("Fake camera recording on splitter port %d", splitter_port)
+            encoder = self._encoders[splitter_port] = _FakeEncoder(
+                self,
+                output,
+                splitter_port,
+                resize=self._to_resolution(resize) if resize is not None else None,
+                bitrate=options.get("bitrate") or 17_000_000,
+                intra_period=options.get("intra_period") or 30,
+                motion_output=options.get("motion_output"),
+                annotator=options.get("annotator"),
+            )
+            if encoder.annotator is not None:
+                encoder.annotator.refresh()
+            # like the real camera, the encoder is registered before it produces any frames
+            encoder.start()
+
+    def stop_recording(self, splitter_port=1):
+        with self._encoders_lock:
+            try:
+                encoder = self._encoders[splitter_port]
+            except KeyError:
+                raise FakeCameraError(f"There is no recording in progress on port {splitter_port}")
+            # like the real camera, the encoder is only unregistered once it has stopped
+            encoder.stop()
+            del self._encoders[splitter_port]
+
+    def request_key_frame(self, splitter_port=1):
+        self._encoders[splitter_port].request_key_frame()
+
+    def close(self):
+        for splitter_port in list(self._encoders):
+            self.stop_recording(splitter_port)
+        self.closed = True
@@ -0,0 +1,320 @@
+"""A shared memory bus which serves video and motion frames to other processes on the Pi.
+
+The writer copies every frame once, into a ring buffer in a file under /dev/shm which readers
+map into their own address space. A small descriptor per frame is then sent over a Unix
+SOCK_SEQPACKET socket to each connected reader, telling it where in the ring the frame lies.
+Readers get a memoryview straight onto the shared pages, so nothing is copied on their side,
+and the kernel only ever carries the descriptors.
+
+The writer never waits for readers. A reader which falls more than a ring's worth of data
+behind will find that its frames have been overwritten, which `FrameBusReader.is_valid`
+detects, and a reader which stops reading entirely has descriptors dropped once its socket
+buffer is full.
+
+This module only depends on the standard library (plus numpy, for `motion_array`), so that it
+can be imported by scripts which run outside of the camera application.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import socket
+import struct
+import threading
+import typing as t
+
+DEFAULT_SHM_PATH = "/dev/shm/picamera-manager-frames"
+DEFAULT_SOCKET_PATH = "/tmp/picamera-manager-frames.sock"
+
+KIND_VIDEO = 0
+KIND_MOTION = 1
+
+# mirrors picamerax.PiVideoFrameType, which readers shouldn't need to import
+FRAME_TYPE_SPS_HEADER = 2
+
+_MAGIC = b"PMFB"
+_VERSION = 1
+# magic, version, capacity, data offset, head. The head is the absolute position (i.e. the
+# total number of bytes ever written) of the end of the frame currently being written
+_HEADER = struct.Struct("<4sIQQQ")
+_HEAD_OFFSET = 24
+# kind, frame type, length, start, frame number, timestamp, motion rows, motion columns. The
+# start is an absolute position, which is at `start % capacity` in the ring
+_DESCRIPTOR = struct.Struct("<BBIQQdHH")
+# the data area starts on its own page
+_DATA_OFFSET = mmap.PAGESIZE
+
+
+class BusFrame(t.NamedTuple):
+    """A single frame read from the bus.
+
+    `data` is a view onto shared memory. It must be released (or simply dropped) before the
+    reader is closed, and is only guaranteed to hold this frame whilst `is_valid` says so.
+    """
+
+    kind: int
+    frame_type: int
+    frame_num: int
+    timestamp: float
+    data: memoryview
+    start: int
+    rows: int
+    cols: int
+
+    @property
+    def sps_header(self) -> bool:
+        return self.kind == KIND_VIDEO and self.frame_type == FRAME_TYPE_SPS_HEADER
+
+
+class _Client:
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        # descriptors which couldn't be sent because the reader's socket buffer was full
+        self.dropped = 0
+
+
+class FrameBus:
+    """The writing end of the bus.
+
+    Frames are written by the video and motion threads of `LocalOutput`, so writes are
+    serialised with a lock. Connections are accepted by a thread named "FrameBusAcceptThread".
+    """
+
+    def __init__(
+        self,
+        shm_path: str = DEFAULT_SHM_PATH,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        capacity: int = 32 * 1024 * 1024,
+    ):
+        self.shm_path = shm_path
+        self.socket_path = socket_path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._clients: t.List[_Client] = []
+        self._head = 0
+        self.frames_written = 0
+        self.frames_too_large = 0
+
+        fd = os.open(shm_path, os.O_CREAT | os.O_TRUNC | os.O_RDWR, 0o644)
+        try:
+            os.ftruncate(fd, _DATA_OFFSET + capacity)
+            # allocate the pages now, rather than on the writer's first lap of the ring
+            os.posix_fallocate(fd, 0, _DATA_OFFSET + capacity)
+            self._mm = mmap.mmap(fd, _DATA_OFFSET + capacity)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, capacity, _DATA_OFFSET, 0)
+        self._hello = json.dumps(
+            {
+                "version": _VERSION,
+                "shm_path": shm_path,
+                "capacity": capacity,
+                "data_offset": _DATA_OFFSET,
+            }
+        ).encode()
+
+        if os.path.exists(socket_path):
+            # left behind by a previous run
+            os.unlink(socket_path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._socket.bind(socket_path)
+        self._socket.listen(8)
+        self._closed = False
+        self._accept_thread = threading.Thread(
+            target=self._accept, daemon=True, name="FrameBusAcceptThread"
+        )
+        self._accept_thread.start()
+
+    def _accept(self) -> None:
+        while not self._closed:
+            try:
+                # an OSError is raised when the socket is shutdown by close()
+                conn, _ = self._socket.accept()
+            except OSError:
+                break
+            # the reader waits for the hello, so once it has it, it is sent every frame after
+            with self._lock:
+                try:
+                    conn.sendall(self._hello)
+                except OSError:
+                    conn.close()
+                    continue
+                # from here on, a slow reader must never hold up the writer
+                conn.setblocking(False)
+                self._clients.append(_Client(conn))
+            logging.info("Frame bus reader connected (%d connected)", len(self._clients))
+
+    @property
+    def readers(self) -> int:
+        return len(self._clients)
+
+    def write(
+        self,
+        kind: int,
+        data: t.Union[bytes, memoryview],
+        frame_num: int,
+        timestamp: float,
+        frame_type: int = 0,
+        rows: int = 0,
+        cols: int = 0,
+    ) -> None:
+        """Copy a frame into the ring and tell every connected reader where to find it.
+
+        This method is called by LocalVideoThread and LocalMotionThread.
+        """
+        size = len(data)
+        with self._lock:
+            if size > self.capacity:
+                self.frames_too_large += 1
+                return
+            start = self._head
+            offset = start % self.capacity
+            if offset + size > self.capacity:
+                # frames never wrap around the end of the ring, so that readers always get a
+                # single contiguous view
+                start += self.capacity - offset
+                offset = 0
+            # publish the region about to be overwritten before overwriting it, so that readers
+            # can tell whether the frame they were reading has been clobbered
+            self._head = start + size
+            struct.pack_into("<Q", self._mm, _HEAD_OFFSET, self._head)
+            self._mm[_DATA_OFFSET + offset : _DATA_OFFSET + offset + size] = data
+            self.frames_written += 1
+
+            descriptor = _DESCRIPTOR.pack(
+                kind, frame_type, size, start, frame_num, timestamp, rows, cols
+            )
+            for client in self._clients.copy():
+                try:
+                    client.conn.send(descriptor)
+                except BlockingIOError:
+                    client.dropped += 1
+                except OSError:
+                    logging.info("Frame bus reader disconnected")
+                    client.conn.close()
+                    self._clients.remove(client)
+
+    def close(self) -> None:
+        """Disconnect all readers and remove the shared memory and socket files.
+
+        Readers which still have the ring mapped can carry on reading what is in it.
+
+        This method is called by MainThread.
+        """
+        self._closed = True
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._socket.close()
+        self._accept_thread.join()
+        with self._lock:
+            for client in self._clients:
+                client.conn.close()
+            self._clients.clear()
+            self._mm.close()
+        for path in (self.socket_path, self.shm_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class FrameBusReader:
+    """The reading end of the bus, for use by other processes.
+
+    Video frames are skipped until the first SPS header, so that the video read can be decoded
+    from the start:
+
+        with FrameBusReader() as reader:
+            for frame in reader:
+                if frame.kind == KIND_VIDEO:
+                    decoder.feed(frame.data)
+                elif reader.is_valid(frame):
+                    vectors = motion_array(frame)
+
+    Iteration ends when the camera closes the bus, for example when it is restarted.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = None):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socket_path)
+        hello = json.loads(self._socket.recv(4096))
+        if hello["version"] != _VERSION:
+            raise ValueError(f"Unsupported frame bus version {hello['version']}")
+        self.capacity = hello["capacity"]
+        self._data_offset = hello["data_offset"]
+        with open(hello["shm_path"], "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        self._stream_initialised = False
+
+    def read(self) -> t.Optional[BusFrame]:
+        """Return the next frame, or None once the bus has been closed.
+
+        socket.timeout is raised if no frame arrives within the timeout given on creation.
+        """
+        while True:
+            descriptor = self._socket.recv(_DESCRIPTOR.size)
+            if not descriptor:
+                return None
+            kind, frame_type, size, start, frame_num, timestamp, rows, cols = _DESCRIPTOR.unpack(
+                descriptor
+            )
+            if kind == KIND_VIDEO and not self._stream_initialised:
+                if frame_type != FRAME_TYPE_SPS_HEADER:
+                    continue
+                self._stream_initialised = True
+            offset = self._data_offset + start % self.capacity
+            return BusFrame(
+                kind,
+                frame_type,
+                frame_num,
+                timestamp,
+                self._view[offset : offset + size],
+                start,
+                rows,
+                cols,
+            )
+
+    def is_valid(self, frame: BusFrame) -> bool:
+        """Return whether the frame's data is still intact, i.e. hasn't been overwritten.
+
+        Check this after using the data; the writer may overwrite it at any time before then.
+        """
+        (head,) = struct.unpack_from("<Q", self._mm, _HEAD_OFFSET)
+        return head <= frame.start + self.capacity
+
+    def __iter__(self) -> t.Iterator[BusFrame]:
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self) -> None:
+        self._socket.close()
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # frames are still being held on to; the mapping goes when they do
+            pass
+
+    def __enter__(self) -> FrameBusReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def motion_array(frame: BusFrame):
+    """Return a motion frame's vectors as a numpy array, without copying them.
+
+    The array has the same shape and dtype as those produced by picamerax.
+    """
+    import numpy as np
+
+    dtype = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "<u2")])
+    return np.frombuffer(frame.data, dtype=dtype).reshape(frame.rows, frame.cols)
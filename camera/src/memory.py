@@ -0,0 +1,259 @@
+"""Instrumentation for finding out where the camera process's memory goes, and what the garbage
+collector costs it.
+
+Three things are on offer, all of which can be used whilst the camera is streaming:
+
+- `SNAPSHOTS` takes tracemalloc snapshots, and reports the lines which allocated the most memory
+  in one, or which grew the most between two. Tracing allocations slows every allocation down,
+  so it is off until `start` is called, and should be stopped once done with.
+- `buffers` reports the bytes held by each of the pipeline's buffers, alongside the process's
+  resident memory and open file descriptors, so that growing buffers and leaked pipes (e.g. to
+  ffmpeg processes which were never cleaned up) stand out.
+- `GC` times every garbage collection through `gc.callbacks`, as collecting the oldest
+  generation stalls every thread whilst each long-lived object is scanned. `freeze` moves every
+  object alive at the time into a permanent generation which is never scanned, which is worth
+  doing once the camera has started and its long-lived objects have been created.
+"""
+
+from __future__ import annotations
+
+import collections
+import gc
+import os
+import threading
+import time
+import tracemalloc
+import typing as t
+
+from . import metrics
+
+GC_PAUSE = metrics.Histogram(
+    "picamera_gc_pause_seconds",
+    "Time taken by each garbage collection, during which every thread is stalled",
+    ["generation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+# allocations made by tracemalloc itself, or whilst importing modules, are noise
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _frames(traceback: tracemalloc.Traceback) -> t.List[str]:
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+class Snapshots:
+    """tracemalloc snapshots of the process, kept so that later ones can be compared to them."""
+
+    def __init__(self, keep: int = 8):
+        # only the most recent `keep` snapshots are kept, as each one holds a copy of every
+        # traced allocation
+        self.keep = keep
+        self._snapshots: t.Dict[int, t.Tuple[float, tracemalloc.Snapshot]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 1) -> None:
+        """Start tracing allocations, recording up to `frames` frames of where each was made.
+
+        Any more than one frame is considerably slower, and takes more memory to trace.
+        """
+        if tracemalloc.is_tracing():
+            if tracemalloc.get_traceback_limit() == frames:
+                return
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stop tracing allocations, discarding every snapshot taken so far."""
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def stats(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshots = [
+                {"id": snapshot_id, "time": taken}
+                for snapshot_id, (taken, _) in self._snapshots.items()
+            ]
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            # the memory used by tracemalloc itself to trace allocations
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": snapshots,
+        }
+
+    def take(self) -> int:
+        """Take a snapshot, returning the id by which it can be referred to later."""
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc isn't tracing allocations, start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.keep:
+                del self._snapshots[min(self._snapshots)]
+        return snapshot_id
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        try:
+            return self._snapshots[snapshot_id][1]
+        except KeyError:
+            raise KeyError(f"No snapshot with id {snapshot_id}, it may have been discarded")
+
+    def top(self, snapshot_id: int, limit: int = 20, group_by: str = "lineno") -> dict:
+        """Return the `limit` places which hold the most memory in a snapshot.
+
+        Allocations are grouped by "lineno", "filename", or "traceback" (which needs tracing to
+        have been started with more than one frame to be any more useful than "lineno").
+        """
+        stats = self._get(snapshot_id).statistics(group_by)
+        return {
+            "id": snapshot_id,
+            "total_bytes": sum(stat.size for stat in stats),
+            "top": [
+                {"size": stat.size, "count": stat.count, "traceback": _frames(stat.traceback)}
+                for stat in stats[:limit]
+            ],
+        }
+
+    def diff(
+        self, snapshot_id: int, base_id: int, limit: int = 20, group_by: str = "lineno"
+    ) -> dict:
+        """Return the `limit` places whose memory changed the most since the `base_id` snapshot."""
+        stats = self._get(snapshot_id).compare_to(self._get(base_id), group_by)
+        return {
+            "id": snapshot_id,
+            "base_id": base_id,
+            "total_size_diff": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "size": stat.size,
+                    "size_diff": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                    "traceback": _frames(stat.traceback),
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+
+SNAPSHOTS = Snapshots()
+
+
+def _open_fds() -> t.Dict[str, int]:
+    """Count the process's open file descriptors, by what they point to."""
+    counts: t.Counter[str] = collections.Counter()
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return {}
+    for fd in fds:
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except OSError:
+            # e.g. the descriptor used to list the directory, which has since been closed
+            continue
+        # e.g. "pipe:[1234]" or "socket:[5678]", or the path of a file
+        kind = target.split(":[", 1)[0] if ":[" in target else "file"
+        counts[kind] += 1
+    return dict(counts)
+
+
+def _rss_bytes() -> t.Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def buffers() -> dict:
+    """Return the bytes held by each of the pipeline's buffers, and by the process as a whole."""
+    return {
+        "buffers": {labels[0]: value for labels, value in metrics.BUFFER_BYTES.values().items()},
+        "rss_bytes": _rss_bytes(),
+        "open_fds": _open_fds(),
+        "threads": threading.active_count(),
+    }
+
+
+class GCMonitor:
+    """Time every garbage collection, by installing a callback in `gc.callbacks`."""
+
+    def __init__(self, keep: int = 100):
+        self._pauses: t.Deque[t.Tuple[float, int, float, int]] = collections.deque(maxlen=keep)
+        self._buckets = [GC_PAUSE.labels(generation) for generation in range(3)]
+        self._start = 0.0
+        self.installed = False
+
+    def _callback(self, phase: str, info: dict) -> None:
+        # collections only ever run one at a time, on whichever thread triggered them, as they
+        # hold the GIL throughout
+        if phase == "start":
+            self._start = time.perf_counter()
+            return
+        duration = time.perf_counter() - self._start
+        generation = info["generation"]
+        self._buckets[generation].observe(duration)
+        self._pauses.append((time.time(), generation, duration, info["collected"]))
+
+    def install(self) -> None:
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+
+    def uninstall(self) -> None:
+        if self.installed:
+            gc.callbacks.remove(self._callback)
+            self.installed = False
+
+    def stats(self) -> dict:
+        pauses = list(self._pauses)
+        generations = []
+        for generation, buckets in enumerate(self._buckets):
+            durations = [duration for _, gen, duration, _ in pauses if gen == generation]
+            generations.append(
+                {
+                    "collections": sum(buckets.counts),
+                    "pause_seconds": buckets.sum,
+                    "recent_max_pause_seconds": max(durations, default=0.0),
+                }
+            )
+        return {
+            "installed": self.installed,
+            "thresholds": gc.get_threshold(),
+            "counts": gc.get_count(),
+            "frozen": gc.get_freeze_count(),
+            "generations": generations,
+            "recent": [
+                {"time": when, "generation": gen, "seconds": duration, "collected": collected}
+                for when, gen, duration, collected in pauses
+            ],
+        }
+
+
+GC = GCMonitor()
+
+
+def freeze() -> int:
+    """Move every object currently alive into the permanent generation, which is never scanned
+    by the garbage collector, returning how many objects it holds.
+
+    Garbage is collected first, so that none of it is kept alive forever.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
@@ -0,0 +1,270 @@
+"""Counters, gauges and histograms describing the health of the pipeline, served at /metrics.
+
+Metrics are rendered in Prometheus's text exposition format by `render`. Each one is defined at
+the bottom of this module, and updated through the child for a particular set of labels, e.g.
+
+    frames_in = metrics.FRAMES_IN.labels("NetworkVideoThread")
+    ...
+    frames_in.inc()
+
+The hot path only ever updates a child which has been looked up in advance, and each child is
+only ever updated by a single thread at a time, e.g. the handler thread named in its labels.
+Updates are therefore plain in-place additions, without any locking. Another thread reading
+a value may see it slightly stale, but never torn. Gauges which are expensive to keep up to
+date, such as the size of a buffer, are instead given a function to call at scrape time.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import typing as t
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(names: t.Sequence[str], values: t.Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"") for value in values
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class _Value:
+    """The value of a counter or gauge, for a single set of labels."""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: t.Optional[t.Callable[[], float]] = None
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: t.Optional[t.Callable[[], float]]) -> None:
+        """Report the result of calling `function` at scrape time, instead of the set value."""
+        self.function = function
+
+    def get(self) -> float:
+        function = self.function
+        return function() if function is not None else self.value
+
+
+class _Buckets:
+    """The observations made by a histogram, for a single set of labels."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: t.Tuple[float, ...]):
+        self.bounds = bounds
+        # the last bucket counts observations larger than every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # buckets are inclusive of their upper bound
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        registry: t.Optional[Registry] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: t.Dict[t.Tuple[str, ...], t.Any] = {}
+        # only held whilst adding or removing children, never whilst updating them
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: t.Any):
+        """Return the child holding the value for the given label values, creating it if need be.
+
+        Look children up once, outside of the hot path, and hold on to them.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        try:
+            return self._children[key]
+        except KeyError:
+            with self._lock:
+                return self._children.setdefault(key, self._new_child())
+
+    def remove(self, *values: t.Any) -> None:
+        """Stop reporting the value for the given label values, e.g. once its output has closed."""
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def _samples(self) -> t.Iterator[t.Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def collect(self) -> t.Iterator[str]:
+        """Yield the lines describing this metric in the text exposition format."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for suffix, labels, value in self._samples():
+            yield f"{self.name}{suffix}{labels} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    """A value which only ever goes up, such as the number of frames sent."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def _samples(self) -> t.Iterator[t.Tuple[str, str, float]]:
+        for key, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, key), child.get()
+
+    def values(self) -> t.Dict[t.Tuple[str, ...], float]:
+        """Return the current value for each set of label values."""
+        return {key: child.get() for key, child in list(self._children.items())}
+
+
+class Gauge(Counter):
+    """A value which can go up and down, such as the number of connected clients."""
+
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    """Counts observations, such as latencies, into buckets by their size."""
+
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+        registry: t.Optional[Registry] = None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _Buckets:
+        return _Buckets(self.buckets)
+
+    def _samples(self) -> t.Iterator[t.Tuple[str, str, float]]:
+        labelnames = self.labelnames + ("le",)
+        for key, child in list(self._children.items()):
+            # take a copy, so that the buckets are consistent with one another
+            counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(labelnames, key + (_format_value(bound),))
+                yield "_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: t.Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Return every metric in the text exposition format."""
+        lines = [line for metric in self._metrics.values() for line in metric.collect()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+FRAMES_PUBLISHED = Counter(
+    "picamera_frames_published_total",
+    "Frames published by the camera, per stream",
+    ["stream"],
+)
+FRAMES_IN = Counter(
+    "picamera_output_frames_in_total",
+    "Frames received by each output's handler thread",
+    ["handler"],
+)
+FRAMES_OUT = Counter(
+    "picamera_output_frames_out_total",
+    "Frames passed on by each output, e.g. sent to a client or written to ffmpeg",
+    ["output"],
+)
+FRAMES_DROPPED = Counter(
+    "picamera_output_frames_dropped_total",
+    "Frames missed by each handler thread, as it was still handling an earlier frame",
+    ["handler"],
+)
+HANDLER_LAG = Histogram(
+    "picamera_handler_lag_seconds",
+    "Time from a frame being published to its handler thread starting to process it",
+    ["handler"],
+)
+MOTION_DETECTION_LATENCY = Histogram(
+    "picamera_motion_detection_seconds",
+    "Time taken to run motion detection on a single frame of motion data",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+BUFFER_BYTES = Gauge(
+    "picamera_buffer_bytes",
+    "Bytes held in each buffer of video, or of uploads waiting to be sent",
+    ["buffer"],
+)
+NETWORK_CLIENTS = Gauge(
+    "picamera_network_clients",
+    "Clients currently connected to each stream",
+    ["stream"],
+)
+BYTES_SENT = Counter(
+    "picamera_network_bytes_sent_total",
+    "Bytes sent to the clients of each stream",
+    ["stream"],
+)
+FFMPEG_STARTS = Counter(
+    "picamera_ffmpeg_starts_total",
+    "ffmpeg processes started by each output; any more than one is a restart",
+    ["output"],
+)
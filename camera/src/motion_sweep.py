@@ -0,0 +1,194 @@
+"""Evaluate many motion detection settings at once, over recorded motion vectors.
+
+Replaying a recording through `DetectMotion` once per combination of `sensitivity`,
+`min_blocks` and `min_frames` is slow, as every frame is processed from scratch each time.
+Instead, `sweep` processes each chunk of frames in a few numpy operations, and finds exactly
+the frames on which `DetectMotion` would report an event for every combination at once:
+
+1. The squared magnitude of every vector is calculated once.
+2. For each sensitivity, the blocks over it are labelled into areas of motion, across the whole
+   chunk in a single call. Like `get_bounding_boxes`, the size of each area is the number of
+   blocks with motion inside its bounding box, which is counted from an integral image of the
+   mask. Only the largest area in each frame matters.
+3. Comparing those against every `min_blocks` at once gives the frames with motion for each
+   pair of settings. The number of consecutive frames with motion, up to each frame, then gives
+   the frames with events for every `min_frames`.
+
+So most of the work is done once per sensitivity, and adding values of the other settings
+costs next to nothing. Given the intervals in which there really was motion, each combination
+is scored too: a motion event (a run of frames with events) is a true positive if it starts
+within an interval, and an interval is found if any event frame falls within it.
+"""
+
+from __future__ import annotations
+
+import itertools
+import time
+import typing as t
+
+import numpy as np
+from scipy import ndimage
+
+# areas of motion are connected in any direction within a frame, but never across frames
+_STRUCTURE = np.zeros((3, 3, 3), dtype=bool)
+_STRUCTURE[1] = True
+
+
+def max_area_sizes(
+    motion: np.ndarray, sensitivities: t.Sequence[int], min_blocks: int = 1
+) -> np.ndarray:
+    """Return the size of the largest area of motion in each frame, at each sensitivity.
+
+    `motion` is an array of frames of `motion_dtype`. The result has a row per sensitivity and
+    a column per frame. Frames with fewer than `min_blocks` blocks of motion in all are given a
+    size of zero, as no area within them could be that large.
+    """
+    # int32, as the square of a full-length vector, (-128, -128), overflows int16
+    x = motion["x"].astype(np.int32)
+    y = motion["y"].astype(np.int32)
+    squared = x * x
+    squared += y * y
+
+    sizes = np.zeros((len(sensitivities), len(motion)), dtype=np.int32)
+    for i, sensitivity in enumerate(sensitivities):
+        # a magnitude is at least the sensitivity exactly when its square is
+        mask = squared >= sensitivity * sensitivity
+        # in most footage, few frames have much motion, and the rest can be skipped
+        (active,) = np.nonzero(mask.sum(axis=(1, 2)) >= min_blocks)
+        if not len(active):
+            continue
+        mask = mask[active]
+        labels, count = ndimage.label(mask, structure=_STRUCTURE)
+        # the frame and bounding box of each area, from its blocks grouped by label
+        frame, row, col = np.nonzero(mask)
+        label = labels[mask]
+        order = np.argsort(label, kind="stable")
+        frame, row, col = frame[order], row[order], col[order]
+        starts = np.flatnonzero(np.diff(label[order], prepend=0))
+        frame = frame[starts]
+        y0, y1 = np.minimum.reduceat(row, starts), np.maximum.reduceat(row, starts) + 1
+        x0, x1 = np.minimum.reduceat(col, starts), np.maximum.reduceat(col, starts) + 1
+
+        frames, rows, cols = mask.shape
+        integral = np.zeros((frames, rows + 1, cols + 1), dtype=np.int32)
+        np.cumsum(mask, axis=1, dtype=np.int32, out=integral[:, 1:, 1:])
+        np.cumsum(integral[:, 1:, 1:], axis=2, out=integral[:, 1:, 1:])
+        blocks = (
+            integral[frame, y1, x1]
+            - integral[frame, y0, x1]
+            - integral[frame, y1, x0]
+            + integral[frame, y0, x0]
+        )
+        np.maximum.at(sizes[i], active[frame], blocks)
+    return sizes
+
+
+def _intervals(
+    timestamps: np.ndarray, truth: t.Sequence[t.Tuple[float, float]]
+) -> t.Tuple[np.ndarray, int]:
+    """Return the index of the interval each frame falls within, or -1, and the number of
+    intervals.
+    """
+    within = np.full(len(timestamps), -1)
+    for i, (start, end) in enumerate(truth):
+        within[(timestamps >= start) & (timestamps <= end)] = i
+    return within, len(truth)
+
+
+def sweep(
+    chunks: t.Iterable[np.ndarray],
+    sensitivities: t.Sequence[int],
+    min_blocks: t.Sequence[int],
+    min_frames: t.Sequence[int],
+    truth: t.Optional[t.Sequence[t.Tuple[float, float]]] = None,
+) -> t.Dict[str, t.Any]:
+    """Return the motion events `DetectMotion` would detect with every combination of settings.
+
+    `chunks` yields arrays of recorded frames, as from `motion_recording.load_chunks`. `truth`
+    is an optional list of (start, end) timestamps of the intervals in which there was motion.
+    """
+    start = time.perf_counter()
+    load_seconds = 0.0
+    sizes = []
+    timestamps = []
+    chunks = iter(chunks)
+    while True:
+        load_start = time.perf_counter()
+        chunk = next(chunks, None)
+        load_seconds += time.perf_counter() - load_start
+        if chunk is None:
+            break
+        sizes.append(max_area_sizes(chunk["motion"], sensitivities, min(min_blocks)))
+        timestamps.append(chunk["timestamp"])
+    sizes = np.concatenate(sizes, axis=1) if sizes else np.zeros((len(sensitivities), 0))
+    timestamps = np.concatenate(timestamps) if timestamps else np.zeros(0)
+    areas_seconds = time.perf_counter() - start - load_seconds
+
+    events_start = time.perf_counter()
+    frames = sizes.shape[1]
+    # (sensitivity, min_blocks, frame)
+    motion = sizes[:, None, :] >= np.asarray(min_blocks)[None, :, None]
+    # the number of consecutive frames with motion up to and including each frame
+    index = np.arange(frames)
+    last_still = np.maximum.accumulate(np.where(motion, -1, index), axis=-1)
+    consecutive = index - last_still
+    if truth is not None:
+        within, intervals = _intervals(timestamps, truth)
+        # which interval each frame falls within, one-hot, for counting those found
+        one_hot = np.zeros((frames, intervals), dtype=np.float32)
+        one_hot[index[within >= 0], within[within >= 0]] = 1
+
+    results = []
+    for frames_needed in min_frames:
+        # (sensitivity, min_blocks, frame)
+        events = consecutive >= frames_needed
+        onsets = events.copy()
+        onsets[..., 1:] &= ~events[..., :-1]
+        event_frames = events.sum(axis=-1)
+        event_count = onsets.sum(axis=-1)
+        if truth is not None:
+            true_positives = (onsets & (within >= 0)).sum(axis=-1)
+            found = ((events.astype(np.float32) @ one_hot) > 0).sum(axis=-1)
+        for (i, sensitivity), (j, blocks) in itertools.product(
+            enumerate(sensitivities), enumerate(min_blocks)
+        ):
+            result = {
+                "sensitivity": int(sensitivity),
+                "min_blocks": int(blocks),
+                "min_frames": int(frames_needed),
+                "events": int(event_count[i, j]),
+                "event_frames": int(event_frames[i, j]),
+            }
+            if truth is not None:
+                tp = int(true_positives[i, j])
+                precision = tp / result["events"] if result["events"] else 0.0
+                recall = int(found[i, j]) / intervals if intervals else 0.0
+                result.update(
+                    true_positives=tp,
+                    false_positives=result["events"] - tp,
+                    intervals_found=int(found[i, j]),
+                    precision=round(precision, 4),
+                    recall=round(recall, 4),
+                    f1=round(
+                        2 * precision * recall / (precision + recall) if precision + recall else 0,
+                        4,
+                    ),
+                )
+            results.append(result)
+    events_seconds = time.perf_counter() - events_start
+
+    elapsed = time.perf_counter() - start
+    recorded = float(timestamps[-1] - timestamps[0]) if frames else 0.0
+    return {
+        "combinations": results,
+        "frames": frames,
+        "recorded_seconds": round(recorded, 3),
+        "timings": {
+            "load": round(load_seconds, 3),
+            "areas": round(areas_seconds, 3),
+            "events": round(events_seconds, 3),
+            "total": round(elapsed, 3),
+            # the cost of each combination, were the sweep's work shared equally between them
+            "per_combination_ms": round(elapsed / len(results) * 1_000, 3) if results else None,
+        },
+    }
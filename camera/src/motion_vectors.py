@@ -0,0 +1,85 @@
+"""Compact encoding of motion vector frames, for streaming them to the server.
+
+Each frame is sent as a fixed size header followed by an optional payload. The payload is the
+x and y components of every macroblock's vector, as interleaved int8 pairs in row-major order,
+compressed with zlib. SAD values aren't sent, as detection only needs the vectors.
+
+Vectors shorter than `min_magnitude` are zeroed before compression. Most of the vectors in a
+still scene are small jitters of a pixel or two, which compress poorly and don't represent any
+real motion. A frame which has no vectors left at all is sent as a header only.
+
+Every record is self-contained, so frames can be skipped (e.g. whilst the connection is slow)
+without affecting the decoding of later frames. The server's decoder lives in
+server/src/utils/motion_vectors.py.
+"""
+
+from __future__ import annotations
+
+import struct
+import typing as t
+import zlib
+
+import numpy as np
+
+if t.TYPE_CHECKING:
+    from .types import MotionFrame
+
+# version, flags, rows, columns, frame number, timestamp, payload length
+HEADER = struct.Struct(">BBHHIdI")
+VERSION = 1
+FLAG_EMPTY = 0x01
+
+
+class MotionVectorEncoder:
+    def __init__(self, min_magnitude: int = 3, compression_level: int = 1):
+        self.min_magnitude = min_magnitude
+        self.compression_level = compression_level
+        self.frames = 0
+        self.empty_frames = 0
+        self.bytes_encoded = 0
+
+    def encode(self, frame: MotionFrame) -> bytes:
+        """Return a single record encoding the frame's motion vectors.
+
+        This method is called by MotionVectorDataThread.
+        """
+        motion_data = frame.motion_data
+        rows, cols = motion_data.shape
+        xy = np.empty((rows, cols, 2), dtype=np.int8)
+        if self.min_magnitude > 0:
+            # squared magnitudes, in a type which can hold them: (-128, -128) would overflow an
+            # int16. Multiplying the components by a mask of the vectors to keep is several
+            # times faster than assigning to xy[~keep]
+            x = motion_data["x"].astype(np.int32)
+            y = motion_data["y"].astype(np.int32)
+            squared = x * x
+            squared += y * y
+            keep = (squared >= self.min_magnitude**2).view(np.int8)
+            np.multiply(motion_data["x"], keep, out=xy[..., 0])
+            np.multiply(motion_data["y"], keep, out=xy[..., 1])
+        else:
+            xy[..., 0] = motion_data["x"]
+            xy[..., 1] = motion_data["y"]
+
+        if xy.any():
+            flags = 0
+            payload = zlib.compress(xy, self.compression_level)
+        else:
+            flags = FLAG_EMPTY
+            payload = b""
+            self.empty_frames += 1
+        record = (
+            HEADER.pack(
+                VERSION,
+                flags,
+                rows,
+                cols,
+                frame.frame_num & 0xFFFFFFFF,
+                frame.timestamp,
+                len(payload),
+            )
+            + payload
+        )
+        self.frames += 1
+        self.bytes_encoded += len(record)
+        return record
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import typing as t
+import uuid
+
+# a single buffer, or a sequence of them, which will be sent without first being joined together
+Buffers = t.Iterable[t.Union[bytes, memoryview]]
+
+
+class FilePart:
+    """A file to be sent as part of a multipart body.
+
+    The data is provided as an iterable of buffers (e.g. the data of every frame in a
+    FrameBuffer) along with its total length, which must be known in advance so that a
+    Content-Length header can be sent.
+    """
+
+    def __init__(self, filename: str, content_type: str, data: Buffers, length: int):
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+        self.length = length
+
+    @classmethod
+    def from_buffers(
+        cls, filename: str, content_type: str, buffers: t.Sequence[t.Union[bytes, memoryview]]
+    ) -> FilePart:
+        """Create a part from a sequence of buffers which are already in memory."""
+        views = [memoryview(buf) for buf in buffers]
+        return cls(filename, content_type, views, sum(view.nbytes for view in views))
+
+
+class MultipartBody:
+    """A multipart/form-data request body which is generated lazily, chunk by chunk.
+
+    Unlike passing `files=` to `requests.post`, which builds the entire body in memory, this
+    class yields the body as a sequence of memoryviews over the original buffers, so sending a
+    large video never requires more than `chunk_size` bytes of additional memory.
+
+    An instance can be passed directly as the `data` argument to `requests.post`. As it defines
+    `__len__`, requests will send a Content-Length header and stream the body from `__iter__`.
+    """
+
+    def __init__(
+        self,
+        fields: t.Optional[t.Dict[str, str]] = None,
+        files: t.Optional[t.Dict[str, FilePart]] = None,
+        chunk_size: int = 64 * 1024,
+        progress: t.Optional[t.Callable[[int, int], None]] = None,
+    ):
+        self.fields = fields or {}
+        self.files = files or {}
+        self.chunk_size = chunk_size
+        # called with (bytes_sent, total_bytes) after every chunk
+        self.progress = progress
+        self.boundary = uuid.uuid4().hex
+        self._length = (
+            sum(len(self._field(name, value)) for name, value in self.fields.items())
+            + sum(
+                len(self._file_header(name, part)) + part.length + 2
+                for name, part in self.files.items()
+            )
+            + len(self._closing_boundary())
+        )
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _field(self, name: str, value: str) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode()
+
+    def _file_header(self, name: str, part: FilePart) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{part.filename}"\r\n'
+            f"Content-Type: {part.content_type}\r\n\r\n"
+        ).encode()
+
+    def _closing_boundary(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode()
+
+    def _chunks(self) -> t.Iterator[t.Union[bytes, memoryview]]:
+        for name, value in self.fields.items():
+            yield self._field(name, value)
+        for name, part in self.files.items():
+            yield self._file_header(name, part)
+            sent = 0
+            for buf in part.data:
+                view = memoryview(buf).cast("B")
+                # large buffers (e.g. an I-frame) are sliced, which doesn't copy any data
+                for start in range(0, view.nbytes, self.chunk_size):
+                    chunk = view[start : start + self.chunk_size]
+                    sent += chunk.nbytes
+                    yield chunk
+            if sent != part.length:
+                raise ValueError(
+                    f"File part {name!r} contained {sent} bytes, but {part.length} were declared"
+                )
+            yield b"\r\n"
+        yield self._closing_boundary()
+
+    def __iter__(self) -> t.Iterator[t.Union[bytes, memoryview]]:
+        sent = 0
+        for chunk in self._chunks():
+            sent += len(memoryview(chunk))
+            yield chunk
+            if self.progress is not None:
+                self.progress(sent, self._length)
+
+    def __len__(self) -> int:
+        return self._length
+
+
+def read_file_slice(
+    path: str, offset: int, length: int, chunk_size: int = 64 * 1024
+) -> t.Iterator[bytes]:
+    """Yield `length` bytes from a file, starting at `offset`, at most `chunk_size` at a time."""
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        remaining = length
+        while remaining:
+            chunk = fh.read(min(chunk_size, remaining))
+            if not chunk:
+                raise EOFError(f"Expected {remaining} more bytes from {path!r}")
+            remaining -= len(chunk)
+            yield chunk
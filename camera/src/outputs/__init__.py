@@ -1,3 +1,36 @@
-from .motion_output import MotionDetectionOutput  # noqa: F401
-from .network_output import NetworkOutput  # noqa: F401
-from .youtube_output import YouTubeOutput  # noqa: F401
+"""The outputs which can be attached to the camera.
+
+Each output is only imported the first time it is used, as some pull in heavy dependencies
+(e.g. motion detection imports scipy, and YouTube ffmpeg-python) which would otherwise slow
+down every start of the camera, whether or not the output is enabled.
+"""
+
+import importlib
+import typing as t
+
+if t.TYPE_CHECKING:
+    from .local_output import LocalOutput  # noqa: F401
+    from .motion_output import MotionDetectionOutput  # noqa: F401
+    from .motion_vector_output import MotionVectorOutput  # noqa: F401
+    from .network_output import NetworkOutput  # noqa: F401
+    from .timelapse_output import TimelapseOutput  # noqa: F401
+    from .youtube_output import YouTubeOutput  # noqa: F401
+
+_MODULES = {
+    "LocalOutput": "local_output",
+    "MotionDetectionOutput": "motion_output",
+    "MotionVectorOutput": "motion_vector_output",
+    "NetworkOutput": "network_output",
+    "TimelapseOutput": "timelapse_output",
+    "YouTubeOutput": "youtube_output",
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str) -> t.Any:
+    try:
+        module = _MODULES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return getattr(importlib.import_module(f".{module}", __name__), name)
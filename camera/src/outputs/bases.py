@@ -6,6 +6,8 @@ import time
 from threading import Event, Thread
 import typing as t
 
+from .. import clock, cpu, metrics, tracing
+
 if t.TYPE_CHECKING:
     from .. import types
     from ..camera import MotionOutput, VideoOutput, Camera
@@ -13,8 +15,23 @@ if t.TYPE_CHECKING:
 
 class BaseOutput(abc.ABC):
     def __init__(self, output_name: str, camera: Camera):
+        self.output_name = output_name
         self.config = camera.config.output(output_name).copy()
 
+    def camera_reconfigured(self, camera: Camera, changed: t.Set[str]) -> bool:
+        """Follow a change to the camera settings in `changed`, made whilst the output was running.
+
+        The output keeps receiving frames throughout, with those of the new recording following
+        on from those of the old. Return False if the output can't follow the change in place,
+        in which case it will be restarted.
+        """
+        return True
+
+
+def _output_name(callback: t.Callable) -> str:
+    # handlers are given a method of the output they run for, whose CPU time they count towards
+    return getattr(getattr(callback, "__self__", None), "output_name", "")
+
 
 class VideoOutputHandler:
     """Interface defining outputs which process video frames produced by the camera.
@@ -32,13 +49,20 @@ class VideoOutputHandler:
     ):
         # name mangling is used so that it can be subclassed simultaneously with MotionOutputMeta
         logging.info("Init VideoOutputMeta")
-        self.__t = Thread(daemon=True, name=thread_name, target=self.__run)
+        self.__t = Thread(
+            daemon=True,
+            name=thread_name,
+            target=cpu.tracked(_output_name(frame_callback))(self.__run),
+        )
         self.__closed = Event()
         self.__event = video_output.event
         self.video_output = video_output
         self.frame_callback = frame_callback
         # track the previous frame so that we can see if we have dropped one somewhere
         self.__prev_frame = None
+        self.__frames_in = metrics.FRAMES_IN.labels(thread_name)
+        self.__frames_dropped = metrics.FRAMES_DROPPED.labels(thread_name)
+        self.__lag = metrics.HANDLER_LAG.labels(thread_name)
         self.__t.start()
 
     def __run(self) -> None:
@@ -48,6 +72,13 @@ class VideoOutputHandler:
             else:
                 logging.warning("Timed out waiting for new frame")
                 continue
+            woke = tracing.start()
+            self.__frames_in.inc()
+            lag = clock.now() - frame.timestamp
+            self.__lag.observe(lag)
+            if woke:
+                # from the frame being published until this thread picked it up
+                tracing.TRACER.add("wakeup", woke - int(lag * 1e9), woke, frame.frame_num)
             if self.__prev_frame is not None:
                 if frame.frame_num != self.__prev_frame.frame_num + 1:
                     logging.warning(
@@ -55,13 +86,13 @@ class VideoOutputHandler:
                         self.__prev_frame.frame_num,
                         frame.frame_num,
                     )
+                    self.__frames_dropped.inc(
+                        max(frame.frame_num - self.__prev_frame.frame_num - 1, 0)
+                    )
             self.__prev_frame = frame
-            start = time.perf_counter_ns()
+            start = tracing.start()
             self.frame_callback(frame)
-            end = time.perf_counter_ns()
-            # logging.debug(
-            #     "Video processing of frame %d ran in %dμs", frame.frame_num, (end - start) / 1_000
-            # )
+            tracing.end("process_frame", start, frame.frame_num)
 
     def close(self):
         self.__closed.set()
@@ -87,13 +118,20 @@ class MotionOutputHandler:
     ):
         # name mangling is used so that it can be subclassed simultaneously with VideoOutputMeta
         logging.info("Init MotionOutputMeta")
-        self.__t = Thread(daemon=True, name=thread_name, target=self.__run)
+        self.__t = Thread(
+            daemon=True,
+            name=thread_name,
+            target=cpu.tracked(_output_name(motion_frame_callback))(self.__run),
+        )
         self.__closed = Event()
         self.__event = motion_output.event
         self.motion_output = motion_output
         self.motion_frame_callback = motion_frame_callback
         # track the previous frame so that we can see if we have dropped one somewhere
         self.__prev_frame = None
+        self.__frames_in = metrics.FRAMES_IN.labels(thread_name)
+        self.__frames_dropped = metrics.FRAMES_DROPPED.labels(thread_name)
+        self.__lag = metrics.HANDLER_LAG.labels(thread_name)
         self.__t.start()
 
     def __run(self) -> None:
@@ -103,6 +141,13 @@ class MotionOutputHandler:
             else:
                 logging.warning("Timed out waiting for new frame")
                 continue
+            woke = tracing.start()
+            self.__frames_in.inc()
+            lag = clock.now() - frame.timestamp
+            self.__lag.observe(lag)
+            if woke:
+                # from the frame being published until this thread picked it up
+                tracing.TRACER.add("wakeup", woke - int(lag * 1e9), woke, frame.frame_num)
             if self.__prev_frame is not None:
                 if frame.frame_num != self.__prev_frame.frame_num + 1:
                     logging.warning(
@@ -110,11 +155,16 @@ class MotionOutputHandler:
                         self.__prev_frame.frame_num,
                         frame.frame_num,
                     )
+                    self.__frames_dropped.inc(
+                        max(frame.frame_num - self.__prev_frame.frame_num - 1, 0)
+                    )
             self.__prev_frame = frame
 
+            traced = tracing.start()
             start = time.perf_counter_ns()
             self.motion_frame_callback(frame)
             end = time.perf_counter_ns()
+            tracing.end("process_motion_frame", traced, frame.frame_num)
             logging.debug(
                 "Motion processing of frame %d ran in %dμs\n",
                 frame.frame_num,
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+import typing as t
+
+import numpy as np
+
+from .. import framebus, metrics
+from .bases import BaseOutput, MotionOutputHandler, VideoOutputHandler
+
+if t.TYPE_CHECKING:
+    from ..camera import Camera
+    from ..types import MotionFrame, VideoFrame
+
+
+class LocalOutput(BaseOutput):
+    """Publish video and motion frames to other processes on the Pi through a `FrameBus`.
+
+    This is for analytics which run alongside the camera, and which would otherwise have to
+    read the stream from the network output. See `src.framebus.FrameBusReader` for the client.
+    """
+
+    def __init__(self, camera: Camera):
+        """Create the shared memory ring and start publishing frames into it.
+
+        This method is called by MainThread.
+        """
+        logging.info("Local output initialising")
+        super().__init__(output_name="local", camera=camera)
+
+        self.bus = framebus.FrameBus(
+            shm_path=self.config.shm_path,
+            socket_path=self.config.socket_path,
+            capacity=self.config.ring_size,
+        )
+        self.frames_out = metrics.FRAMES_OUT.labels("Local")
+        metrics.NETWORK_CLIENTS.labels("Local").set_function(lambda: self.bus.readers)
+        metrics.BUFFER_BYTES.labels("frame_bus").set_function(lambda: self.bus.capacity)
+        self.video_handler = VideoOutputHandler(
+            camera.video_output, self.process_frame, "LocalVideoThread"
+        )
+        self.motion_handler: t.Optional[MotionOutputHandler] = None
+        if self.config.motion_vectors:
+            self.motion_handler = MotionOutputHandler(
+                camera.motion_output, self.process_motion_frame, "LocalMotionThread"
+            )
+
+    def process_frame(self, frame: VideoFrame) -> None:
+        """Publish a video frame.
+
+        This method is called by LocalVideoThread.
+        """
+        self.bus.write(
+            framebus.KIND_VIDEO,
+            frame.data,
+            frame.frame_num,
+            frame.timestamp,
+            frame_type=frame.frame_type,
+        )
+        self.frames_out.inc()
+
+    def process_motion_frame(self, frame: MotionFrame) -> None:
+        """Publish a motion frame, as the raw bytes of its motion_dtype array.
+
+        This method is called by LocalMotionThread.
+        """
+        motion_data = np.ascontiguousarray(frame.motion_data)
+        rows, cols = motion_data.shape
+        self.bus.write(
+            framebus.KIND_MOTION,
+            # a flat byte view of the array, so that it isn't copied on the way in
+            memoryview(motion_data.view(np.uint8).reshape(-1)),
+            frame.frame_num,
+            frame.timestamp,
+            rows=rows,
+            cols=cols,
+        )
+        self.frames_out.inc()
+
+    def close(self) -> None:
+        """Tidily release all resources.
+
+        This method is called by MainThread.
+        """
+        logging.info("Local output closing down")
+        self.video_handler.close()
+        if self.motion_handler is not None:
+            self.motion_handler.close()
+        metrics.NETWORK_CLIENTS.remove("Local")
+        metrics.BUFFER_BYTES.remove("frame_bus")
+        self.bus.close()
+        logging.info("Local output closed")
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import io
+import datetime
 import logging
 import time
 import threading
@@ -8,9 +8,9 @@ import typing as t
 
 import ffmpeg
 import numpy as np
-import requests
 from scipy import ndimage, signal
 
+from .. import clock, metrics
 from ..types import Box, Boxes, VideoFrame, MotionFrame, FrameBuffer
 from .bases import BaseOutput, MotionOutputHandler, VideoOutputHandler
 
@@ -18,11 +18,10 @@ if t.TYPE_CHECKING:
     from ..camera import Camera
 
 
-def create_trigger_image(trigger_frame_group, boxes):
+def create_trigger_image(trigger_frame_group: FrameBuffer, boxes: Boxes) -> bytes:
+    """Return a JPEG of the final frame in the group, with each motion box drawn on top."""
     assert trigger_frame_group._data[0].sps_header
-    raw_stream = b""
-    for frame in trigger_frame_group:
-        raw_stream += frame.data
+    raw_stream = trigger_frame_group.raw_bytes()
 
     logging.info("Trigger frame group length: %d", len(trigger_frame_group))
     logging.info("Raw stream length: %d bytes", len(raw_stream))
@@ -46,10 +45,7 @@ def create_trigger_image(trigger_frame_group, boxes):
     )
 
     logging.info("Length of return: %d", len(out))
-    trigger_image = io.BytesIO(out)
-
-    with open(f"pics/out{time.monotonic_ns()}.jpeg", "wb") as fh:
-        fh.write(trigger_image.getvalue())
+    return out
 
 
 def find_motion_areas(mask: np.ndarray) -> list:
@@ -122,6 +118,8 @@ class DetectMotion:
         self.min_blocks = min_blocks
         self.min_frames = min_frames
         self._consecutive_motion_frames = 0
+        # the nanoseconds taken by each stage of the last detection
+        self.timings: t.Dict[str, int] = {}
 
     def detect(self, motion_frame: MotionFrame) -> t.Optional[MotionEvent]:
         """Run the motion detection algorithm.
@@ -145,6 +143,7 @@ class DetectMotion:
         # remove any small, isolated blocks of motion which are probably just noise
         # motion_mask = denoise(motion_mask, min_neighbours=2)
         t4 = time.perf_counter_ns()
+        self.timings = {"magnitudes": t2 - t1, "mask": t3 - t2}
         if motion_mask.sum() >= self.min_blocks:
             # we have detected motion in at least the minimum required number of blocks
             # now find where in the image motion was detected
@@ -158,6 +157,7 @@ class DetectMotion:
             # would be returned
             boxes = get_bounding_boxes(motion_mask, slices, self.min_blocks)
             t7 = time.perf_counter_ns()
+            self.timings.update(sum=t5 - t4, motion_areas=t6 - t5, bounding_boxes=t7 - t6)
 
             if boxes:
                 # we have detected motion in this frame
@@ -207,6 +207,24 @@ class MotionDetectionOutput(BaseOutput):
     def __init__(self, camera: Camera):
         logging.info("Motion output initialising")
         super().__init__(output_name="motion", camera=camera)
+        self.spool = camera.spool
+        self.framerate = camera.framerate
+        self.pre_event_buffer = FrameBuffer(maxlen=camera.framerate * self.config.captured_before)
+        self.post_event_buffer = FrameBuffer(maxlen=camera.framerate * self.config.captured_after)
+        metrics.BUFFER_BYTES.labels("pre_event").set_function(lambda: self.pre_event_buffer.nbytes)
+        metrics.BUFFER_BYTES.labels("post_event").set_function(
+            lambda: self.post_event_buffer.nbytes
+        )
+        self.detection_latency = metrics.MOTION_DETECTION_LATENCY.labels()
+        self.motion_detected = threading.Event()
+        self.camera = camera
+        self.last_motion_event: t.Optional[MotionEvent] = None
+        self.motion_detector = DetectMotion(
+            sensitivity=self.config.sensitivity,
+            min_blocks=self.config.min_blocks,
+            min_frames=self.config.min_frames,
+        )
+        # start listening for frames last of all, now that everything they need is in place
         self.video_handler = VideoOutputHandler(
             video_output=camera.video_output,
             frame_callback=self.process_frame,
@@ -217,15 +235,6 @@ class MotionDetectionOutput(BaseOutput):
             motion_frame_callback=self.process_motion_frame,
             thread_name="MotionDataThread",
         )
-        self.pre_event_buffer = FrameBuffer(maxlen=camera.framerate * self.config.captured_before)
-        self.post_event_buffer = FrameBuffer(maxlen=camera.framerate * self.config.captured_after)
-        self.motion_detected = threading.Event()
-        self.last_motion_event: t.Optional[MotionEvent] = None
-        self.motion_detector = DetectMotion(
-            sensitivity=self.config.sensitivity,
-            min_blocks=self.config.min_blocks,
-            min_frames=self.config.min_frames,
-        )
 
     def process_frame(self, frame: VideoFrame) -> None:
         if not self.motion_detected.is_set():
@@ -246,21 +255,36 @@ class MotionDetectionOutput(BaseOutput):
 
                 full_event = self.pre_event_buffer.concatenate(self.post_event_buffer)
                 full_event.trim_start()
-
-                # create_trigger_image(trigger_frame_group, self.last_motion_event.motion_boxes)
-                payload = {
-                    "motion_video": full_event.raw_bytes(),
-                    "trigger_image_data": {
-                        "frame_group": trigger_frame_group.raw_bytes(),
-                        "trigger_frame_index": len(trigger_frame_group) - 2,
-                        "boxes": self.last_motion_event.motion_boxes.serialise(),
+                # the server decodes each half of the video independently, so the "after" video
+                # must start with a header frame
+                before_video, after_video = full_event.split(
+                    len(full_event) - len(self.post_event_buffer)
+                )
+
+                trigger_image = create_trigger_image(
+                    trigger_frame_group, self.last_motion_event.motion_boxes
+                )
+                timestamp = datetime.datetime.fromtimestamp(self.last_motion_event.timestamp)
+
+                # the frame data is handed over as a view of each frame so that the video is never
+                # copied into one contiguous block of memory
+                self.spool.put(
+                    "/process-new-motion-event",
+                    fields={"timestamp": timestamp.isoformat(), "framerate": str(self.framerate)},
+                    files={
+                        "before_video": (
+                            "before_video.h264",
+                            "video/h264",
+                            before_video.buffers(),
+                        ),
+                        "after_video": (
+                            "after_video.h264",
+                            "video/h264",
+                            after_video.buffers(),
+                        ),
+                        "trigger_image": ("trigger_image.jpeg", "image/jpeg", trigger_image),
                     },
-                    "timestamp": self.last_motion_event.timestamp,
-                }
-                create_trigger_image(trigger_frame_group, self.last_motion_event.motion_boxes)
-
-                SERVER_ADDR = "192.168.1.10:8000"
-                # requests.post(f"{SERVER_ADDR}/api/motion_event", data=payload)
+                )
 
                 # reset the buffers
                 self.pre_event_buffer.clear()
@@ -268,37 +292,61 @@ class MotionDetectionOutput(BaseOutput):
 
                 # reset the motion_detected event flag
                 self.motion_detected.clear()
+                self.camera.set_motion_active(False)
 
     def process_motion_frame(self, frame: MotionFrame) -> None:
+        event, detect_ns = None, None
+        if self._should_detect():
+            start = time.perf_counter_ns()
+            event = self.motion_detector.detect(frame)
+            detect_ns = time.perf_counter_ns() - start
+            self.detection_latency.observe(detect_ns / 1e9)
+            if event is not None:
+                self.last_motion_event = event
+                # signal to the video_frame processing thread that we are good to start recording
+                # a new motion event
+                self.motion_detected.set()
+                self.camera.set_motion_active(True)
+
+        # a candidate detector may be evaluated against the live one, on the same frames
+        shadow = self.camera.motion_output.shadow
+        if shadow is not None:
+            shadow.submit(frame, event, detect_ns, self.motion_detector.min_frames)
+
+    def _should_detect(self) -> bool:
         MIN_MOTION_INTERVAL = self.config.motion_interval
         # if we are already processing a motion detection event, or our pre event
         # buffer hasn't filled up yet, return early
         if self.motion_detected.is_set():
             logging.info("Motion already detected - skipping motion detection")
-            return
+            return False
 
         if not self.pre_event_buffer.full:
             logging.info("Pre event buffer not yet full - skipping motion detection")
-            return
+            return False
 
         # if it's too soon after the last motion event, return early
-        if self.last_motion_event is not None and time.time() < (
+        if self.last_motion_event is not None and clock.now() < (
             self.last_motion_event.timestamp + MIN_MOTION_INTERVAL
         ):
             logging.info(
                 "Motion detected within the last %ds - skipping motion detection",
                 MIN_MOTION_INTERVAL,
             )
-            return
+            return False
 
         # we've passed all the guards which would obviate the need to run the algorithm
-        event = self.motion_detector.detect(frame)
-        if event is not None:
-            self.last_motion_event = event
-            # signal to the video_frame processing thread that we are good to start recording
-            # a new motion event
-            self.motion_detected.set()
+        return True
+
+    def camera_reconfigured(self, camera: Camera, changed: t.Set[str]) -> bool:
+        # the event buffers hold a number of seconds' worth of frames, so are sized by the
+        # framerate. Any other change can be followed, as the new recording's frames are preceded
+        # by an SPS header carrying its parameters
+        return "framerate" not in changed
 
     def close(self):
         self.video_handler.close()
         self.motion_handler.close()
+        metrics.BUFFER_BYTES.remove("pre_event")
+        metrics.BUFFER_BYTES.remove("post_event")
+        self.camera.set_motion_active(False)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import logging
+import socket
+import threading
+import typing as t
+
+from .. import cpu, metrics, tracing
+from ..motion_vectors import MotionVectorEncoder
+from .bases import BaseOutput, MotionOutputHandler
+
+if t.TYPE_CHECKING:
+    from ..camera import Camera
+    from ..types import MotionFrame
+
+
+class _SocketThread(threading.Thread):
+    def __init__(self, motion_vector_output: MotionVectorOutput, port: int):
+        super().__init__(daemon=True, name="MotionVectorSocketThread")
+        self.closed = False
+        self.motion_vector_output = motion_vector_output
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("0.0.0.0", port))
+        self.socket.listen(0)
+        self.start()
+
+    @cpu.tracked("motion_vectors")
+    def run(self) -> None:
+        output = self.motion_vector_output
+        # this primary loop repeatedly re-establishes connections once broken
+        while not self.closed:
+            logging.info(f"Waiting for connection on port {self.socket.getsockname()[1]}")
+            try:
+                # an OSError is raised when the socket is shutdown (e.g. by the parent thread)
+                conn, addr = self.socket.accept()
+            except OSError:
+                break
+
+            logging.info(f"Received motion vector connection from {addr}")
+            output.connected.set()
+            output.clients.inc()
+            prev_sent_frame_num = None
+            while not self.closed:
+                with output.record_cv:
+                    if output.record_cv.wait(timeout=1):
+                        frame_num, record = output.record
+                    else:
+                        continue
+                try:
+                    start = tracing.start()
+                    conn.sendall(record)
+                    tracing.end("send", start, frame_num)
+                except ConnectionError:
+                    logging.info("Motion vector connection terminated")
+                    break
+                # records are self-contained, so any skipped whilst sending don't matter
+                if prev_sent_frame_num is not None and frame_num != prev_sent_frame_num + 1:
+                    output.skipped += frame_num - prev_sent_frame_num - 1
+                prev_sent_frame_num = frame_num
+                output.frames_out.inc()
+                output.bytes_sent.inc(len(record))
+            output.connected.clear()
+            output.clients.dec()
+            conn.close()
+
+    def close(self) -> None:
+        """Close the socket thread and release any underlying resources.
+
+        This method is called by MainThread.
+        """
+        self.closed = True
+        # this raises an OSError in a thread blocked on socket.accept()
+        self.socket.shutdown(2)
+        self.socket.close()
+        super().join()
+
+
+class MotionVectorOutput(BaseOutput):
+    """Stream the camera's motion vectors to the server, for it to run motion detection.
+
+    This is for cameras, such as the Pi Zero, which can't spare the CPU to run detection
+    themselves. The vectors are only encoded whilst the server is connected.
+    """
+
+    def __init__(self, camera: Camera):
+        """Start serving motion vectors on `socket_port`.
+
+        This method is called by MainThread.
+        """
+        logging.info("Motion vector output initialising")
+        super().__init__(output_name="motion_vectors", camera=camera)
+
+        self.encoder = MotionVectorEncoder(
+            min_magnitude=self.config.min_magnitude,
+            compression_level=self.config.compression_level,
+        )
+        # the most recent (frame number, encoded record), for the socket thread to send
+        self.record: t.Optional[t.Tuple[int, bytes]] = None
+        self.record_cv = threading.Condition()
+        self.connected = threading.Event()
+        # records which were encoded but never sent, because the previous one was still sending
+        self.skipped = 0
+        self.clients = metrics.NETWORK_CLIENTS.labels("MotionVector")
+        self.frames_out = metrics.FRAMES_OUT.labels("MotionVector")
+        self.bytes_sent = metrics.BYTES_SENT.labels("MotionVector")
+
+        self.motion_handler = MotionOutputHandler(
+            camera.motion_output, self.process_motion_frame, "MotionVectorDataThread"
+        )
+        self.socket_thread = _SocketThread(self, self.config.socket_port)
+
+    def process_motion_frame(self, frame: MotionFrame) -> None:
+        """Encode the frame's motion vectors and make them available to the socket thread.
+
+        This method is called by MotionVectorDataThread.
+        """
+        if not self.connected.is_set():
+            return
+        record = self.encoder.encode(frame)
+        with self.record_cv:
+            self.record = (frame.frame_num, record)
+            self.record_cv.notify()
+
+    def close(self) -> None:
+        """Tidily release all resources.
+
+        This method is called by MainThread.
+        """
+        logging.info("Motion vector output closing down")
+        self.motion_handler.close()
+        self.socket_thread.close()
+        logging.info(
+            "Motion vector output closed. %d frames encoded (%d empty) into %d bytes, %d skipped",
+            self.encoder.frames,
+            self.encoder.empty_frames,
+            self.encoder.bytes_encoded,
+            self.skipped,
+        )
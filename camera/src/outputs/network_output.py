@@ -1,30 +1,44 @@
 from __future__ import annotations
 
+import fcntl
 import logging
 import socket
+import struct
+import termios
 import threading
+import time
 import typing as t
 
+from .. import cpu, metrics, tracing
+from ..bitrate import BitrateController, SendStats
 from .bases import BaseOutput, VideoOutputHandler
 
 if t.TYPE_CHECKING:
-    from ..camera import Camera
-    from ..config import NetworkOutputConfigSchema
+    from ..camera import Camera, VideoOutput
     from ..types import VideoFrame
 
 
+def _queued_bytes(conn: socket.socket) -> int:
+    """Return the number of bytes written to a socket which the kernel has yet to send."""
+    try:
+        buf = fcntl.ioctl(conn.fileno(), termios.TIOCOUTQ, struct.pack("I", 0))
+    except OSError:
+        return 0
+    return struct.unpack("I", buf)[0]
+
+
 class _SocketThread(threading.Thread):
-    def __init__(self, network_output: NetworkOutput, config: NetworkOutputConfigSchema):
-        super().__init__(daemon=True, name="NetworkSocketThread")
+    def __init__(self, network_stream: _NetworkStream, port: int, thread_name: str):
+        super().__init__(daemon=True, name=thread_name)
         self.closed = False
-        self.network_output = network_output
+        self.network_stream = network_stream
         self.socket = socket.socket()
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        port = config.socket_port
         self.socket.bind(("0.0.0.0", port))
         self.socket.listen(0)
         self.start()
 
+    @cpu.tracked("network")
     def run(self) -> None:
         # this primary loop repeatedly re-establishes connections once broken
         while not self.closed:
@@ -39,12 +53,14 @@ class _SocketThread(threading.Thread):
                 break
 
             logging.info(f"Received connection from {addr}")
+            self.network_stream.clients.inc()
+            prev_sent_frame = None
 
             # this subloop is responsible for continuously sending frame data once connected
             while not self.closed:
-                with self.network_output.process_frame_cv:
-                    if self.network_output.process_frame_cv.wait(timeout=1):
-                        frame = self.network_output.frame
+                with self.network_stream.process_frame_cv:
+                    if self.network_stream.process_frame_cv.wait(timeout=1):
+                        frame = self.network_stream.frame
                     else:
                         logging.warning("Timed out waiting for frame")
                         continue
@@ -59,13 +75,29 @@ class _SocketThread(threading.Thread):
                         # this frame is the first SPS header since the new connection
                         stream_initialised = True
                 try:
+                    traced = tracing.start()
+                    start = time.perf_counter()
                     conn.sendall(frame.data)
+                    send_time = time.perf_counter() - start
+                    tracing.end("send", traced, frame.frame_num)
                 except ConnectionError:
                     # the connection is broken, for whatever reason, so we break out
                     # of the subloop and return to the main loop
                     logging.info("Connection terminated")
                     break
 
+                # any frames produced whilst the previous one was still sending were never sent
+                skipped = 0
+                if prev_sent_frame is not None:
+                    skipped = max(frame.frame_num - prev_sent_frame.frame_num - 1, 0)
+                prev_sent_frame = frame
+                self.network_stream.stats.record(send_time, skipped, _queued_bytes(conn))
+                self.network_stream.frames_out.inc()
+                self.network_stream.bytes_sent.inc(len(frame.data))
+
+            self.network_stream.clients.dec()
+            conn.close()
+
     def close(self) -> None:
         """Close the socket thread and release any underlying resources.
 
@@ -78,19 +110,17 @@ class _SocketThread(threading.Thread):
         super().join()
 
 
-class NetworkOutput(BaseOutput):
-    def __init__(self, camera: Camera):
-        """Initialise the network output.
+class _NetworkStream:
+    """Serves the frames of a single video output to a client connected to a TCP port."""
 
-        This method is called by MainThread.
-        """
-        logging.info("Network output initialising")
-        super().__init__(output_name="network", camera=camera)
+    # the output whose CPU time the stream's threads count towards
+    output_name = "network"
 
-        self.video_handler = VideoOutputHandler(
-            camera.video_output, self.process_frame, "NetworkVideoThread"
-        )
+    def __init__(self, video_output: VideoOutput, port: int, name: str):
+        """Initialise the stream, naming its threads after `name`.
 
+        This method is called by MainThread.
+        """
         # this is used to communicate with the socket thread
         self.process_frame_cv = threading.Condition()
 
@@ -98,13 +128,25 @@ class NetworkOutput(BaseOutput):
         # thread will use
         self.frame: t.Optional[VideoFrame] = None
 
+        # how long each frame takes to send, and how many are skipped
+        self.stats = SendStats()
+        self.clients = metrics.NETWORK_CLIENTS.labels(name)
+        self.frames_out = metrics.FRAMES_OUT.labels(name)
+        self.bytes_sent = metrics.BYTES_SENT.labels(name)
+
+        self.video_handler = VideoOutputHandler(
+            video_output, self.process_frame, f"{name}VideoThread"
+        )
+
         # use a separate thread to handle connections and writing data
-        self.socket_thread = _SocketThread(network_output=self, config=self.config)
+        self.socket_thread = _SocketThread(
+            network_stream=self, port=port, thread_name=f"{name}SocketThread"
+        )
 
     def process_frame(self, frame: VideoFrame) -> None:
         """Make the current frame available to the socket thread.
 
-        This method is called by NetworkVideoThread.
+        This method is called by the stream's video thread.
         """
         with self.process_frame_cv:
             self.frame = frame
@@ -115,7 +157,6 @@ class NetworkOutput(BaseOutput):
 
         This method is called by MainThread.
         """
-        logging.info("Network output closing down")
         # close the VideoOutputMeta thread which is listening out for notifications
         # of new frames
         self.video_handler.close()
@@ -124,4 +165,59 @@ class NetworkOutput(BaseOutput):
         # frames to or actively sending frames to a connection
         self.socket_thread.close()
 
+
+class NetworkOutput(BaseOutput):
+    def __init__(self, camera: Camera):
+        """Initialise the network output.
+
+        The main video stream is served on `socket_port`. If the camera is also recording a
+        secondary, lower resolution stream, it is served on `secondary_socket_port`.
+
+        This method is called by MainThread.
+        """
+        logging.info("Network output initialising")
+        super().__init__(output_name="network", camera=camera)
+
+        self.stream = _NetworkStream(camera.video_output, self.config.socket_port, "Network")
+
+        self.secondary_stream: t.Optional[_NetworkStream] = None
+        if camera.secondary_resolution is not None:
+            self.secondary_stream = _NetworkStream(
+                camera.secondary_video_output,
+                self.config.secondary_socket_port,
+                "NetworkSecondary",
+            )
+
+        self.bitrate_controller: t.Optional[BitrateController] = None
+        if self.config.adaptive_bitrate:
+            max_bitrate = self.config.max_bitrate or camera.bitrate
+            self.bitrate_controller = BitrateController(
+                self.stream.stats,
+                get_bitrate=lambda: camera.effective_bitrate,
+                set_bitrate=camera.change_bitrate,
+                min_bitrate=min(self.config.min_bitrate, max_bitrate),
+                max_bitrate=max_bitrate,
+            )
+
+    def camera_reconfigured(self, camera: Camera, changed: t.Set[str]) -> bool:
+        # clients stay connected, and decode the new recording from its first SPS header, unless
+        # the secondary stream has been turned on or off
+        if (camera.secondary_resolution is None) != (self.secondary_stream is None):
+            return False
+        if self.bitrate_controller is not None and self.config.max_bitrate is None:
+            self.bitrate_controller.max_bitrate = camera.bitrate
+            self.bitrate_controller.min_bitrate = min(self.config.min_bitrate, camera.bitrate)
+        return True
+
+    def close(self) -> None:
+        """Tidily release all resources.
+
+        This method is called by MainThread.
+        """
+        logging.info("Network output closing down")
+        if self.bitrate_controller is not None:
+            self.bitrate_controller.close()
+        self.stream.close()
+        if self.secondary_stream is not None:
+            self.secondary_stream.close()
         logging.info("Network output closed")
@@ -1,42 +1,47 @@
 from __future__ import annotations
 
-import base64
 import datetime
-import io
 import logging
 import threading
-from typing import TYPE_CHECKING, Optional
-
-import requests
+from typing import TYPE_CHECKING, Optional, Set, Tuple
 
 from .bases import BaseOutput, VideoOutputHandler
-from ..types import FrameBuffer, VideoFrame
+from .. import cpu
+from ..types import VideoFrame
 
 if TYPE_CHECKING:
     from ..camera import Camera
+    from ..spool import UploadSpool
 
 
 class SenderThread(threading.Thread):
-    def __init__(self, timelapse_output: TimelapseOutput, server_addr: str):
-        super().__init__(daemon=True)
+    def __init__(self, timelapse_output: TimelapseOutput, spool: UploadSpool):
+        super().__init__(daemon=True, name="TimelapseSenderThread")
         self.closed = False
         self.timelapse_output = timelapse_output
         self.timelapse_event = timelapse_output.timelapse_event
-        self.server_addr = server_addr
+        self.spool = spool
         self.start()
 
+    @cpu.tracked("timelapse")
     def run(self):
         while not self.closed:
             if self.timelapse_event.wait(1):
-                payload = {
-                    "timelapse_image_data": {
-                        "frame_group": self.timelapse_output.last_frame_group.raw_bytes(),
-                        "timelapse_frame_index": len(self.timelapse_output.last_frame_group) - 2,
+                header, key_frame = self.timelapse_output.last_capture
+                timestamp = datetime.datetime.fromtimestamp(key_frame.timestamp)
+                # a single access unit - the parameter sets plus one IDR frame - is all the
+                # server needs to decode the image
+                self.spool.put(
+                    "/process-new-timelapse-keyframe",
+                    fields={"capture_time": timestamp.isoformat()},
+                    files={
+                        "keyframe": (
+                            "keyframe.h264",
+                            "video/h264",
+                            [memoryview(header.data), memoryview(key_frame.data)],
+                        )
                     },
-                    "timestamp": self.timelapse_output.last_frame_group[-1].timestamp,
-                }
-
-                # requests.post(f"{self.server_addr}/api/timelapse-image", json=payload)
+                )
                 self.timelapse_event.clear()
             else:
                 # this branch will run very second that there is no timelapse image to send, which
@@ -49,51 +54,91 @@ class SenderThread(threading.Thread):
 
 
 class TimelapseOutput(BaseOutput):
-    """POST a new timelapse image to the server at a predefined interval."""
+    """POST a new timelapse image to the server at a predefined interval.
+
+    Each capture is sent as a single H264 access unit, i.e. the most recent SPS/PPS header
+    followed by one IDR frame. If no key frame is due when a capture is needed, the encoder is
+    asked to produce one.
+    """
 
     def __init__(self, camera: Camera):
         logging.info("Timelapse output initialising")
         super().__init__(output_name="timelapse", camera=camera)
-        self.video_handler = VideoOutputHandler(
-            video_output=camera.video_output,
-            frame_callback=self.process_frame,
-            thread_name="TimelapseOutputThread",
-        )
-        # maintain a buffer of the most recent frames. It needs to be large enough
-        # to include a minimum of one SPS header
-        self.buffer = FrameBuffer(maxlen=30)
+        self.camera = camera
 
         # the number of seconds between each timelapse image
         self.interval = self.config.capture_interval
 
+        # the parameter sets are needed to decode a key frame, so keep hold of the latest ones
+        self.header: Optional[VideoFrame] = None
+        self.prev_frame: Optional[VideoFrame] = None
+
+        # the frame number at which we last asked the encoder for a key frame, if we are
+        # currently waiting for one
+        self.key_frame_requested_at: Optional[int] = None
+        # how many frames to wait for a requested key frame before asking again
+        self.key_frame_timeout = camera.framerate * 2
+
         # this is used to alert the image sending child thread that a new timelapse
         # image needs to be processed and sent
         self.timelapse_event = threading.Event()
 
         # keep track of the most recent timelapse data
-        self.last_frame_group: Optional[FrameBuffer] = None
+        self.last_capture: Optional[Tuple[VideoFrame, VideoFrame]] = None
+        self.last_timestamp: Optional[float] = None
+        # when the next capture is due. Captures are scheduled from when the previous one was
+        # due, rather than when it was taken, so that they don't each slip a frame or so later
+        self.next_capture_at: Optional[float] = None
 
         # handle the job of processing and sending the latest timelapse data in
         # a different thread
-        self.sender_thread = SenderThread(self, camera.server_address)
+        self.sender_thread = SenderThread(self, camera.spool)
+
+        # start listening for frames last of all, now that everything they need is in place
+        self.video_handler = VideoOutputHandler(
+            video_output=camera.video_output,
+            frame_callback=self.process_frame,
+            thread_name="TimelapseOutputThread",
+        )
 
     def process_frame(self, frame: VideoFrame) -> None:
-        self.buffer.append(frame)
+        prev_frame, self.prev_frame = self.prev_frame, frame
+        if frame.sps_header:
+            self.header = frame
+            return
 
-        # start with just filling up the buffer so that we definitely have
-        # some valid frames to work with. We can also return early if this is
-        # just a header frame (we'll wait for the next data frame) or if we
-        # are already busy sending a timelapse image
-        if not self.buffer.full or frame.sps_header or self.timelapse_event.is_set():
+        # return early if it isn't yet time for the next capture, or if we are still busy
+        # sending the previous one
+        due = self.next_capture_at is None or frame.timestamp >= self.next_capture_at
+        if not due or self.header is None or self.timelapse_event.is_set():
             return
 
-        # if it is time to create a new timelapse image, notify the image sender thread
-        if (self.last_timestamp is None) or frame.timestamp >= (
-            self.last_frame_group[-1].timestamp + self.interval
-        ):
-            frame_group = self.buffer.final_group()
-            self.last_frame_group = frame_group
+        # the header must immediately precede the key frame, otherwise the parameter sets may
+        # not apply to it
+        if frame.key_frame and prev_frame is not None and prev_frame.sps_header:
+            self.last_capture = (prev_frame, frame)
+            self.last_timestamp = frame.timestamp
+            if self.next_capture_at is None:
+                self.next_capture_at = frame.timestamp
+            # any captures missed altogether, e.g. whilst the previous one was still being sent,
+            # are skipped rather than taken one after the other
+            self.next_capture_at += self.interval * (
+                1 + (frame.timestamp - self.next_capture_at) // self.interval
+            )
+            self.key_frame_requested_at = None
             self.timelapse_event.set()
+        elif (
+            self.key_frame_requested_at is None
+            or frame.frame_num - self.key_frame_requested_at > self.key_frame_timeout
+        ):
+            # rather than waiting for the next scheduled key frame, which could be some time
+            # away, ask the encoder to produce one now
+            self.camera.request_key_frame()
+            self.key_frame_requested_at = frame.frame_num
+
+    def camera_reconfigured(self, camera: Camera, changed: Set[str]) -> bool:
+        self.key_frame_timeout = camera.framerate * 2
+        return True
 
     def close(self):
         logging.info("Timelapse output closing")
@@ -8,7 +8,7 @@ import typing as t
 import ffmpeg
 
 from .bases import BaseOutput, VideoOutputHandler
-from .. import enums
+from .. import cpu, enums, metrics
 
 if t.TYPE_CHECKING:
     from ..camera import Camera
@@ -17,7 +17,7 @@ if t.TYPE_CHECKING:
 
 class _StreamingThread(threading.Thread):
     def __init__(self, framerate: int, ingestion_url: str):
-        super().__init__()
+        super().__init__(name="YoutubeStreamingThread")
         self.closed: bool = False
         self.daemon: bool = True
 
@@ -42,8 +42,11 @@ class _StreamingThread(threading.Thread):
         self.proc: subprocess.Popen = self.cmd.run_async(
             pipe_stdin=True, cmd=["ffmpeg"] + self.global_args, overwrite_output=True
         )
+        metrics.FFMPEG_STARTS.labels("YouTube").inc()
+        cpu.ACCOUNTING.track_process(self.proc.pid, "ffmpeg", "youtube")
         self.start()
 
+    @cpu.tracked("youtube")
     def run(self):
         print(" ".join(self.proc.args))
         while not self.closed:
@@ -54,12 +57,14 @@ class _StreamingThread(threading.Thread):
 
     def close(self) -> None:
         self.closed = True
+        cpu.ACCOUNTING.untrack_process(self.proc.pid)
         self.proc.kill()
 
 
 class YouTubeOutput(BaseOutput):
     def __init__(self, camera: Camera):
         super().__init__(output_name="youtube", camera=camera)
+        self.frames_out = metrics.FRAMES_OUT.labels("YouTube")
         self.video_handler = VideoOutputHandler(
             video_output=camera.video_output,
             frame_callback=self.process_frame,
@@ -76,6 +81,11 @@ class YouTubeOutput(BaseOutput):
 
     def process_frame(self, frame: Frame) -> None:
         self.streaming_thread.send_frame(frame.data)
+        self.frames_out.inc()
+
+    def camera_reconfigured(self, camera: Camera, changed: t.Set[str]) -> bool:
+        # ffmpeg copies the stream as it is, but paces its input at the framerate it was given
+        return "framerate" not in changed
 
     def close(self) -> None:
         super().close()
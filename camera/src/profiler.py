@@ -0,0 +1,115 @@
+"""A sampling profiler for the running camera process, which needs nothing to be installed.
+
+Every thread's stack is sampled at a fixed rate through `sys._current_frames`, from the thread
+which asked for the profile. The result is rendered as collapsed stacks, one line per distinct
+stack with the number of times it was seen:
+
+    NetworkVideoThread;_bootstrap (threading.py:890);...;process_frame (network_output.py:143) 57
+
+which flamegraph.pl, speedscope (speedscope.app) and most other flame graph tools read directly.
+
+Samples are of wall-clock time, so threads blocked waiting for frames appear as well as those
+which are busy. Frames are labelled by function, and the file and first line of the function,
+so that samples anywhere within the same function are merged.
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+import sys
+import threading
+import time
+import typing as t
+
+from . import exceptions
+
+_lock = threading.Lock()
+
+
+class Profile:
+    def __init__(self, stacks: t.Dict[t.Tuple[str, ...], int], duration: float, overhead: float):
+        # the number of times each stack, outermost frame first and led by its thread's name,
+        # was seen
+        self.stacks = stacks
+        self.samples = sum(stacks.values())
+        self.duration = duration
+        # the fraction of the profile's duration spent taking samples
+        self.overhead = overhead
+
+    def collapsed(self) -> str:
+        """Return the profile in the collapsed stack format read by flame graph tools."""
+        lines = sorted(f"{';'.join(stack)} {count}" for stack, count in self.stacks.items())
+        return "\n".join(lines) + "\n"
+
+
+def _label(code: t.Any) -> str:
+    # semicolons separate frames, and spaces separate the stack from its count
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+def profile(seconds: float, rate: float = 100, max_overhead: float = 0.02) -> Profile:
+    """Sample the stacks of every other thread `rate` times per second for `seconds`.
+
+    Sampling holds the GIL, stalling every other thread whilst it runs. If sampling takes more
+    than `max_overhead` of the time at `rate`, e.g. on a slower Pi or with many threads running,
+    samples are taken less often instead. Only one profile may be taken at a time.
+    """
+    if not _lock.acquire(blocking=False):
+        raise exceptions.ProfilerBusy()
+    try:
+        return _profile(seconds, 1 / rate, max_overhead)
+    finally:
+        _lock.release()
+
+
+def _profile(seconds: float, interval: float, max_overhead: float) -> Profile:
+    own_ident = threading.get_ident()
+    # stacks are counted as tuples of code objects, and only turned into text at the end
+    counts: t.Counter[t.Tuple[t.Any, ...]] = collections.Counter()
+    names: t.Dict[int, str] = {}
+    sampling_time = 0.0
+
+    start = time.perf_counter()
+    deadline = start + seconds
+    next_sample = start
+    while True:
+        sample_start = time.perf_counter()
+        if sample_start >= deadline:
+            break
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if ident not in names:
+                names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                names.setdefault(ident, f"Thread-{ident}")
+            stack: t.List[t.Any] = [names[ident]]
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            counts[tuple(stack)] += 1
+        # don't keep any of the frames alive until the next sample
+        frame = None
+        cost = time.perf_counter() - sample_start
+        sampling_time += cost
+
+        # sample on a fixed schedule, skipping ahead rather than catching up if we fall behind
+        next_sample += max(interval, cost / max_overhead)
+        now = time.perf_counter()
+        if next_sample < now:
+            next_sample = now + interval
+        time.sleep(next_sample - now)
+    duration = time.perf_counter() - start
+
+    labels: t.Dict[t.Any, str] = {}
+    stacks: t.Counter[t.Tuple[str, ...]] = collections.Counter()
+    for stack, count in counts.items():
+        # the stack is led by the thread's name, followed by its innermost frame first
+        collapsed = [stack[0]]
+        for code in reversed(stack[1:]):
+            if code not in labels:
+                labels[code] = _label(code)
+            collapsed.append(labels[code])
+        stacks[tuple(collapsed)] += count
+    return Profile(dict(stacks), duration, sampling_time / duration)
@@ -4,7 +4,7 @@ from ipaddress import IPv4Address
 from pydantic import BaseModel as PydanticBaseModel
 from pydantic import EmailStr, Field, validator
 
-from . import enums
+from . import enums, framebus
 
 # p.110 https://www.mclibre.org/descargar/docs/revistas/magpi-books/raspberry-pi-camera-guide-en-2020-04.pdf  # noqa E501
 modes = {
@@ -38,6 +38,13 @@ class CameraConfigSchema(BaseModel):
     awb_mode: enums.AWBMode
     vflip: bool
     hflip: bool
+    # an optional, lower resolution copy of the video stream, recorded from a second splitter port
+    secondary_resolution: t.Optional[str] = None
+    secondary_bitrate: int = Field(500_000, ge=100_000, le=25_000_000)
+    annotate_fields: t.List[enums.AnnotateField] = [
+        enums.AnnotateField.NAME,
+        enums.AnnotateField.TIME,
+    ]
 
     @validator("resolution")
     def check_valid_resolution(cls, resolution, values):
@@ -67,6 +74,29 @@ class CameraConfigSchema(BaseModel):
             )
         return framerate
 
+    @validator("secondary_resolution")
+    def check_valid_secondary_resolution(cls, secondary_resolution, values):
+        if secondary_resolution is None:
+            return secondary_resolution
+        if "resolution" not in values:
+            raise ValueError("Cannot validate secondary resolution without a valid resolution.")
+
+        secondary_resolution = secondary_resolution.lower()
+        try:
+            width, height = (int(dim) for dim in secondary_resolution.split("x"))
+        except ValueError:
+            raise ValueError(
+                f"Invalid secondary resolution {{{secondary_resolution!r}}}. "
+                "Must be of the form 'WIDTHxHEIGHT'"
+            )
+        max_width, max_height = (int(dim) for dim in values["resolution"].split("x"))
+        if not (0 < width <= max_width and 0 < height <= max_height):
+            raise ValueError(
+                f"Invalid secondary resolution {{{secondary_resolution!r}}}. "
+                f"Must be no larger than the resolution {{{values['resolution']!r}}}"
+            )
+        return secondary_resolution
+
 
 class BaseOutputConfigSchema(BaseModel):
     pass
@@ -75,6 +105,28 @@ class BaseOutputConfigSchema(BaseModel):
 class NetworkOutputConfigSchema(BaseOutputConfigSchema):
     enabled: bool
     socket_port: int = Field(..., gt=0, le=65535)
+    # the secondary stream is only served if camera.secondary_resolution is set
+    secondary_socket_port: int = Field(8001, gt=0, le=65535)
+    # adapt the bitrate of the main stream to the network, between min_bitrate and max_bitrate.
+    # max_bitrate defaults to camera.bitrate
+    adaptive_bitrate: bool = False
+    min_bitrate: int = Field(1_000_000, ge=100_000, le=25_000_000)
+    max_bitrate: t.Optional[int] = Field(None, ge=100_000, le=25_000_000)
+
+    @validator("max_bitrate")
+    def check_valid_max_bitrate(cls, max_bitrate, values):
+        if max_bitrate is not None and max_bitrate < values.get("min_bitrate", 0):
+            raise ValueError("max_bitrate must not be lower than min_bitrate")
+        return max_bitrate
+
+
+class LocalOutputConfigSchema(BaseOutputConfigSchema):
+    # publishes frames to other processes on the Pi, so doesn't need a server
+    enabled: bool = False
+    shm_path: str = framebus.DEFAULT_SHM_PATH
+    socket_path: str = framebus.DEFAULT_SOCKET_PATH
+    ring_size: int = Field(32 * 1024 * 1024, ge=1024 * 1024, le=512 * 1024 * 1024)
+    motion_vectors: bool = True
 
 
 class YoutubeOutputConfigSchema(BaseOutputConfigSchema):
@@ -112,11 +164,23 @@ class MotionOutputConfigSchema(BaseOutputConfigSchema):
         return enabled
 
 
+class MotionVectorOutputConfigSchema(BaseOutputConfigSchema):
+    # streams motion vectors for the server to run detection on, instead of the camera
+    enabled: bool = False
+    socket_port: int = Field(8002, gt=0, le=65535)
+    # shorter vectors are zeroed, as they are mostly noise. Keep this below the sensitivity
+    # used for detection
+    min_magnitude: int = Field(3, ge=0, le=127)
+    compression_level: int = Field(1, ge=0, le=9)
+
+
 class OutputsSchema(BaseModel):
     network: NetworkOutputConfigSchema
+    local: LocalOutputConfigSchema = LocalOutputConfigSchema()
     timelapse: TimelapseOutputConfigSchema
     youtube: YoutubeOutputConfigSchema
     motion: MotionOutputConfigSchema
+    motion_vectors: MotionVectorOutputConfigSchema = MotionVectorOutputConfigSchema()
 
 
 class SavedConfigSchema(BaseModel):
@@ -130,7 +194,7 @@ class SavedConfigSchema(BaseModel):
     def ensure_disabled_outputs_if_no_server_address(cls, outputs, values):
         if values.get("server_address") is None:
             for output_name, output in outputs:
-                if output.enabled:
+                if output.enabled and output_name != "local":
                     raise ValueError(
                         f"Cannot enable {output_name} output without a valid server_address"
                     )
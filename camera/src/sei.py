@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+import struct
+import threading
+import time
+import uuid
+
+# identifies our user data amongst any other SEI messages in the stream. The server's parser in
+# server/src/utils/h264.py must use the same value
+METADATA_UUID = uuid.UUID("6d2f6f0e-9a53-4c8e-8f3c-70696d616e31")
+
+# version, wall-clock time in microseconds since the epoch, frame number, flags
+_PAYLOAD = struct.Struct(">BQIB")
+PAYLOAD_VERSION = 1
+FLAG_MOTION = 0x01
+
+_NAL_TYPE_SEI = 0x06
+_SEI_TYPE_USER_DATA_UNREGISTERED = 0x05
+# three zero bytes followed by 1 would otherwise look like a start code, so a 3 is inserted
+# after every pair of zero bytes which is followed by a byte <= 3
+_EMULATION = re.compile(b"\x00\x00(?=[\x00-\x03])")
+
+
+def encode_metadata(timestamp: float, frame_num: int, motion: bool) -> bytes:
+    """Return an Annex B SEI NAL unit carrying the metadata of a single frame."""
+    payload = METADATA_UUID.bytes + _PAYLOAD.pack(
+        PAYLOAD_VERSION,
+        int(timestamp * 1_000_000),
+        frame_num & 0xFFFFFFFF,
+        FLAG_MOTION if motion else 0,
+    )
+    rbsp = (
+        bytes([_SEI_TYPE_USER_DATA_UNREGISTERED, len(payload)])
+        + payload
+        # rbsp trailing bits
+        + b"\x80"
+    )
+    return b"\x00\x00\x00\x01" + bytes([_NAL_TYPE_SEI]) + _EMULATION.sub(b"\x00\x00\x03", rbsp)
+
+
+class SEIInjector:
+    """Prefixes video frames with an SEI NAL unit carrying their capture metadata.
+
+    The SEI unit precedes the frame's slice data, so it belongs to the same access unit as the
+    frame, and decoders which don't understand it simply skip over it.
+
+    Building the NAL unit and copying the frame data behind it both happen on the encoder
+    callback thread, so the cost of each is accounted for and available from `stats`.
+    """
+
+    def __init__(self):
+        # whether motion is currently being detected
+        self.motion = False
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes_added = 0
+        self.encode_ns = 0
+        self.copy_ns = 0
+        self.max_ns = 0
+
+    def inject(self, data: bytes, frame_num: int, timestamp: float) -> bytes:
+        """Return the frame data, prefixed with its metadata.
+
+        This method is called by the encoder callback thread.
+        """
+        start = time.perf_counter_ns()
+        sei = encode_metadata(timestamp, frame_num, self.motion)
+        encoded = time.perf_counter_ns()
+        data = sei + data
+        end = time.perf_counter_ns()
+
+        with self._lock:
+            self.frames += 1
+            self.bytes_added += len(sei)
+            self.encode_ns += encoded - start
+            self.copy_ns += end - encoded
+            self.max_ns = max(self.max_ns, end - start)
+        return data
+
+    def stats(self) -> dict:
+        """Return the number of frames injected and the cost of doing so."""
+        with self._lock:
+            frames = self.frames or 1
+            return {
+                "frames": self.frames,
+                "bytes_added": self.bytes_added,
+                "mean_bytes_per_frame": self.bytes_added / frames,
+                "mean_encode_us": self.encode_ns / frames / 1_000,
+                "mean_copy_us": self.copy_ns / frames / 1_000,
+                "max_us": self.max_ns / 1_000,
+            }
@@ -0,0 +1,213 @@
+"""Run a candidate motion detector alongside the live one, without it affecting what's recorded.
+
+A new algorithm, or new thresholds, are best proven on the cameras they'll run on, against the
+scenes they'll see. A `ShadowDetector` is handed every frame of motion vectors seen by the
+motion output, along with what the live `DetectMotion` made of it, and runs its candidate on
+the frame in a background thread. The candidate's events are never acted upon; where its
+decision differs from the live detector's, the difference is logged and kept for `stats`.
+
+The candidate runs under a CPU budget, a fraction of one core, so that it can't starve the
+pipeline. The CPU time it uses is counted against the budget, which refills as time passes,
+and whenever it has been overspent, frames are skipped until it has refilled. Frames are also
+skipped if the candidate is still busy with an earlier one when they arrive.
+
+As both detectors need motion in a number of consecutive frames, their decisions are only
+compared once both have run on the preceding `min_frames` frames, as otherwise a skipped frame
+would show up as a difference. The live detector doesn't run whilst a motion event is being
+recorded, or shortly after one, so those frames aren't compared either.
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+import threading
+import time
+import typing as t
+
+from . import cpu
+from .motion_recording import _distribution
+from .types import MotionFrame
+
+if t.TYPE_CHECKING:
+    from .outputs.motion_output import MotionEvent
+
+
+class _Submission(t.NamedTuple):
+    frame: MotionFrame
+    # the live detector's event, if it ran on the frame and detected one
+    live_event: t.Optional[MotionEvent]
+    live_ran: bool
+    live_ns: int
+    live_min_frames: int
+
+
+class ShadowDetector:
+    """Runs `candidate` on the frames submitted to it, on a thread of its own.
+
+    `candidate` may be any object with a `detect(motion_frame)` method which returns None, or
+    an event with `motion_boxes`, such as a `DetectMotion`. `cpu_budget` is the fraction of one
+    core it may use, and at most a second's worth of the budget is saved up for bursts.
+    """
+
+    def __init__(self, candidate, cpu_budget: float = 0.05, keep: int = 1000):
+        self.candidate = candidate
+        self.cpu_budget = cpu_budget
+        # the frame which the thread is yet to pick up
+        self._pending: t.Optional[_Submission] = None
+        self._cv = threading.Condition()
+        self._closed = False
+
+        # CPU seconds which the candidate may yet spend
+        self._credit = cpu_budget
+        self._refilled_at = time.monotonic()
+        self._previous_frame_num: t.Optional[int] = None
+        # the number of consecutive frames, up to the last, which both detectors ran on
+        self._both_ran = 0
+
+        self._lock = threading.Lock()
+        self._counts: t.Counter[str] = collections.Counter()
+        self._live_ns: t.Deque[int] = collections.deque(maxlen=keep)
+        self._candidate_ns: t.Deque[int] = collections.deque(maxlen=keep)
+        self._candidate_cpu_ns: t.Deque[int] = collections.deque(maxlen=keep)
+        self._disagreements: t.Deque[dict] = collections.deque(maxlen=100)
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name="MotionShadowThread")
+        self._thread.start()
+
+    def submit(
+        self,
+        frame: MotionFrame,
+        live_event: t.Optional[MotionEvent],
+        live_ns: t.Optional[int],
+        live_min_frames: int,
+    ) -> None:
+        """Hand over a frame, and the live detector's event, which took it `live_ns`.
+
+        `live_ns` is None if the live detector didn't run on the frame. If the candidate is
+        still busy with the previous frame, that frame is replaced by this one.
+
+        This method is called by MotionDataThread.
+        """
+        submission = _Submission(
+            frame, live_event, live_ns is not None, live_ns or 0, live_min_frames
+        )
+        with self._cv:
+            self._pending = submission
+            self._cv.notify()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._credit = min(
+            self._credit + (now - self._refilled_at) * self.cpu_budget, self.cpu_budget
+        )
+        self._refilled_at = now
+        return self._credit
+
+    @cpu.tracked("motion")
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while self._pending is None and not self._closed:
+                    self._cv.wait(timeout=1)
+                if self._closed:
+                    return
+                submission, self._pending = self._pending, None
+            self._process(submission)
+
+    def _process(self, submission: _Submission) -> None:
+        frame = submission.frame
+        with self._lock:
+            self._counts["frames"] += 1
+            if submission.live_ran:
+                self._live_ns.append(submission.live_ns)
+            previous, self._previous_frame_num = self._previous_frame_num, frame.frame_num
+            if previous is not None and frame.frame_num != previous + 1:
+                # replaced whilst the candidate was busy
+                self._counts["skipped_busy"] += max(frame.frame_num - previous - 1, 0)
+                self._both_ran = 0
+            if self._refill() < 0:
+                self._counts["skipped_over_budget"] += 1
+                self._both_ran = 0
+                return
+
+        start, cpu_start = time.perf_counter_ns(), time.thread_time_ns()
+        event = self.candidate.detect(frame)
+        cpu_ns = time.thread_time_ns() - cpu_start
+        elapsed_ns = time.perf_counter_ns() - start
+
+        with self._lock:
+            self._credit -= cpu_ns / 1e9
+            self._counts["run"] += 1
+            self._candidate_ns.append(elapsed_ns)
+            self._candidate_cpu_ns.append(cpu_ns)
+            if not submission.live_ran:
+                self._both_ran = 0
+                return
+            self._both_ran += 1
+            settled = max(getattr(self.candidate, "min_frames", 1), submission.live_min_frames)
+            if self._both_ran < settled:
+                return
+            self._counts["compared"] += 1
+            live_event = submission.live_event
+            if (live_event is None) == (event is None):
+                self._counts["agreed"] += 1
+                return
+            which = "live_only" if event is None else "candidate_only"
+            self._counts[which] += 1
+            disagreement = {
+                "frame_num": frame.frame_num,
+                "timestamp": frame.timestamp,
+                "detected_by": which,
+                "boxes": (live_event or event).motion_boxes.serialise(),
+            }
+            self._disagreements.append(disagreement)
+        logging.info(
+            "Shadow detector disagrees on frame %d: motion detected by %s detector only",
+            frame.frame_num,
+            "the live" if which == "live_only" else "the candidate",
+        )
+
+    def stats(self) -> dict:
+        """Return how often the detectors agreed, the frames skipped, and each one's cost."""
+        with self._lock:
+            counts = dict(self._counts)
+            costs = {
+                name: _distribution(list(ns)) if ns else None
+                for name, ns in [
+                    ("live", self._live_ns),
+                    ("candidate", self._candidate_ns),
+                    ("candidate_cpu", self._candidate_cpu_ns),
+                ]
+            }
+            disagreements = list(self._disagreements)
+        return {
+            # the settings of a `DetectMotion`, if that's what the candidate is
+            "candidate": {
+                name: getattr(self.candidate, attr)
+                for name, attr in [
+                    ("sensitivity", "sensitivty"),
+                    ("min_blocks", "min_blocks"),
+                    ("min_frames", "min_frames"),
+                ]
+                if hasattr(self.candidate, attr)
+            },
+            "cpu_budget": self.cpu_budget,
+            "frames": counts.get("frames", 0),
+            "run": counts.get("run", 0),
+            "skipped_busy": counts.get("skipped_busy", 0),
+            "skipped_over_budget": counts.get("skipped_over_budget", 0),
+            "compared": counts.get("compared", 0),
+            "agreed": counts.get("agreed", 0),
+            "live_only": counts.get("live_only", 0),
+            "candidate_only": counts.get("candidate_only", 0),
+            # the time taken per frame, in microseconds
+            "cost_us": costs,
+            "recent_disagreements": disagreements,
+        }
+
+    def close(self) -> None:
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._thread.join()
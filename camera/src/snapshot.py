@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import collections
+import logging
+import subprocess
+import threading
+import time
+import typing as t
+from concurrent.futures import Future
+
+from .exceptions import SnapshotDecodeFailed
+
+if t.TYPE_CHECKING:
+    from .types import VideoFrame
+
+# the width of the HQ camera's sensor, the wider of the supported cameras
+MAX_WIDTH = 4056
+
+
+def keyframe_to_jpeg(data: bytes, width: t.Optional[int] = None) -> bytes:
+    """Decode a single H264 access unit (SPS/PPS header and one IDR frame) to a JPEG.
+
+    If `width` is given, the image is scaled to that width, preserving the aspect ratio.
+    """
+    # imported here, as it is slow to import and snapshots may never be asked for
+    import ffmpeg
+
+    stream = ffmpeg.input("pipe:", f="h264")
+    if width is not None:
+        # -2 keeps the height divisible by 2, which the jpeg encoder requires
+        stream = ffmpeg.filter(stream, "scale", width, -2)
+    stream = ffmpeg.output(stream, "pipe:", vframes=1, f="mjpeg")
+    proc = subprocess.run(
+        ffmpeg.compile(stream, cmd=["ffmpeg", "-hide_banner", "-loglevel", "error"]),
+        input=data,
+        capture_output=True,
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        # the last line of ffmpeg's output says why
+        errors = proc.stderr.decode(errors="replace").strip().splitlines()
+        raise SnapshotDecodeFailed(errors[-1] if errors else None)
+    return proc.stdout
+
+
+class Snapshot:
+    """A JPEG decoded from a key frame, along with the details of the frame it came from."""
+
+    def __init__(self, jpeg: bytes, frame_num: int, timestamp: float):
+        self.jpeg = jpeg
+        self.frame_num = frame_num
+        self.timestamp = timestamp
+        # when this snapshot was last confirmed to be fresh
+        self.checked_at = time.monotonic()
+
+
+class SnapshotCache:
+    """Lazily decode the most recent key frame, sharing the result between concurrent callers.
+
+    Snapshots are cached per requested width, for the `max_widths` most recently requested. A
+    cached snapshot is returned as is for `ttl` seconds, after which the most recent key frame is
+    checked and only decoded if its frame number has changed. If several callers ask for the same
+    snapshot whilst it is being decoded, they all wait for, and receive, the result of that one
+    decode.
+    """
+
+    def __init__(
+        self,
+        latest_key_frame: t.Callable[[], t.Optional[t.Tuple[VideoFrame, VideoFrame]]],
+        ttl: float = 1,
+        decode: t.Callable[[bytes, t.Optional[int]], bytes] = keyframe_to_jpeg,
+        max_widths: int = 4,
+    ):
+        self.latest_key_frame = latest_key_frame
+        self.ttl = ttl
+        self.decode = decode
+        self.max_widths = max_widths
+        self._lock = threading.Lock()
+        # least recently requested first
+        self._cache: t.OrderedDict[t.Optional[int], Snapshot] = collections.OrderedDict()
+        self._decoding: t.Dict[t.Tuple[t.Optional[int], int], Future] = {}
+        self.decodes = 0
+
+    def get(self, width: t.Optional[int] = None) -> t.Optional[Snapshot]:
+        """Return a snapshot of the most recent key frame, or None if there isn't one yet."""
+        with self._lock:
+            cached = self._cache.get(width)
+            if cached is not None:
+                self._cache.move_to_end(width)
+            if cached is not None and time.monotonic() - cached.checked_at < self.ttl:
+                return cached
+
+            key_frame = self.latest_key_frame()
+            if key_frame is None:
+                return None
+            header, frame = key_frame
+
+            if cached is not None and cached.frame_num == frame.frame_num:
+                cached.checked_at = time.monotonic()
+                return cached
+
+            key = (width, frame.frame_num)
+            future = self._decoding.get(key)
+            owner = future is None
+            if owner:
+                future = self._decoding[key] = Future()
+
+        if not owner:
+            # somebody else is already decoding this exact frame
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            jpeg = self.decode(header.data + frame.data, width)
+            self.decodes += 1
+            logging.debug(
+                "Decoded snapshot of frame %d in %.1fms",
+                frame.frame_num,
+                (time.perf_counter() - start) * 1_000,
+            )
+            snapshot = Snapshot(jpeg, frame.frame_num, frame.timestamp)
+        except Exception as e:
+            with self._lock:
+                del self._decoding[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._cache[width] = snapshot
+            self._cache.move_to_end(width)
+            while len(self._cache) > self.max_widths:
+                self._cache.popitem(last=False)
+            del self._decoding[key]
+        future.set_result(snapshot)
+        return snapshot
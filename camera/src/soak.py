@@ -0,0 +1,296 @@
+"""Soak the camera's pipeline for a simulated day or more, in minutes, to catch leaks and drift.
+
+Leaks and drift are slow: a buffer which grows by a frame an hour, a thread left behind by each
+reconnection, or timelapse captures which slip a little later every time, only show after days.
+A `Soak` runs the whole pipeline, with its outputs, on a `FakePiCamera` producing frames `speed`
+times faster than real time, against an `AcceleratedClock` running just as fast, so every frame
+is stamped with the time it would have had. The outputs are configured as usual, and upload to a
+local sink standing in for the server, which keeps the capture time of every timelapse image.
+
+Throughout, the process's resident memory, threads, open file descriptors, the bytes held in
+the pipeline's buffers, and the frames published and dropped are sampled as time series, in
+simulated time. Once the soak has warmed up, `analyse` fits a line to each series to find how
+much it grew per simulated hour, and how far the timelapse captures slipped from their schedule.
+`failures` then compares those against `Limits`.
+
+    $ python -m benchmarks.soak --hours 24 --minutes 15
+
+As every frame passes through the pipeline `speed` times faster than it would on a camera, a
+low framerate and bitrate keep the soak from measuring only how many frames are dropped.
+"""
+
+from __future__ import annotations
+
+import datetime
+import functools
+import http.server
+import re
+import socket
+import threading
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import toml
+
+from . import clock, memory, metrics
+from .camera import Camera
+from .config import Config
+from .fake_camera import FakePiCamera, Recording
+
+# the series which shouldn't grow once the pipeline has warmed up, along with the fraction of
+# frames dropped, which is worked out from the frames handled and dropped
+GROWTH_SERIES = ("rss_bytes", "threads", "open_fds", "buffer_bytes")
+
+_CAPTURE_TIME = re.compile(rb'name="capture_time"\r\n\r\n([^\r]+)\r\n')
+
+
+def sample() -> t.Dict[str, float]:
+    """Return the process's resources, and the frames published, handled and dropped so far."""
+    stats = memory.buffers()
+    return {
+        "rss_bytes": stats["rss_bytes"] or 0,
+        "threads": stats["threads"],
+        "open_fds": sum(stats["open_fds"].values()),
+        "buffer_bytes": sum(stats["buffers"].values()),
+        "frames_published": metrics.FRAMES_PUBLISHED.values().get(("main",), 0),
+        # by every output's handler thread
+        "frames_handled": sum(metrics.FRAMES_IN.values().values()),
+        "frames_dropped": sum(metrics.FRAMES_DROPPED.values().values()),
+    }
+
+
+class _Sink(http.server.ThreadingHTTPServer):
+    """Accepts every upload, as the server would, keeping the capture time of each timelapse."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.uploads: t.Dict[str, int] = {}
+        self.captures: t.List[float] = []
+        self.lock = threading.Lock()
+
+
+class _SinkHandler(http.server.BaseHTTPRequestHandler):
+    server: _Sink
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        match = _CAPTURE_TIME.search(body)
+        with self.server.lock:
+            self.server.uploads[self.path] = self.server.uploads.get(self.path, 0) + 1
+            if match is not None:
+                capture_time = datetime.datetime.fromisoformat(match.group(1).decode())
+                self.server.captures.append(capture_time.timestamp())
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Soak:
+    """Runs the camera for `hours` of simulated time, in `minutes` of real time.
+
+    Every `sample_every` simulated seconds, the process is sampled. Files written by the camera,
+    such as its configuration and the spool of uploads, are kept in `directory`.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        hours: float = 24,
+        minutes: float = 15,
+        framerate: int = 5,
+        bitrate: int = 1_000_000,
+        capture_interval: int = 60,
+        outputs: t.Sequence[str] = ("network", "timelapse", "motion"),
+        sample_every: float = 300,
+        recording: t.Optional[Recording] = None,
+    ):
+        self.directory = Path(directory)
+        self.hours = hours
+        self.speed = hours * 60 / minutes
+        self.framerate = framerate
+        self.bitrate = bitrate
+        self.capture_interval = capture_interval
+        self.outputs = outputs
+        self.sample_every = sample_every
+        self.recording = recording
+        self.samples: t.List[t.Dict[str, float]] = []
+        self._stopped = threading.Event()
+
+    def _config(self, sink: _Sink) -> Path:
+        config = toml.load(str(Config.CONFIG_TEMPLATE_PATH))
+        config["server_address"] = {"ip": "127.0.0.1", "port": sink.server_address[1]}
+        config["camera"].update(framerate=self.framerate, bitrate=self.bitrate)
+        for name, output in config["outputs"].items():
+            output["enabled"] = name in self.outputs
+            # several soaks, or a running camera, mustn't contend for the same ports
+            for port in ("socket_port", "secondary_socket_port"):
+                if port in output:
+                    output[port] = _free_port()
+        config["outputs"]["timelapse"]["capture_interval"] = self.capture_interval
+        path = self.directory / "camera_config.toml"
+        with open(path, "w") as f:
+            toml.dump(config, f)
+        return path
+
+    def run(self, progress: t.Optional[t.Callable[[t.Dict[str, float]], None]] = None) -> dict:
+        """Run the soak, calling `progress` with each sample, and return what was observed.
+
+        The soak can be cut short, from another thread, with `stop`.
+        """
+        sink = _Sink()
+        threading.Thread(target=sink.serve_forever, daemon=True, name="SoakSinkThread").start()
+        camera_class = type(
+            "SoakCamera",
+            (Camera,),
+            {
+                "SPOOL_DIR": self.directory / "spool",
+                "MOTION_RECORDING_PATH": self.directory / "motion_vectors.npy",
+            },
+        )
+        backend = functools.partial(FakePiCamera, self.recording, speed=self.speed)
+        previous = clock.set_clock(clock.AcceleratedClock(self.speed))
+        camera = None
+        try:
+            camera = camera_class(self._config(sink), backend=backend)
+            camera.start()
+            start = clock.now()
+            end = start + self.hours * 3600
+            next_sample = start
+            while not self._stopped.is_set() and next_sample <= end:
+                # the clock runs `speed` times faster than the time waited
+                if self._stopped.wait(max(next_sample - clock.now(), 0) / self.speed):
+                    break
+                self.samples.append({"time": round(clock.now() - start, 3), **sample()})
+                if progress is not None:
+                    progress(self.samples[-1])
+                next_sample += self.sample_every
+        finally:
+            if camera is not None:
+                if camera.running:
+                    camera.stop()
+                camera.close()
+            clock.set_clock(previous)
+            sink.shutdown()
+            sink.server_close()
+        return {
+            "speed": self.speed,
+            "framerate": self.framerate,
+            "samples": self.samples,
+            "uploads": sink.uploads,
+            "captures": [capture - start for capture in sink.captures],
+            "capture_interval": self.capture_interval,
+        }
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class Limits(t.NamedTuple):
+    """How much each series may grow, per simulated hour, before a soak fails."""
+
+    rss_bytes: float = 1024 * 1024
+    threads: float = 0.1
+    open_fds: float = 0.1
+    buffer_bytes: float = 64 * 1024
+    # as frames pass through the pipeline many times faster than usual, some are dropped, but
+    # the fraction dropped shouldn't creep up
+    drop_fraction: float = 0.001
+    # how many frame periods later than their schedule the timelapse captures may typically be
+    # in the second half of the soak, than in the first
+    timelapse_slip_frames: float = 5
+
+
+def _slope_per_hour(times: np.ndarray, values: np.ndarray) -> float:
+    if len(times) < 2:
+        return 0.0
+    return float(np.polyfit(times / 3600, values, 1)[0])
+
+
+def analyse(result: dict, warmup: float = 0.1) -> dict:
+    """Return the growth per simulated hour of each series, once the first `warmup` of the soak
+    has passed, along with the frames dropped and how far the timelapse captures slipped.
+
+    As the soak runs many times faster than real time, a stall of a few milliseconds makes a
+    single capture seconds late. So rather than the drift of the final capture alone, the slip
+    compares how late the typical capture was in each half of the soak, which a capture slipping
+    by even a frame each time moves by many frame periods.
+    """
+    samples = result["samples"]
+    if not samples:
+        raise ValueError("The soak was stopped before it took any samples")
+    times = np.array([s["time"] for s in samples])
+    series = {
+        name: np.array([s[name] for s in samples], dtype=np.float64) for name in GROWTH_SERIES
+    }
+    # the fraction of the frames reaching the outputs which were dropped, between each sample
+    dropped = np.diff([s["frames_dropped"] for s in samples], prepend=0)
+    handled = np.diff([s["frames_handled"] for s in samples], prepend=0)
+    series["drop_fraction"] = dropped / np.maximum(dropped + handled, 1)
+
+    steady = times >= times[-1] * warmup
+    growth = {}
+    for name, values in series.items():
+        growth[name] = {
+            "first": round(float(values[steady][0]), 5),
+            "last": round(float(values[-1]), 5),
+            "max": round(float(values.max()), 5),
+            "per_hour": round(_slope_per_hour(times[steady], values[steady]), 5),
+        }
+
+    last = samples[-1]
+    total = last["frames_handled"] + last["frames_dropped"]
+    report = {
+        "simulated_hours": round(times[-1] / 3600, 3),
+        "growth": growth,
+        "frames": {
+            "published": last["frames_published"],
+            "dropped": last["frames_dropped"],
+            "drop_fraction": round(last["frames_dropped"] / total, 5) if total else 0.0,
+        },
+    }
+
+    captures, interval = np.array(result["captures"]), result["capture_interval"]
+    if len(captures) >= 2:
+        intervals = np.diff(captures)
+        # how much later each capture was than its schedule from the first
+        late = captures - captures[0] - np.arange(len(captures)) * interval
+        half = len(late) // 2
+        slip = float(np.median(late[half:]) - np.median(late[:half]))
+        report["timelapse"] = {
+            "captures": len(captures),
+            "mean_interval": round(float(intervals.mean()), 3),
+            "max_interval": round(float(intervals.max()), 3),
+            # how much later the final capture was than its schedule from the first
+            "drift_seconds": round(float(late[-1]), 3),
+            "slip_seconds": round(slip, 3),
+            "slip_frames": round(slip * result["framerate"], 1),
+        }
+    return report
+
+
+def failures(report: dict, limits: Limits = Limits()) -> t.List[str]:
+    """Return a description of each limit which the soak exceeded."""
+    failed = []
+    for name, growth in report["growth"].items():
+        limit = getattr(limits, name)
+        if growth["per_hour"] > limit:
+            failed.append(f"{name} grew by {growth['per_hour']:g}/hour (limit {limit:g})")
+    timelapse = report.get("timelapse")
+    if timelapse is not None and abs(timelapse["slip_frames"]) > limits.timelapse_slip_frames:
+        failed.append(
+            f"timelapse slipped by {timelapse['slip_frames']:g} frames "
+            f"({timelapse['slip_seconds']:g}s, limit {limits.timelapse_slip_frames:g} frames)"
+        )
+    return failed
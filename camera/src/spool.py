@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import random
+import struct
+import threading
+import time
+import typing as t
+from collections import deque
+from pathlib import Path
+
+from . import clock, cpu
+from .multipart import FilePart, MultipartBody, read_file_slice
+
+# every record in a segment file starts with this header, followed by a JSON metadata blob of
+# `meta_len` bytes and then `data_len` bytes of concatenated file data
+RECORD_MAGIC = b"PMSR"
+_RECORD_HEADER = struct.Struct("<4sII")
+
+# a file part may be provided as a single bytes-like object or as a sequence of them (e.g. the
+# data of each frame in a FrameBuffer), which saves us from joining them together in memory
+FileData = t.Union[bytes, memoryview, t.Iterable[t.Union[bytes, memoryview]]]
+
+
+class SpoolRecord:
+    """Describes where a single spooled upload lives on disk and what it should be sent as."""
+
+    def __init__(
+        self, record_id: int, segment: Path, offset: int, meta: dict, meta_len: int, size: int
+    ):
+        self.record_id = record_id
+        self.segment = segment
+        self.offset = offset
+        self.meta = meta
+        self.meta_len = meta_len
+        self.size = size
+
+    @property
+    def endpoint(self) -> str:
+        return self.meta["endpoint"]
+
+    @property
+    def data_offset(self) -> int:
+        """Return the file offset of the first byte of file data belonging to this record."""
+        return self.offset + _RECORD_HEADER.size + self.meta_len
+
+    def __lt__(self, other: SpoolRecord) -> bool:
+        return self.record_id < other.record_id
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+        return (
+            f"<{class_name}("
+            f"record_id={self.record_id}, "
+            f"endpoint={self.endpoint!r}, "
+            f"segment={self.segment.name!r}, "
+            f"size={self.size}"
+            f")>"
+        )
+
+
+class _Segment:
+    """An append-only file containing one or more spooled records."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.record_ids: t.List[int] = []
+        self.acked: t.Set[int] = set()
+        self.size = 0
+
+    @property
+    def drained(self) -> bool:
+        return self.acked.issuperset(self.record_ids)
+
+
+class _UploadThread(threading.Thread):
+    def __init__(self, spool: UploadSpool, index: int):
+        super().__init__(daemon=True, name=f"SpoolUploadThread-{index}")
+        self.spool = spool
+        self.start()
+
+    @cpu.tracked()
+    def run(self) -> None:
+        while True:
+            record = self.spool._next_record()
+            if record is None:
+                # the spool has been closed
+                break
+            self.spool._upload(record)
+
+
+class UploadSpool:
+    """A bounded, on-disk queue of HTTP uploads destined for the server.
+
+    Payloads are appended to segment files on disk before any attempt is made to send them, so
+    that a network outage (or a restart of the camera) doesn't lose them. A small number of
+    upload threads then drain the spool, oldest record first, backing off exponentially whilst
+    the server is unreachable.
+
+    A record is only removed from the spool once the server has acknowledged it. Acknowledged
+    record ids are kept in a small JSON index next to the segment files, and a segment file is
+    deleted as soon as every record within it has been acknowledged.
+
+    If the total size of the spool exceeds `max_bytes`, the oldest segments are discarded to
+    make room for newer records.
+    """
+
+    INDEX_FILENAME = "index.json"
+    SEGMENT_SUFFIX = ".spool"
+
+    def __init__(
+        self,
+        directory: Path,
+        base_url: t.Callable[[], t.Optional[str]],
+        max_bytes: int = 256 * 1024 * 1024,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_concurrency: int = 2,
+        timeout: float = 30,
+        min_backoff: float = 1,
+        max_backoff: float = 60,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # a callable is used, rather than a fixed url, because the server address can change
+        # whilst the camera is running (e.g. if it is re-registered)
+        self.base_url = base_url
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Condition()
+        self._closed = False
+        self._segments: t.Dict[str, _Segment] = {}
+        self._active: t.Optional[_Segment] = None
+        self._pending: t.List[SpoolRecord] = []
+        self._in_flight: t.Dict[int, SpoolRecord] = {}
+        self._next_id = 0
+        self._next_segment = 0
+
+        # backoff state, shared by all upload threads as a failure for one is almost certainly a
+        # failure for all
+        self._retry_at = 0.0
+        self._consecutive_failures = 0
+
+        # metrics
+        self._uploaded = 0
+        self._uploaded_bytes = 0
+        self._failed_attempts = 0
+        self._dropped = 0
+        self._recent_uploads: t.Deque[t.Tuple[float, int]] = deque()
+        # (bytes sent, total bytes) of each upload which is currently in progress
+        self._progress: t.Dict[int, t.Tuple[int, int]] = {}
+
+        self._recover()
+
+        self._threads = [_UploadThread(self, i) for i in range(max_concurrency)]
+
+    def _recover(self) -> None:
+        """Rebuild the queue of pending records from any segment files left on disk."""
+        index_path = self.directory / self.INDEX_FILENAME
+        acked: t.Dict[str, t.List[int]] = {}
+        if index_path.exists():
+            try:
+                acked = json.loads(index_path.read_text())["acked"]
+            except (ValueError, KeyError):
+                logging.warning("Spool index at %r is corrupt - resending all records", index_path)
+
+        for path in sorted(self.directory.glob(f"*{self.SEGMENT_SUFFIX}")):
+            segment = _Segment(path)
+            segment.acked = set(acked.get(path.name, []))
+            for record in self._scan_segment(path):
+                segment.record_ids.append(record.record_id)
+                segment.size += record.size
+                self._next_id = max(self._next_id, record.record_id + 1)
+                if record.record_id not in segment.acked:
+                    heapq.heappush(self._pending, record)
+            self._segments[path.name] = segment
+            self._next_segment = max(self._next_segment, int(path.stem) + 1)
+
+            if segment.drained:
+                self._remove_segment(segment)
+
+        if self._pending:
+            logging.info("Recovered %d unsent record(s) from the spool", len(self._pending))
+        self._save_index()
+
+    def _scan_segment(self, path: Path) -> t.Iterator[SpoolRecord]:
+        """Yield every complete record in a segment file.
+
+        A partially written record at the end of the file (e.g. due to a power cut) is ignored.
+        """
+        file_size = path.stat().st_size
+        with open(path, "rb") as fh:
+            offset = 0
+            while offset + _RECORD_HEADER.size <= file_size:
+                magic, meta_len, data_len = _RECORD_HEADER.unpack(fh.read(_RECORD_HEADER.size))
+                size = _RECORD_HEADER.size + meta_len + data_len
+                if magic != RECORD_MAGIC or offset + size > file_size:
+                    logging.warning("Truncated record found in spool segment %r", path.name)
+                    break
+                meta = json.loads(fh.read(meta_len))
+                yield SpoolRecord(meta["id"], path, offset, meta, meta_len, size)
+                fh.seek(data_len, os.SEEK_CUR)
+                offset += size
+
+    def put(
+        self,
+        endpoint: str,
+        fields: t.Optional[t.Dict[str, str]] = None,
+        files: t.Optional[t.Dict[str, t.Tuple[str, str, FileData]]] = None,
+    ) -> int:
+        """Durably add a new upload to the spool and return its record id.
+
+        `fields` are sent as regular form fields. `files` maps a form field name to a tuple of
+        (filename, content type, data).
+        """
+        files = files or {}
+        parts: t.Dict[str, t.List[t.Union[bytes, memoryview]]] = {}
+        for name, (_filename, _content_type, data) in files.items():
+            parts[name] = [data] if isinstance(data, (bytes, bytearray, memoryview)) else list(data)
+
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+            meta = {
+                "id": record_id,
+                "endpoint": endpoint,
+                "created": clock.now(),
+                "fields": fields or {},
+                "files": [
+                    {
+                        "name": name,
+                        "filename": filename,
+                        "content_type": content_type,
+                        "length": sum(len(memoryview(chunk)) for chunk in parts[name]),
+                    }
+                    for name, (filename, content_type, _data) in files.items()
+                ],
+            }
+            encoded_meta = json.dumps(meta).encode()
+            data_len = sum(f["length"] for f in meta["files"])
+
+            segment = self._active_segment()
+            offset = segment.size
+            with open(segment.path, "ab") as fh:
+                fh.write(_RECORD_HEADER.pack(RECORD_MAGIC, len(encoded_meta), data_len))
+                fh.write(encoded_meta)
+                for chunks in parts.values():
+                    for chunk in chunks:
+                        fh.write(chunk)
+                fh.flush()
+                os.fsync(fh.fileno())
+
+            size = _RECORD_HEADER.size + len(encoded_meta) + data_len
+            record = SpoolRecord(record_id, segment.path, offset, meta, len(encoded_meta), size)
+            segment.record_ids.append(record_id)
+            segment.size += record.size
+            heapq.heappush(self._pending, record)
+
+            self._enforce_size_limit()
+            self._lock.notify()
+
+        logging.info("Spooled record %d for %s (%d bytes)", record_id, endpoint, record.size)
+        return record_id
+
+    def _active_segment(self) -> _Segment:
+        """Return the segment which new records should be appended to, rotating if necessary."""
+        if self._active is None or self._active.size >= self.segment_bytes:
+            previous = self._active
+            path = self.directory / f"{self._next_segment:08d}{self.SEGMENT_SUFFIX}"
+            self._next_segment += 1
+            self._active = _Segment(path)
+            self._segments[path.name] = self._active
+            # the previous segment couldn't be deleted whilst it was still being written to
+            if previous is not None and previous.drained:
+                self._remove_segment(previous)
+        return self._active
+
+    def _enforce_size_limit(self) -> None:
+        """Discard the oldest segments until the spool fits within `max_bytes`."""
+        while self.depth_bytes > self.max_bytes and len(self._segments) > 1:
+            oldest = self._segments[min(self._segments)]
+            dropped = [r for r in self._pending if r.segment == oldest.path]
+            self._pending = [r for r in self._pending if r.segment != oldest.path]
+            heapq.heapify(self._pending)
+            self._dropped += len(dropped)
+            logging.warning(
+                "Spool exceeded %d bytes - discarded %d unsent record(s) from segment %r",
+                self.max_bytes,
+                len(dropped),
+                oldest.path.name,
+            )
+            if oldest is self._active:
+                self._active = None
+            self._remove_segment(oldest)
+            self._save_index()
+
+    def _remove_segment(self, segment: _Segment) -> None:
+        self._segments.pop(segment.path.name, None)
+        try:
+            segment.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save_index(self) -> None:
+        """Atomically persist the ids of acknowledged records in each live segment."""
+        index = {
+            "acked": {name: sorted(seg.acked) for name, seg in self._segments.items() if seg.acked}
+        }
+        index_path = self.directory / self.INDEX_FILENAME
+        tmp_path = index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(index))
+        os.replace(tmp_path, index_path)
+
+    def _next_record(self) -> t.Optional[SpoolRecord]:
+        """Block until there is a record to upload and the server is reachable.
+
+        Returns None once the spool has been closed. This method is called by the upload threads.
+        """
+        with self._lock:
+            while not self._closed:
+                delay = self._retry_at - time.monotonic()
+                if self._pending and delay <= 0 and self.base_url() is not None:
+                    record = heapq.heappop(self._pending)
+                    self._in_flight[record.record_id] = record
+                    return record
+                # wake up periodically in case the server address has been set
+                self._lock.wait(timeout=min(max(delay, 0.05), 1) if self._pending else 1)
+            return None
+
+    def _body(self, record: SpoolRecord) -> MultipartBody:
+        """Return a body which streams the record's files directly from its segment file."""
+        files = {}
+        offset = record.data_offset
+        for f in record.meta["files"]:
+            data = read_file_slice(record.segment, offset, f["length"])
+            files[f["name"]] = FilePart(f["filename"], f["content_type"], data, f["length"])
+            offset += f["length"]
+
+        def progress(sent: int, total: int) -> None:
+            self._progress[record.record_id] = (sent, total)
+
+        return MultipartBody(fields=record.meta["fields"], files=files, progress=progress)
+
+    def _upload(self, record: SpoolRecord) -> None:
+        """Attempt to send a single record to the server, acknowledging it on success."""
+        # imported here, as it is slow to import and nothing may ever need uploading
+        import requests
+
+        base_url = self.base_url()
+        body = self._body(record)
+        try:
+            # the body is streamed, so even a long motion video is never held in memory
+            response = requests.post(
+                f"{base_url}{record.endpoint}",
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=self.timeout,
+            )
+        except (requests.RequestException, OSError) as e:
+            self._fail(record, str(e))
+            return
+        finally:
+            self._progress.pop(record.record_id, None)
+
+        if response.ok:
+            self._ack(record)
+        elif 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            # the server has understood, and rejected, the upload. There is no point in retrying
+            logging.error(
+                "Server rejected record %d with status %d - discarding it",
+                record.record_id,
+                response.status_code,
+            )
+            with self._lock:
+                self._dropped += 1
+            self._ack(record, uploaded=False)
+        else:
+            self._fail(record, f"HTTP {response.status_code}")
+
+    def _ack(self, record: SpoolRecord, uploaded: bool = True) -> None:
+        with self._lock:
+            self._in_flight.pop(record.record_id, None)
+            self._consecutive_failures = 0
+            self._retry_at = 0.0
+            if uploaded:
+                self._uploaded += 1
+                self._uploaded_bytes += record.size
+                self._recent_uploads.append((time.monotonic(), record.size))
+
+            segment = self._segments.get(record.segment.name)
+            if segment is not None:
+                segment.acked.add(record.record_id)
+                if segment.drained:
+                    if segment is self._active:
+                        # start a fresh segment for the next record, rather than appending to
+                        # a file which we are about to delete
+                        self._active = None
+                    self._remove_segment(segment)
+            self._save_index()
+            self._lock.notify_all()
+
+    def _fail(self, record: SpoolRecord, reason: str) -> None:
+        with self._lock:
+            self._in_flight.pop(record.record_id, None)
+            self._failed_attempts += 1
+            self._consecutive_failures += 1
+            # don't resurrect a record which was dropped to make space whilst it was in flight
+            if record.segment.name in self._segments:
+                heapq.heappush(self._pending, record)
+            backoff = min(
+                self.max_backoff, self.min_backoff * 2 ** (self._consecutive_failures - 1)
+            )
+            # add a little jitter so that multiple cameras don't all retry in lockstep
+            backoff *= random.uniform(0.8, 1.2)
+            self._retry_at = max(self._retry_at, time.monotonic() + backoff)
+            self._lock.notify_all()
+        logging.warning(
+            "Failed to upload record %d (%s) - retrying in %.1fs", record.record_id, reason, backoff
+        )
+
+    @property
+    def depth(self) -> int:
+        """Return the number of records which have not yet been acknowledged by the server."""
+        return len(self._pending) + len(self._in_flight)
+
+    @property
+    def depth_bytes(self) -> int:
+        """Return the total size of all segment files in the spool."""
+        return sum(segment.size for segment in self._segments.values())
+
+    def drain_rate(self, window: float = 60) -> t.Tuple[float, float]:
+        """Return the number of records and bytes successfully uploaded per second.
+
+        The rates are averaged over the most recent `window` seconds.
+        """
+        with self._lock:
+            cutoff = time.monotonic() - window
+            while self._recent_uploads and self._recent_uploads[0][0] < cutoff:
+                self._recent_uploads.popleft()
+            num_bytes = sum(size for _, size in self._recent_uploads)
+            return len(self._recent_uploads) / window, num_bytes / window
+
+    def metrics(self) -> dict:
+        """Return a snapshot of the state of the spool."""
+        records_per_sec, bytes_per_sec = self.drain_rate()
+        # the progress of each upload is updated without holding the lock, so take a copy
+        progress = list(self._progress.items())
+        with self._lock:
+            return {
+                "depth": self.depth,
+                "depth_bytes": self.depth_bytes,
+                "in_flight": len(self._in_flight),
+                "in_flight_progress": {
+                    record_id: sent / total for record_id, (sent, total) in progress
+                },
+                "segments": len(self._segments),
+                "uploaded": self._uploaded,
+                "uploaded_bytes": self._uploaded_bytes,
+                "failed_attempts": self._failed_attempts,
+                "dropped": self._dropped,
+                "drain_rate_records": records_per_sec,
+                "drain_rate_bytes": bytes_per_sec,
+                "backing_off": self._retry_at > time.monotonic(),
+            }
+
+    def close(self) -> None:
+        """Stop the upload threads. Any unsent records remain on disk until the next startup."""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,65 @@
+"""Timings of the camera service's startup, measured from when the process was started.
+
+On slower Pis, most of a cold start is spent importing modules and opening the camera, before
+the network stream carries a single frame. Each stage is recorded the first time it is reached,
+and exported as the picamera_startup_seconds gauge:
+
+- "imported": the web app has been imported, and will shortly start answering requests
+- "serving": the web server has started, and is answering requests
+- "camera_constructed": the camera has been opened and its configuration loaded
+- "first_frame": the camera has published its first frame
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import typing as t
+
+from . import metrics
+
+STARTUP_SECONDS = metrics.Gauge(
+    "picamera_startup_seconds",
+    "Seconds from the process starting until each stage of startup was reached",
+    ["stage"],
+)
+
+
+def _process_start_time() -> float:
+    """Return the wall-clock time at which this process was started."""
+    try:
+        with open("/proc/self/stat") as f:
+            stat = f.read()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return time.time()
+    # the process's name is in brackets, and may itself contain spaces. starttime, in clock
+    # ticks since the system booted, is the 22nd field
+    ticks = int(stat[stat.rindex(")") + 2 :].split()[19])
+    return time.time() - (uptime - ticks / os.sysconf("SC_CLK_TCK"))
+
+
+PROCESS_START = _process_start_time()
+
+_stages: t.Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def reached(stage: str, at: t.Optional[float] = None) -> None:
+    """Record that startup reached `stage` at the time `at` (now, if not given), unless it has
+    been reached before.
+    """
+    seconds = (at if at is not None else time.time()) - PROCESS_START
+    with _lock:
+        if stage in _stages:
+            return
+        _stages[stage] = seconds
+    STARTUP_SECONDS.labels(stage).set(seconds)
+
+
+def stages() -> t.Dict[str, float]:
+    """Return the number of seconds after the process started at which each stage was reached."""
+    with _lock:
+        return dict(_stages)
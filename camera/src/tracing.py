@@ -0,0 +1,161 @@
+"""Optional tracing of each frame through the pipeline, exportable as Chrome trace-event JSON.
+
+When frames are dropped, the spans recorded here show which stage was slow: the encoder's
+callback, publishing the frame, the handler thread waking up, the output processing it, or the
+socket sending it. Stages are timed on the thread which runs them, like so:
+
+    start = tracing.start()
+    ...
+    tracing.end("process_frame", start, frame.frame_num)
+
+Whilst tracing is disabled, `start` returns 0 and `end` does nothing, so tracing costs little
+more than the two calls. Whilst enabled, each thread records its spans into its own ring of
+preallocated slots, which is created the first time it records a span and overwritten
+oldest-first once full, so recording never takes a lock.
+
+`export` renders the spans of the last N seconds for the trace viewer in Chrome
+(chrome://tracing) or Perfetto (ui.perfetto.dev). The frame number of each span is included,
+so that a single frame can be followed from thread to thread.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import typing as t
+
+
+class _Ring:
+    """The most recent spans recorded by a single thread."""
+
+    __slots__ = ("tid", "thread", "mask", "spans", "pos")
+
+    def __init__(self, thread: threading.Thread, capacity: int):
+        self.tid = threading.get_ident()
+        self.thread = thread
+        # the capacity is a power of two, so that wrapping around is a mask rather than a modulo
+        self.mask = capacity - 1
+        # each slot holds a (name, start, end, frame number) tuple. Storing a single tuple is
+        # about twice as fast as storing each field into its own preallocated array
+        self.spans: t.List[t.Optional[t.Tuple[str, int, int, int]]] = [None] * capacity
+        # the number of spans ever recorded
+        self.pos = 0
+
+    def record(self, name: str, start: int, end: int, frame_num: int) -> None:
+        self.spans[self.pos & self.mask] = (name, start, end, frame_num)
+        self.pos += 1
+
+    def read(self, since: int) -> t.Iterator[t.Tuple[str, int, int, int]]:
+        """Yield the spans which ended at, or after, `since`, oldest first.
+
+        This may be called from another thread whilst spans are still being recorded, in which
+        case the oldest few may have been overwritten by the time they are read.
+        """
+        pos = self.pos
+        for i in range(max(pos - self.mask - 1, 0), pos):
+            span = self.spans[i & self.mask]
+            if span is not None and since <= span[2]:
+                yield span
+
+
+class Tracer:
+    # the rings of threads which have since exited are kept, so that their spans can still be
+    # exported, until there are more than this many
+    MAX_RINGS = 64
+
+    def __init__(self, capacity: int = 4096):
+        self.enabled = False
+        self.capacity = capacity
+        self._local = threading.local()
+        self._rings: t.List[_Ring] = []
+        self._lock = threading.Lock()
+
+    def enable(self, capacity: t.Optional[int] = None) -> None:
+        """Start recording spans, keeping up to `capacity` (rounded up to a power of two) per
+        thread. Changing the capacity discards every span recorded so far.
+        """
+        if capacity is not None:
+            capacity = 1 << max(capacity - 1, 1).bit_length()
+            if capacity != self.capacity:
+                with self._lock:
+                    self.capacity = capacity
+                    self._rings = []
+                    self._local = threading.local()
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording spans. Those already recorded can still be exported."""
+        self.enabled = False
+
+    def _ring(self) -> _Ring:
+        try:
+            return self._local.ring
+        except AttributeError:
+            pass
+        ring = self._local.ring = _Ring(threading.current_thread(), self.capacity)
+        with self._lock:
+            if len(self._rings) >= self.MAX_RINGS:
+                self._rings = [other for other in self._rings if other.thread.is_alive()]
+            self._rings.append(ring)
+        return ring
+
+    def add(self, name: str, start: int, end: int, frame_num: int = -1) -> None:
+        """Record a span on the calling thread, given its start and end in `time.monotonic_ns`."""
+        self._ring().record(name, start, end, frame_num)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rings = list(self._rings)
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "threads": len(rings),
+            "spans": sum(ring.pos for ring in rings),
+        }
+
+    def export(self, seconds: float) -> dict:
+        """Return the spans which ended in the last `seconds`, as Chrome trace-event JSON."""
+        since = time.monotonic_ns() - int(seconds * 1e9)
+        pid = os.getpid()
+        with self._lock:
+            rings = list(self._rings)
+        events: t.List[dict] = []
+        for ring in rings:
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": ring.tid,
+                    "args": {"name": ring.thread.name},
+                }
+            )
+            for name, start, end, frame_num in ring.read(since):
+                event = {
+                    "name": name,
+                    "ph": "X",
+                    # in microseconds
+                    "ts": start / 1_000,
+                    "dur": (end - start) / 1_000,
+                    "pid": pid,
+                    "tid": ring.tid,
+                }
+                if frame_num >= 0:
+                    event["args"] = {"frame": frame_num}
+                events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+TRACER = Tracer()
+
+
+def start() -> int:
+    """Return the start time of a span, or 0 if tracing is disabled."""
+    return time.monotonic_ns() if TRACER.enabled else 0
+
+
+def end(name: str, start: int, frame_num: int = -1) -> None:
+    """Record a span from `start` until now, unless tracing was disabled when it started."""
+    if start:
+        TRACER.add(name, start, time.monotonic_ns(), frame_num)
@@ -5,7 +5,31 @@ from dataclasses import dataclass
 from typing import List, Tuple
 
 import numpy as np
-import picamerax
+
+
+class VideoFrameType:
+    """The types of buffer produced by the video encoder, as in `picamerax.PiVideoFrameType`.
+
+    picamerax can only be imported on a Pi, as it needs the Pi's own libraries, so frames are
+    handled, and faked, using these instead.
+    """
+
+    frame = 0
+    key_frame = 1
+    sps_header = 2
+    motion_data = 3
+
+
+# the motion data of each macroblock, as in `picamerax.array.motion_dtype`
+motion_dtype = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "u2")])
+
+
+def motion_shape(width: int, height: int) -> Tuple[int, int]:
+    """Return the (rows, cols) of the motion data of frames of the given resolution.
+
+    There is a block for every 16x16 pixels, plus an extra column, as in `PiMotionAnalysis`.
+    """
+    return (height + 15) // 16, ((width + 15) // 16) + 1
 
 
 class Boxes:
@@ -100,6 +124,7 @@ class VideoFrame:
         timestamp: the number of seconds since the epoch that this frame was produced
         frame_type: the type of frame produced viz. P-frame, I-frame or SPS header
         sps_header: a short hand for finding out whether this is a header frame
+        key_frame: a short hand for finding out whether this is an I-frame
     """
 
     def __init__(
@@ -107,7 +132,7 @@ class VideoFrame:
         data: bytes,
         frame_num: int,
         timestamp: float,
-        frame_type: picamerax.PiVideoFrameType,
+        frame_type: int,
     ):
         self.data = data
         self.frame_num = frame_num
@@ -116,7 +141,11 @@ class VideoFrame:
 
     @property
     def sps_header(self) -> bool:
-        return self.frame_type == picamerax.PiVideoFrameType.sps_header
+        return self.frame_type == VideoFrameType.sps_header
+
+    @property
+    def key_frame(self) -> bool:
+        return self.frame_type == VideoFrameType.key_frame
 
     def _parse_frame_type(self):
         frame_types = {
@@ -155,9 +184,34 @@ class FrameBuffer:
     def concatenate(self, other: FrameBuffer) -> FrameBuffer:
         """Return a new buffer containing the concatenating frames of self and other."""
         new_buffer = FrameBuffer(maxlen=self.maxlen + other.maxlen)
-        new_buffer._data.extend(self._data.copy() + other._data.copy())
+        # extend twice, rather than adding the two deques together, because the sum of two deques
+        # inherits the maxlen of the first, which would silently drop frames from the second
+        new_buffer._data.extend(self._data)
+        new_buffer._data.extend(other._data)
         return new_buffer
 
+    def split(self, index: int) -> Tuple[FrameBuffer, FrameBuffer]:
+        """Split the buffer in two, such that the second buffer begins with an SPS header.
+
+        The split is made at the first SPS header at, or after, `index`, meaning that the second
+        buffer can be decoded independently of the first. If there is no such header, the second
+        buffer is empty.
+
+        The underlying buffer is left unchanged by the end of this method.
+        """
+        frames = list(self._data)
+        split_index = len(frames)
+        for i in range(index, len(frames)):
+            if frames[i].sps_header:
+                split_index = i
+                break
+
+        first = FrameBuffer(maxlen=self.maxlen)
+        first._data.extend(frames[:split_index])
+        second = FrameBuffer(maxlen=self.maxlen)
+        second._data.extend(frames[split_index:])
+        return first, second
+
     def final_group(self) -> FrameBuffer:
         """Return the last, i.e. most recent, group of pictures in the buffer.
 
@@ -205,6 +259,16 @@ class FrameBuffer:
         """Return all the video data in the buffer as bytes."""
         return b"".join(frame.data for frame in self)
 
+    def buffers(self) -> List[memoryview]:
+        """Return a view of the data of each frame in the buffer, without copying any of it."""
+        return [memoryview(frame.data) for frame in self]
+
+    @property
+    def nbytes(self) -> int:
+        """Return the total size, in bytes, of the video data in the buffer."""
+        # take a copy first, as the buffer may be appended to by another thread meanwhile
+        return sum(len(frame.data) for frame in list(self._data))
+
     @property
     def full(self) -> bool:
         """Return whether the buffer is full or not."""
@@ -1,4 +1,8 @@
 import os
+import typing as t
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
 from pathlib import Path
 
 import pytest
@@ -7,6 +11,21 @@ import toml
 from src.camera import Camera
 from src.config import Config
 from src.enums import CameraRevision
+from src.fake_camera import FakePiCamera
+
+
+def parse_multipart(body: bytes, content_type: str) -> t.Dict[str, EmailMessage]:
+    """Parse a multipart/form-data body into its parts, by the name of each field.
+
+    The value of a part is given by `part.get_payload(decode=True)`, and the name of an uploaded
+    file by `part.get_filename()`.
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part for part in message.iter_parts()
+    }
 
 
 @pytest.fixture()
@@ -35,6 +54,16 @@ def default_camera(config_path, _fresh_config):
     camera.close()
 
 
+@pytest.fixture()
+def fake_camera(config_path, _fresh_config):
+    """A camera which produces synthetic frames, without any camera hardware."""
+    camera = Camera(config_path, backend=FakePiCamera)
+    yield camera
+    if camera.running:
+        camera.stop()
+    camera.close()
+
+
 @pytest.fixture()
 def config_model(config_path, _fresh_config):
     class MockCamera:
@@ -46,6 +75,9 @@ def config_model(config_path, _fresh_config):
         awb_mode = None
         vflip = None
         hflip = None
+        secondary_resolution = None
+        secondary_bitrate = None
+        annotate_fields = None
         server_address = None
         running = None
 
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+from src.actor import CameraActor, merge_config
+
+
+class StubCamera:
+    def __init__(self):
+        self.applied = []
+        # held to simulate a slow restart
+        self.busy = threading.Lock()
+
+    def configure(self, config):
+        with self.busy:
+            if config.get("camera", {}).get("framerate") == "bad":
+                raise ValueError("bad framerate")
+            self.applied.append(config)
+
+
+@pytest.fixture
+def camera():
+    return StubCamera()
+
+
+@pytest.fixture
+def actor(camera):
+    actor = CameraActor(camera)
+    yield actor
+    actor.close()
+
+
+def test_merge_config():
+    base = {"camera": {"vflip": True, "hflip": False}, "outputs": {"network": {"enabled": True}}}
+    update = {"camera": {"vflip": False}, "outputs": {"motion": {"enabled": True}}}
+    assert merge_config(base, update) == {
+        "camera": {"vflip": False, "hflip": False},
+        "outputs": {"network": {"enabled": True}, "motion": {"enabled": True}},
+    }
+
+
+def test_burst_is_coalesced_into_one_apply(actor, camera):
+    with camera.busy:
+        first = actor.configure({"camera": {"vflip": True}})
+        # whilst the first change is being applied, a burst of others queue up
+        time.sleep(0.1)
+        rest = [actor.configure({"camera": {"framerate": framerate}}) for framerate in (10, 20)]
+        rest.append(actor.configure({"camera": {"hflip": True}}))
+    for future in [first, *rest]:
+        future.result(timeout=2)
+
+    assert camera.applied == [
+        {"camera": {"vflip": True}},
+        {"camera": {"framerate": 20, "hflip": True}},
+    ]
+    assert actor.stats()["applies"] == 2
+
+
+def test_bad_change_fails_alone(actor, camera):
+    with camera.busy:
+        good = actor.configure({"camera": {"vflip": True}})
+        bad = actor.configure({"camera": {"framerate": "bad"}})
+    good.result(timeout=2)
+    with pytest.raises(ValueError):
+        bad.result(timeout=2)
+    assert camera.applied == [{"camera": {"vflip": True}}]
+
+
+def test_cancelled_change_is_dropped(actor, camera):
+    with camera.busy:
+        first = actor.configure({"camera": {"vflip": True}})
+        time.sleep(0.1)
+        # e.g. the client disconnected, cancelling the handler awaiting the change
+        cancelled = actor.configure({"camera": {"hflip": True}})
+        assert cancelled.cancel()
+        following = actor.configure({"camera": {"framerate": 20}})
+    first.result(timeout=2)
+    following.result(timeout=2)
+    assert camera.applied == [{"camera": {"vflip": True}}, {"camera": {"framerate": 20}}]
+    # the actor is still running commands
+    assert actor.submit(lambda: "still running").result(timeout=2) == "still running"
+
+
+def test_commands_run_in_order(actor, camera):
+    calls = []
+    with camera.busy:
+        actor.configure({"camera": {"vflip": True}})
+        # not coalesced across other commands, which must see the change applied
+        actor.submit(lambda: calls.append(len(camera.applied)))
+        last = actor.configure({"camera": {"vflip": False}})
+    last.result(timeout=2)
+    assert calls == [1]
+    assert len(camera.applied) == 2
+
+
+def test_stats_show_running_command(actor, camera):
+    with camera.busy:
+        actor.configure({"camera": {"vflip": True}})
+        time.sleep(0.1)
+        stats = actor.stats()
+        assert stats["running"].startswith("configure")
+        assert stats["running_for"] > 0
+
+
+def test_camera_is_constructed_on_the_actor_thread():
+    opening = threading.Event()
+    threads = []
+
+    def construct():
+        opening.wait(timeout=2)
+        threads.append(threading.current_thread().name)
+        return StubCamera()
+
+    actor = CameraActor(construct)
+    try:
+        # changes made whilst the camera is opening wait for it
+        future = actor.configure({"camera": {"vflip": True}})
+        assert not actor.ready.is_set()
+        opening.set()
+        future.result(timeout=2)
+    finally:
+        actor.close()
+    assert threads == ["CameraActorThread"]
+    assert actor.camera.applied == [{"camera": {"vflip": True}}]
+
+
+def test_commands_fail_if_the_camera_cant_be_constructed():
+    def construct():
+        raise RuntimeError("camera in use")
+
+    actor = CameraActor(construct)
+    try:
+        future = actor.configure({"camera": {"vflip": True}})
+        with pytest.raises(RuntimeError, match="camera in use"):
+            future.result(timeout=2)
+    finally:
+        actor.close()
+    assert actor.ready.is_set()
+    assert actor.camera is None
@@ -0,0 +1,65 @@
+import time
+
+from src.annotate import Annotator
+from src.enums import AnnotateField
+
+
+def _annotator(**kwargs):
+    pushed = []
+    return Annotator(pushed.append, **kwargs), pushed
+
+
+def test_pushes_only_when_text_changes():
+    annotator, pushed = _annotator(camera_name="cam")
+    start = 1_600_000_000.0
+    for i in range(75):
+        annotator.frame_end(start + i / 25)
+
+    # three seconds of frames, so the time only changed three times
+    assert len(pushed) == 3
+    assert pushed[0] == f"cam - {time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(start))}"
+    stats = annotator.stats()
+    assert stats["updates"] == 75
+    assert stats["pushes"] == 3
+    assert stats["mean_update_us"] > 0
+
+
+def test_fps_and_motion_fields():
+    annotator, pushed = _annotator(
+        camera_name="cam",
+        fields=[AnnotateField.NAME, AnnotateField.FPS, AnnotateField.MOTION],
+    )
+    start = 1_600_000_000.0
+    for i in range(50):
+        annotator.frame_end(start + i / 25)
+    assert pushed[-1] == "cam - 25fps"
+
+    annotator.motion = True
+    annotator.frame_end(start + 2.1)
+    assert pushed[-1] == "cam - 25fps - MOTION"
+    # nothing has changed, so nothing more is pushed
+    annotator.frame_end(start + 2.2)
+    assert len(pushed) == 3
+
+
+def test_changing_fields_or_name_pushes_new_text():
+    annotator, pushed = _annotator(camera_name="cam", fields=[AnnotateField.NAME])
+    annotator.frame_end(1_600_000_000.0)
+    annotator.camera_name = "renamed"
+    annotator.frame_end(1_600_000_000.1)
+    assert pushed == ["cam", "renamed"]
+
+    annotator.refresh()
+    assert pushed == ["cam", "renamed", "renamed"]
+
+
+def test_camera_annotates_frames(fake_camera):
+    fake_camera.start()
+    time.sleep(0.3)
+    assert fake_camera._camera.annotate_text.startswith("test_cam1 - ")
+
+    # annotation fields are changed without restarting the camera
+    fake_camera.configure({"camera": {"annotate_fields": ["fps", "name"]}})
+    time.sleep(1.5)
+    assert fake_camera._camera.annotate_text.endswith("fps - test_cam1")
+    assert fake_camera.annotator.stats()["pushes"] < fake_camera.annotator.stats()["updates"]
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from src.bitrate import BitrateController, SendStats, SendWindow
+
+
+def _window(frames=50, send_time=0.2, skipped=0, queued_start=0, queued_end=0):
+    return SendWindow(2, frames, send_time, skipped, queued_start, queued_end)
+
+
+@pytest.fixture()
+def controller():
+    controller = BitrateController(
+        SendStats(),
+        get_bitrate=lambda: 3_000_000,
+        set_bitrate=lambda bitrate: "test",
+        min_bitrate=1_000_000,
+        max_bitrate=5_000_000,
+        # evaluate() is driven directly by the tests
+        window=3600,
+        up_after=3,
+    )
+    yield controller
+    controller.close()
+
+
+def test_steps_down_when_congested(controller):
+    decision = controller.evaluate(_window(skipped=10), 3_000_000)
+    assert decision.action == "down"
+    assert decision.new_bitrate == 2_100_000
+
+    decision = controller.evaluate(_window(send_time=1.9), 2_100_000)
+    assert decision.action == "down"
+
+    decision = controller.evaluate(_window(queued_start=1_000, queued_end=500_000), 1_470_000)
+    assert decision.action == "down"
+    assert decision.new_bitrate == 1_030_000
+
+    # never below the minimum
+    decision = controller.evaluate(_window(skipped=10), 1_030_000)
+    assert decision.new_bitrate == 1_000_000
+    decision = controller.evaluate(_window(skipped=10), 1_000_000)
+    assert decision.action == "hold"
+    assert "minimum" in decision.reason
+
+
+def test_steps_up_only_after_consecutive_healthy_windows(controller):
+    assert controller.evaluate(_window(), 2_000_000).action == "hold"
+    assert controller.evaluate(_window(), 2_000_000).action == "hold"
+    # a window in between healthy and congested resets the count
+    assert controller.evaluate(_window(send_time=1.0), 2_000_000).action == "hold"
+    assert controller.evaluate(_window(), 2_000_000).action == "hold"
+    assert controller.evaluate(_window(), 2_000_000).action == "hold"
+    decision = controller.evaluate(_window(), 2_000_000)
+    assert decision.action == "up"
+    assert decision.new_bitrate == 2_300_000
+
+    # and the count starts afresh after a change
+    assert controller.evaluate(_window(), 2_300_000).action == "hold"
+
+
+def test_never_exceeds_maximum(controller):
+    for _ in range(3):
+        decision = controller.evaluate(_window(), 4_900_000)
+    assert decision.action == "up"
+    assert decision.new_bitrate == 5_000_000
+    for _ in range(3):
+        decision = controller.evaluate(_window(), 5_000_000)
+    assert decision.action == "hold"
+
+
+def test_send_stats_windows():
+    stats = SendStats()
+    stats.record(0.01, 0, 100)
+    stats.record(0.03, 2, 4_000)
+    window = stats.take()
+    assert window.frames == 2
+    assert window.send_time == pytest.approx(0.04)
+    assert window.skipped == 2
+    assert window.skipped_ratio == 0.5
+    assert (window.queued_start, window.queued_end) == (0, 4_000)
+
+    # the next window starts from where the send queue was left
+    window = stats.take()
+    assert window.frames == 0
+    assert window.queue_growth == 0
+    assert window.queued_start == 4_000
+
+
+def test_controller_applies_and_logs_decisions(caplog):
+    stats = SendStats()
+    applied = []
+    bitrate = [3_000_000]
+
+    def set_bitrate(new_bitrate):
+        applied.append(new_bitrate)
+        bitrate[0] = new_bitrate
+        return "test"
+
+    controller = BitrateController(
+        stats, lambda: bitrate[0], set_bitrate, 1_000_000, 3_000_000, window=0.05
+    )
+    with caplog.at_level("INFO"):
+        deadline = time.monotonic() + 5
+        while not applied and time.monotonic() < deadline:
+            stats.record(0.001, 5, 0)
+            time.sleep(0.005)
+    controller.close()
+
+    assert applied[0] == 2_100_000
+    assert any(
+        "Bitrate down 3000000 -> 2100000 (applied by: test)" in r.message for r in caplog.records
+    )
+
+
+def _wait_for_frames(video_output, count):
+    done = threading.Event()
+    start = video_output.frame.frame_num if video_output.frame else 0
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if video_output.frame is not None and video_output.frame.frame_num >= start + count:
+            done.set()
+            break
+        time.sleep(0.01)
+    return done.is_set()
+
+
+def test_change_bitrate_by_splitter_swap(fake_camera):
+    fake_camera.start()
+    assert _wait_for_frames(fake_camera.video_output, 5)
+    frames = []
+    fake_camera.video_output.event.wait(1)
+
+    collector = threading.Thread(
+        target=lambda: [
+            frames.append(fake_camera.video_output.frame)
+            for _ in range(40)
+            if fake_camera.video_output.event.wait(1)
+        ]
+    )
+    collector.start()
+    applied_by = fake_camera.change_bitrate(1_500_000)
+    collector.join()
+
+    assert applied_by == "splitter swap 1->3"
+    assert fake_camera.video_output.splitter_port == 3
+    assert fake_camera.effective_bitrate == 1_500_000
+    # the configured bitrate is left alone
+    assert fake_camera.bitrate == 3_000_000
+    encoders = fake_camera._camera._encoders
+    assert list(encoders) == [3]
+    assert encoders[3].bitrate == 1_500_000
+    # frames carry on being published, and numbered, without interruption
+    assert _wait_for_frames(fake_camera.video_output, 5)
+    frame_nums = [frame.frame_num for frame in frames]
+    assert frame_nums == sorted(frame_nums)
+    assert fake_camera.motion_output.motion_frame is not None
+
+
+def test_change_bitrate_falls_back_to_restart(fake_camera):
+    # with no spare splitter ports, a swap isn't possible
+    fake_camera.SPLITTER_PORTS = (1,)
+    fake_camera.start()
+    assert _wait_for_frames(fake_camera.video_output, 5)
+
+    assert fake_camera.change_bitrate(1_500_000) == "restart on port 1"
+    assert fake_camera._camera._encoders[1].bitrate == 1_500_000
+    assert _wait_for_frames(fake_camera.video_output, 5)
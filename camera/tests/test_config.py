@@ -12,6 +12,9 @@ def test_init_config(config_path, _fresh_config):
         awb_mode = None
         vflip = None
         hflip = None
+        secondary_resolution = None
+        secondary_bitrate = None
+        annotate_fields = None
         server_address = None
         running = None
 
@@ -0,0 +1,106 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src import cpu, metrics
+
+
+@pytest.fixture()
+def accounting():
+    return cpu.CPUAccounting(registry=metrics.Registry())
+
+
+def _spin(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_busy_and_idle_threads_are_told_apart(accounting):
+    stop = threading.Event()
+
+    def busy():
+        with accounting.track("motion"):
+            while not stop.is_set():
+                pass
+
+    def idle():
+        with accounting.track("network"):
+            stop.wait()
+
+    threads = [
+        threading.Thread(target=busy, name="MotionDataThread"),
+        threading.Thread(target=idle, name="NetworkSocketThread"),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        result = accounting.sample(0.5)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    cores = {entry["thread"]: entry["cores"] for entry in result["threads"]}
+    # the busy thread shares the GIL with the test, but should still get most of a core
+    assert cores["MotionDataThread"] > 0.3
+    assert cores["NetworkSocketThread"] < 0.05
+    assert result["outputs"]["motion"] == cores["MotionDataThread"]
+    assert result["process"] >= cores["MotionDataThread"]
+
+
+def test_totals_outlive_threads(accounting):
+    def work():
+        with accounting.track("timelapse"):
+            _spin(0.1)
+
+    for _ in range(2):
+        thread = threading.Thread(target=work, name="TimelapseSenderThread")
+        thread.start()
+        thread.join()
+
+    threads, _ = accounting.seconds()
+    assert threads[("TimelapseSenderThread", "timelapse")] >= 0.15
+    # and are exported as a counter, for Prometheus to take the rate of
+    assert 'picamera_cpu_seconds_total{thread="TimelapseSenderThread",output="timelapse"}' in (
+        "\n".join(accounting._metric.collect())
+    )
+
+
+def test_helper_processes_are_accounted_for(accounting):
+    # spins for a while, then waits for its input to close, like an idle ffmpeg
+    spin = (
+        "import sys, time\n"
+        "end = time.time() + 0.3\n"
+        "while time.time() < end: pass\n"
+        "sys.stdin.read()"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", spin], stdin=subprocess.PIPE)
+    try:
+        accounting.track_process(proc.pid, "ffmpeg", "youtube")
+        time.sleep(0.5)
+        _, processes = accounting.seconds()
+        assert processes[("ffmpeg", "youtube")] > 0.1
+        accounting.untrack_process(proc.pid)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    # the time it used is kept once it has gone
+    _, processes = accounting.seconds()
+    assert processes[("ffmpeg", "youtube")] > 0.1
+
+
+def test_output_threads_are_tracked(fake_camera):
+    camera = fake_camera
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure({"outputs": {"network": {"enabled": True, "socket_port": port}}})
+    camera.start()
+    threads, _ = cpu.ACCOUNTING.seconds()
+    running = {key for key in threads if key[0] in {t.name for t in threading.enumerate()}}
+    assert {("NetworkVideoThread", "network"), ("NetworkSocketThread", "network")} <= running
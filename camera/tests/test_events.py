@@ -0,0 +1,124 @@
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+
+from src import events
+
+
+def _parse(chunk: bytes):
+    parsed = []
+    for message in chunk.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if ":" in line[1:])
+        if "event" in fields:
+            parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+async def _read(stream, count: int):
+    received = []
+    while len(received) < count:
+        received += _parse(await asyncio.wait_for(stream.__anext__(), 2))
+    return received
+
+
+@pytest.fixture()
+def bus():
+    return events.EventBus(capacity=4, interval=0)
+
+
+def test_every_subscriber_receives_events_published_from_other_threads(bus):
+    bus.publish("motion", {"active": False})
+
+    async def main():
+        streams = [bus.stream() for _ in range(3)]
+        # start each stream, so that they subscribe before anything is published
+        reads = [asyncio.ensure_future(_read(stream, 2)) for stream in streams]
+        await asyncio.sleep(0.05)
+        assert bus.subscribers == 3
+
+        def publish():
+            bus.publish("motion", {"active": True, "time": 1})
+            bus.publish("output", {"output": "network", "state": "started", "time": 2})
+
+        threading.Thread(target=publish).start()
+        results = await asyncio.gather(*reads)
+        for stream in streams:
+            await stream.aclose()
+        return results
+
+    results = asyncio.run(main())
+    # events published before subscribing aren't sent
+    expected = [
+        ("motion", {"active": True, "time": 1}),
+        ("output", {"output": "network", "state": "started", "time": 2}),
+    ]
+    assert results == [expected] * 3
+    assert bus.subscribers == 0
+
+
+def test_missed_events_are_replayed_or_overflow(bus):
+    for i in range(3):
+        bus.publish("motion", {"active": bool(i % 2), "time": i})
+
+    async def read_from(last_id, count):
+        stream = bus.stream(last_id)
+        try:
+            return await _read(stream, count)
+        finally:
+            await stream.aclose()
+
+    # reconnecting after the first event
+    replayed = asyncio.run(read_from(1, 2))
+    assert [data["time"] for _, data in replayed] == [1, 2]
+
+    # so far behind that the ring no longer holds what was missed
+    for i in range(3, 10):
+        bus.publish("motion", {"active": bool(i % 2), "time": i})
+    overflowed = asyncio.run(read_from(1, 5))
+    assert overflowed[0] == ("overflow", {"last_id": 10})
+    assert [data["time"] for _, data in overflowed[1:]] == [6, 7, 8, 9]
+
+
+def test_stats_are_published_whilst_subscribed():
+    bus = events.EventBus(interval=0.05)
+
+    async def main():
+        stream = bus.stream()
+        try:
+            return await _read(stream, 1)
+        finally:
+            await stream.aclose()
+
+    [(event, data)] = asyncio.run(main())
+    assert event == "stats"
+    assert {"fps", "dropped", "dropped_total"} <= set(data)
+
+
+def test_camera_publishes_its_changes(fake_camera, monkeypatch):
+    bus = events.EventBus(interval=0)
+    monkeypatch.setattr(events, "EVENTS", bus)
+    camera = fake_camera
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure({"outputs": {"network": {"enabled": True, "socket_port": port}}})
+    camera.start()
+    camera.set_motion_active(True)
+    camera.set_motion_active(True)
+    camera.configure({"outputs": {"network": {"enabled": False}}})
+
+    published = _parse(b"".join(bus._since(0)[0]))
+    assert [event for event, _ in published] == [
+        "config",
+        "output",
+        "camera",
+        "motion",
+        "output",
+        "config",
+    ]
+    assert [data["version"] for event, data in published if event == "config"] == [1, 2]
+    assert published[1][1]["output"] == "network"
+    assert published[4][1]["state"] == "stopped"
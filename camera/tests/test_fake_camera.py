@@ -0,0 +1,106 @@
+import functools
+import time
+
+import numpy as np
+
+from src.camera import Camera
+from src.fake_camera import BUFFER_SIZE, FakePiCamera, Recording, split_h264
+from src.types import VideoFrameType, motion_dtype
+
+SPS = b"\x00\x00\x00\x01\x67\x64\x00\x28"
+PPS = b"\x00\x00\x00\x01\x68\xee\x3c\x80"
+SEI = b"\x00\x00\x01\x06\x05\x10"
+# slices begin with first_mb_in_slice, which is a single 1 bit for the first slice of a picture
+IDR = b"\x00\x00\x00\x01\x65\x88" + bytes(range(1, 200))
+P_FIRST_SLICE = b"\x00\x00\x00\x01\x41\x9a\x01\x02"
+P_SECOND_SLICE = b"\x00\x00\x01\x41\x1a\x03\x04"
+
+
+def test_split_h264_like_mmal():
+    frames = split_h264(SPS + PPS + SEI + IDR + P_FIRST_SLICE + P_SECOND_SLICE + P_FIRST_SLICE)
+    assert frames == [
+        (SPS + PPS, VideoFrameType.sps_header),
+        (SEI + IDR, VideoFrameType.key_frame),
+        (P_FIRST_SLICE + P_SECOND_SLICE, VideoFrameType.frame),
+        (P_FIRST_SLICE, VideoFrameType.frame),
+    ]
+
+
+class _Output:
+    def __init__(self, camera, splitter_port):
+        self.camera = camera
+        self.splitter_port = splitter_port
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append((data, self.camera._encoders[self.splitter_port].frame))
+
+
+def test_large_frames_are_split_across_writes(tmp_path):
+    idr = b"\x00\x00\x00\x01\x65\x88" + bytes(BUFFER_SIZE * 2)
+    video_path = tmp_path / "video.h264"
+    video_path.write_bytes(SPS + PPS + idr + P_FIRST_SLICE)
+    camera = FakePiCamera(Recording(video_path), speed=0)
+    output = _Output(camera, 1)
+    camera.start_recording(output, format="h264")
+    while len(output.writes) < 5:
+        time.sleep(0.01)
+    camera.close()
+
+    header, *key_frame, frame = output.writes[:5]
+    assert header == (SPS + PPS, header[1])
+    assert header[1].frame_type == VideoFrameType.sps_header
+    assert header[1].timestamp is None
+    # the key frame is written in three parts, only the last of which is complete
+    assert b"".join(data for data, _ in key_frame) == idr
+    assert [len(data) for data, _ in key_frame] == [
+        BUFFER_SIZE,
+        BUFFER_SIZE,
+        len(idr) % BUFFER_SIZE,
+    ]
+    assert [pi_frame.complete for _, pi_frame in key_frame] == [False, False, True]
+    assert {pi_frame.index for _, pi_frame in key_frame} == {header[1].index + 1}
+    assert key_frame[-1][1].frame_size == len(idr)
+    assert frame == (P_FIRST_SLICE, frame[1])
+    assert frame[1].index == header[1].index + 2
+
+
+def test_camera_replays_recording(config_path, _fresh_config, tmp_path):
+    video_path = tmp_path / "video.h264"
+    video_path.write_bytes(SEI + P_FIRST_SLICE + SPS + PPS + IDR + P_FIRST_SLICE + P_FIRST_SLICE)
+    # a frame of motion data per video frame, at the camera's resolution of 1640x1232
+    motion = np.zeros((3, 77, 104), dtype=motion_dtype)
+    motion["sad"] = np.arange(3)[:, None, None]
+    motion_path = tmp_path / "motion.vec"
+    motion_path.write_bytes(motion.tobytes())
+
+    recording = Recording(video_path, motion_path)
+    camera = Camera(config_path, backend=functools.partial(FakePiCamera, recording, speed=4))
+    try:
+        camera.start()
+        frames = []
+        while len(frames) < 8:
+            assert camera.video_output.event.wait(1)
+            frames.append(camera.video_output.frame)
+        sads = set()
+        while len(sads) < 3:
+            assert camera.motion_output.event.wait(1)
+            sads.add(int(camera.motion_output.motion_frame.motion_data["sad"][0, 0]))
+    finally:
+        camera.stop()
+        camera.close()
+
+    # the replay starts from the recording's first key frame, and loops back to it
+    start = next(i for i, frame in enumerate(frames) if frame.sps_header)
+    assert [frame.frame_type for frame in frames[start : start + 5]] == [
+        VideoFrameType.sps_header,
+        VideoFrameType.key_frame,
+        VideoFrameType.frame,
+        VideoFrameType.frame,
+        VideoFrameType.sps_header,
+    ]
+    sps_header, key_frame = camera.video_output.key_frame
+    assert sps_header.data == SPS + PPS
+    # each frame is prefixed with the camera's own SEI
+    assert key_frame.data.endswith(IDR) and key_frame.data != IDR
+    assert sads == {0, 1, 2}
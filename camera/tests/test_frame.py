@@ -1,12 +1,44 @@
-from picamerax import PiVideoFrameType
-
 from src import types
 
 
 def test_frame():
-    frame = types.Frame(b"", 0, 123.123, PiVideoFrameType.key_frame)
+    frame = types.VideoFrame(b"", 0, 123.123, types.VideoFrameType.key_frame)
     assert frame.data == b""
     assert frame.frame_num == 0
     assert frame.timestamp == 123.123
-    assert frame.frame_type == PiVideoFrameType.key_frame
+    assert frame.frame_type == types.VideoFrameType.key_frame
     assert not frame.sps_header
+    assert frame.key_frame
+
+
+def _frame_buffer(frame_types):
+    buffer = types.FrameBuffer(maxlen=len(frame_types))
+    for i, frame_type in enumerate(frame_types):
+        buffer.append(types.VideoFrame(bytes([i]), i, 123.123, frame_type))
+    return buffer
+
+
+def test_frame_buffer_concatenate_keeps_all_frames():
+    header, key, p = (
+        types.VideoFrameType.sps_header,
+        types.VideoFrameType.key_frame,
+        types.VideoFrameType.frame,
+    )
+    first = _frame_buffer([header, key])
+    second = _frame_buffer([p, p, p, header, key])
+    combined = first.concatenate(second)
+    assert len(combined) == 7
+    assert combined.nbytes == 7
+
+
+def test_frame_buffer_split_starts_second_half_on_header():
+    header, key, p = (
+        types.VideoFrameType.sps_header,
+        types.VideoFrameType.key_frame,
+        types.VideoFrameType.frame,
+    )
+    buffer = _frame_buffer([header, key, p, p, header, key, p])
+    before, after = buffer.split(3)
+    assert [f.frame_num for f in before] == [0, 1, 2, 3]
+    assert [f.frame_num for f in after] == [4, 5, 6]
+    assert len(buffer) == 7
@@ -0,0 +1,64 @@
+import pytest
+
+from src import framebus
+
+
+@pytest.fixture
+def bus(tmp_path):
+    bus = framebus.FrameBus(
+        shm_path=str(tmp_path / "frames"), socket_path=str(tmp_path / "frames.sock"), capacity=1000
+    )
+    yield bus
+    bus.close()
+
+
+def test_reader_skips_to_first_header(bus):
+    reader = framebus.FrameBusReader(bus.socket_path, timeout=1)
+    bus.write(framebus.KIND_VIDEO, b"p-frame", 0, 1.0)
+    bus.write(framebus.KIND_VIDEO, b"header", 1, 1.1, frame_type=framebus.FRAME_TYPE_SPS_HEADER)
+    bus.write(framebus.KIND_MOTION, bytes(range(8)), 2, 1.2, rows=1, cols=2)
+
+    header = reader.read()
+    assert header.sps_header
+    assert bytes(header.data) == b"header"
+    assert (header.frame_num, header.timestamp) == (1, 1.1)
+
+    motion = reader.read()
+    vectors = framebus.motion_array(motion)
+    assert vectors.shape == (1, 2)
+    assert list(vectors["x"][0]) == [0, 4]
+    assert reader.is_valid(motion)
+
+    del header, motion, vectors
+    reader.close()
+
+
+def test_overwritten_frames_are_invalid(bus):
+    reader = framebus.FrameBusReader(bus.socket_path, timeout=1)
+    bus.write(framebus.KIND_VIDEO, b"a" * 400, 0, 0, frame_type=framebus.FRAME_TYPE_SPS_HEADER)
+    bus.write(framebus.KIND_VIDEO, b"b" * 400, 1, 0)
+    first, second = reader.read(), reader.read()
+    assert reader.is_valid(first)
+
+    # doesn't fit at the end of the ring, so wraps around over the first frame
+    bus.write(framebus.KIND_VIDEO, b"c" * 400, 2, 0)
+    third = reader.read()
+    assert third.start == 1000
+    assert not reader.is_valid(first)
+    assert reader.is_valid(second)
+    assert bytes(third.data) == b"c" * 400
+
+    del first, second, third
+    reader.close()
+
+
+def test_reader_iteration_ends_when_bus_closes(tmp_path):
+    bus = framebus.FrameBus(
+        shm_path=str(tmp_path / "frames"), socket_path=str(tmp_path / "frames.sock"), capacity=1000
+    )
+    reader = framebus.FrameBusReader(bus.socket_path, timeout=1)
+    bus.write(framebus.KIND_MOTION, bytes(4), 0, 0, rows=1, cols=1)
+    bus.close()
+    assert len(list(reader)) == 1
+    assert not (tmp_path / "frames").exists()
+    reader.close()
@@ -0,0 +1,80 @@
+import gc
+import os
+
+import pytest
+
+from src import memory
+
+
+@pytest.fixture()
+def snapshots():
+    snapshots = memory.Snapshots(keep=2)
+    snapshots.start()
+    yield snapshots
+    snapshots.stop()
+
+
+def test_diff_finds_growing_allocations(snapshots):
+    base = snapshots.take()
+    leaked = [bytearray(1024) for _ in range(1000)]  # noqa: F841
+    snapshot = snapshots.take()
+
+    diff = snapshots.diff(snapshot, base, limit=1)
+    top = diff["top"][0]
+    assert top["traceback"][0].startswith(__file__)
+    assert top["size_diff"] >= 1000 * 1024
+    assert top["count_diff"] >= 1000
+    assert snapshots.top(snapshot, limit=1)["top"][0]["size"] >= 1000 * 1024
+
+
+def test_only_recent_snapshots_are_kept(snapshots):
+    first = snapshots.take()
+    snapshots.take()
+    snapshots.take()
+    assert [s["id"] for s in snapshots.stats()["snapshots"]] == [first + 1, first + 2]
+    with pytest.raises(KeyError):
+        snapshots.top(first)
+
+
+def test_snapshots_need_tracing(snapshots):
+    snapshots.stop()
+    with pytest.raises(ValueError):
+        snapshots.take()
+
+
+def test_buffers_and_open_pipes_are_reported(fake_camera):
+    before = memory.buffers()
+    assert before["buffers"]["spool"] == 0
+    assert before["rss_bytes"] > 0
+
+    read_fd, write_fd = os.pipe()
+    try:
+        after = memory.buffers()
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    assert after["open_fds"]["pipe"] == before["open_fds"].get("pipe", 0) + 2
+
+
+def test_gc_pauses_are_recorded():
+    monitor = memory.GCMonitor()
+    monitor.install()
+    try:
+        collections = monitor.stats()["generations"][2]["collections"]
+        gc.collect()
+    finally:
+        monitor.uninstall()
+    stats = monitor.stats()
+    assert stats["generations"][2]["collections"] == collections + 1
+    assert stats["recent"][-1]["generation"] == 2
+    assert stats["recent"][-1]["seconds"] > 0
+    assert monitor._callback not in gc.callbacks
+
+
+def test_freeze_stops_objects_being_scanned():
+    try:
+        frozen = memory.freeze()
+        assert frozen > 0
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.unfreeze()
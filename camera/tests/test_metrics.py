@@ -0,0 +1,92 @@
+import socket
+import time
+
+import pytest
+
+from src import metrics
+
+
+def test_counter_and_gauge():
+    registry = metrics.Registry()
+    counter = metrics.Counter("frames_total", "Frames", ["handler"], registry=registry)
+    gauge = metrics.Gauge("clients", "Clients", ["stream"], registry=registry)
+
+    counter.labels("Video").inc()
+    counter.labels("Video").inc(2)
+    counter.labels('Odd "name"').inc()
+    gauge.labels("Network").set(3)
+    gauge.labels("Network").dec()
+    gauge.labels("Local").set_function(lambda: 7)
+
+    assert registry.render().splitlines() == [
+        "# HELP frames_total Frames",
+        "# TYPE frames_total counter",
+        'frames_total{handler="Video"} 3.0',
+        'frames_total{handler="Odd \\"name\\""} 1.0',
+        "# HELP clients Clients",
+        "# TYPE clients gauge",
+        'clients{stream="Network"} 2.0',
+        'clients{stream="Local"} 7.0',
+    ]
+
+    gauge.remove("Local")
+    assert "Local" not in registry.render()
+
+    with pytest.raises(ValueError):
+        counter.labels()
+    with pytest.raises(ValueError):
+        metrics.Counter("frames_total", "Frames again", registry=registry)
+
+
+def test_histogram():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram(
+        "latency_seconds", "Latency", buckets=[0.1, 0.01], registry=registry
+    )
+    child = histogram.labels()
+    for value in [0.005, 0.01, 0.05, 2]:
+        child.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        # each bucket includes its upper bound, and counts every smaller observation too
+        'latency_seconds_bucket{le="0.01"} 2.0',
+        'latency_seconds_bucket{le="0.1"} 3.0',
+        'latency_seconds_bucket{le="+Inf"} 4.0',
+        "latency_seconds_sum 2.065",
+        "latency_seconds_count 4.0",
+    ]
+
+
+def _sample(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_pipeline_metrics(fake_camera):
+    camera = fake_camera
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure({"outputs": {"network": {"enabled": True, "socket_port": port}}})
+    before = metrics.render()
+    camera.start()
+
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+        received = 0
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            received += len(conn.recv(65536))
+        during = metrics.render()
+    camera.stop()
+
+    def delta(name):
+        return _sample(during, name) - _sample(before, name)
+
+    assert delta('picamera_frames_published_total{stream="main"}') > 0
+    assert delta('picamera_output_frames_in_total{handler="NetworkVideoThread"}') > 0
+    assert delta('picamera_output_frames_out_total{output="Network"}') > 0
+    assert 0 < delta('picamera_network_bytes_sent_total{stream="Network"}') <= received + 65536
+    assert delta('picamera_network_clients{stream="Network"}') == 1
+    assert delta('picamera_handler_lag_seconds_count{handler="NetworkVideoThread"}') > 0
@@ -0,0 +1,97 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from src import exceptions
+from src.motion_recording import MIN_FREE_BYTES, MotionRecorder, load, load_chunks, replay
+from src.outputs.motion_output import DetectMotion
+from src.types import MotionFrame, motion_dtype
+
+
+def _frame(frame_num: int, moving: bool = False) -> MotionFrame:
+    motion = np.zeros((12, 17), dtype=motion_dtype)
+    motion["sad"] = frame_num
+    if moving:
+        motion[2:6, 3:7] = (20, 0, 100)
+    return MotionFrame(motion, frame_num, 1000 + frame_num / 30)
+
+
+def test_recording_is_a_ring(tmp_path):
+    path = tmp_path / "motion.npy"
+    recorder = MotionRecorder(path, capacity=4)
+    for i in range(6):
+        recorder.write(_frame(i))
+    assert recorder.stats()["frames"] == 6
+    recorder.close()
+    # written after the recording was stopped, which mustn't start it afresh
+    recorder.write(_frame(6))
+
+    frames = list(load(path))
+    assert [frame.frame_num for frame in frames] == [2, 3, 4, 5]
+    assert [int(frame.motion_data["sad"][0, 0]) for frame in frames] == [2, 3, 4, 5]
+    assert frames[0].timestamp == 1000 + 2 / 30
+    # readable by numpy alone, too
+    assert np.load(path).shape == (4,)
+    chunks = list(load_chunks(path, size=3))
+    assert [chunk["frame_num"].tolist() for chunk in chunks] == [[2, 3, 4], [5]]
+
+
+def test_partly_filled_recording(tmp_path):
+    path = tmp_path / "motion.npy"
+    recorder = MotionRecorder(path, capacity=10)
+    for i in range(3):
+        recorder.write(_frame(i))
+    recorder.close()
+    assert [frame.frame_num for frame in load(path)] == [0, 1, 2]
+
+
+def test_replay_detects_motion_events(tmp_path):
+    path = tmp_path / "motion.npy"
+    recorder = MotionRecorder(path, capacity=30)
+    for i in range(30):
+        recorder.write(_frame(i, moving=10 <= i < 20))
+    recorder.close()
+
+    result = replay(load(path), DetectMotion(sensitivity=10, min_blocks=6, min_frames=3))
+    assert result["frames"] == 30
+    # an event for every frame once motion has lasted for three frames
+    assert [event["frame_num"] for event in result["events"]] == list(range(12, 20))
+    assert result["events"][0]["boxes"] == [(48, 32, 112, 96)]
+    assert result["latency"]["detect"]["count"] == 30
+    assert result["latency"]["magnitudes"]["count"] == 30
+    assert result["latency"]["motion_areas"]["count"] == 10
+
+
+def test_camera_records_motion_vectors(fake_camera, tmp_path):
+    path = tmp_path / "motion.npy"
+    fake_camera.motion_output.recorder = MotionRecorder(path, capacity=100)
+    fake_camera.start()
+    for _ in range(3):
+        assert fake_camera.motion_output.event.wait(1)
+    fake_camera.stop()
+    fake_camera.close()
+
+    frames = list(load(path))
+    assert len(frames) >= 3
+    assert frames[0].motion_data.shape == fake_camera.motion_output.motion_frame.motion_data.shape
+
+
+def test_recording_needs_space(tmp_path, monkeypatch):
+    path = tmp_path / "motion.npy"
+    recorder = MotionRecorder(path, capacity=100)
+    recorder.check_space(12, 17)
+    # known before the first frame is written
+    assert recorder.stats()["bytes"] == 100 * (8 + 8 + 12 * 17 * 4)
+
+    usage = shutil.disk_usage(tmp_path)
+    free = MIN_FREE_BYTES + 50 * (8 + 8 + 12 * 17 * 4)
+    monkeypatch.setattr(shutil, "disk_usage", lambda path: usage._replace(free=free))
+    with pytest.raises(exceptions.InsufficientSpace):
+        recorder.check_space(12, 17)
+    # e.g. if the resolution is raised once recording
+    recorder.write(_frame(0))
+    assert recorder.stats()["error"] is not None
+    assert not path.exists()
+    recorder.write(_frame(1))
+    assert not path.exists()
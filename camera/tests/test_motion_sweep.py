@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+
+from src.motion_recording import MotionRecorder, load, load_chunks, replay
+from src.motion_sweep import max_area_sizes, sweep
+from src.outputs.motion_output import DetectMotion
+from src.types import MotionFrame, motion_dtype
+
+
+def _record(path, frames=120):
+    """Record frames of noise, with a few areas of motion of varying sizes and speeds, and return
+    the intervals in which the largest of them was moving.
+    """
+    rng = np.random.default_rng(1)
+    recorder = MotionRecorder(path, capacity=frames)
+    for i in range(frames):
+        motion = np.zeros((12, 17), dtype=motion_dtype)
+        motion["x"] = rng.integers(-9, 10, (12, 17))
+        motion["y"] = rng.integers(-4, 5, (12, 17))
+        if 20 <= i < 40 or 80 <= i < 84:
+            motion[3:7, 2 + i % 8 : 6 + i % 8] = (15, 6, 200)
+        if i % 7 < 3:
+            motion[9:11, 12:14] = (11, 0, 200)
+        recorder.write(MotionFrame(motion, i, 100 + i / 30))
+    recorder.close()
+    return [(100 + 20 / 30, 100 + 40 / 30), (100 + 80 / 30, 100 + 84 / 30)]
+
+
+def test_sweep_matches_detect_motion(tmp_path):
+    path = tmp_path / "motion.npy"
+    truth = _record(path)
+    sensitivities, min_blocks, min_frames = [6, 9, 12], [1, 4, 9], [1, 3, 6]
+
+    # chunks smaller than the recording, so that results are stitched across them
+    result = sweep(load_chunks(path, size=50), sensitivities, min_blocks, min_frames, truth)
+    assert result["frames"] == 120
+    assert len(result["combinations"]) == 27
+
+    swept = {
+        (c["sensitivity"], c["min_blocks"], c["min_frames"]): c for c in result["combinations"]
+    }
+    for sensitivity, blocks, frames in itertools.product(sensitivities, min_blocks, min_frames):
+        replayed = replay(load(path), DetectMotion(sensitivity, blocks, frames))
+        event_frames = [event["frame_num"] for event in replayed["events"]]
+        onsets = [n for n in event_frames if n - 1 not in event_frames]
+        combination = swept[(sensitivity, blocks, frames)]
+        assert combination["event_frames"] == len(event_frames)
+        assert combination["events"] == len(onsets)
+
+    best = swept[(12, 9, 3)]
+    assert best["events"] == 2
+    assert (best["precision"], best["recall"], best["f1"]) == (1.0, 1.0, 1.0)
+
+
+def test_area_size_counts_blocks_within_its_bounding_box():
+    motion = np.zeros((2, 8, 8), dtype=motion_dtype)
+    # an L of five blocks, whose bounding box also takes in an isolated block at (2, 2)
+    motion[0, 0, 0:3] = (20, 0, 0)
+    motion[0, 1:3, 0] = (20, 0, 0)
+    motion[0, 2, 2] = (20, 0, 0)
+    # the same L alone, in the next frame
+    motion[1] = motion[0]
+    motion[1, 2, 2] = (0, 0, 0)
+
+    sizes = max_area_sizes(motion, [10, 30])
+    assert sizes.tolist() == [[6, 5], [0, 0]]
+    # as DetectMotion sees it
+    detector = DetectMotion(sensitivity=10, min_blocks=6, min_frames=1)
+    assert detector.detect(MotionFrame(motion[0], 0, 0)) is not None
+    assert detector.detect(MotionFrame(motion[1], 1, 0)) is None
+
+
+def test_longest_vectors_count_as_motion():
+    motion = np.zeros((1, 4, 4), dtype=motion_dtype)
+    motion[0, 0, 0] = (-128, -128, 0)
+    motion[0, 0, 1] = (127, -128, 0)
+
+    sizes = max_area_sizes(motion, [10, 180])
+    assert sizes.tolist() == [[2], [2]]
+    detector = DetectMotion(sensitivity=180, min_blocks=2, min_frames=1)
+    assert detector.detect(MotionFrame(motion[0], 0, 0)) is not None
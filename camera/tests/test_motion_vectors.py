@@ -0,0 +1,73 @@
+import socket
+import time
+import zlib
+
+import numpy as np
+
+from src.motion_vectors import FLAG_EMPTY, HEADER, MotionVectorEncoder
+from src.types import MotionFrame
+
+MOTION_DTYPE = np.dtype([("x", "i1"), ("y", "i1"), ("sad", "u2")])
+
+
+def _frame(vectors):
+    motion_data = np.zeros((3, 4), dtype=MOTION_DTYPE)
+    for (row, col), (x, y) in vectors.items():
+        motion_data[row, col] = (x, y, 100)
+    return MotionFrame(motion_data, 7, 1_600_000_000.5)
+
+
+def _decode(record):
+    version, flags, rows, cols, frame_num, timestamp, size = HEADER.unpack_from(record)
+    assert (version, rows, cols, frame_num, timestamp) == (1, 3, 4, 7, 1_600_000_000.5)
+    assert len(record) == HEADER.size + size
+    if flags & FLAG_EMPTY:
+        return None
+    payload = zlib.decompress(record[HEADER.size :])
+    return np.frombuffer(payload, dtype=np.int8).reshape(rows, cols, 2)
+
+
+def test_short_vectors_are_zeroed():
+    encoder = MotionVectorEncoder(min_magnitude=3)
+    vectors = _decode(encoder.encode(_frame({(0, 0): (2, 2), (1, 2): (-3, 0), (2, 3): (5, -7)})))
+    expected = np.zeros((3, 4, 2), dtype=np.int8)
+    expected[1, 2] = (-3, 0)
+    expected[2, 3] = (5, -7)
+    np.testing.assert_array_equal(vectors, expected)
+
+
+def test_longest_vectors_are_kept():
+    encoder = MotionVectorEncoder(min_magnitude=3)
+    vectors = _decode(encoder.encode(_frame({(0, 0): (-128, -128), (1, 1): (127, -128)})))
+    assert tuple(vectors[0, 0]) == (-128, -128)
+    assert tuple(vectors[1, 1]) == (127, -128)
+
+
+def test_empty_frames_are_sent_as_a_header():
+    encoder = MotionVectorEncoder(min_magnitude=3)
+    record = encoder.encode(_frame({(0, 0): (1, -2)}))
+    assert len(record) == HEADER.size
+    assert _decode(record) is None
+    assert (encoder.frames, encoder.empty_frames) == (1, 1)
+
+    # without a dead zone, any vector at all is sent
+    assert _decode(MotionVectorEncoder(min_magnitude=0).encode(_frame({(0, 0): (1, -2)})))[0, 0][0]
+
+
+def test_motion_vector_output(fake_camera):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    fake_camera.configure(
+        {"outputs": {"motion_vectors": {"enabled": True, "socket_port": port, "min_magnitude": 0}}}
+    )
+    fake_camera.start()
+
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+        deadline = time.monotonic() + 2
+        data = b""
+        while len(data) < HEADER.size and time.monotonic() < deadline:
+            data += conn.recv(HEADER.size - len(data))
+    version, _flags, rows, cols, _frame_num, _timestamp, _size = HEADER.unpack(data)
+    motion_data = fake_camera.motion_output.motion_frame.motion_data
+    assert (version, rows, cols) == (1, *motion_data.shape)
@@ -0,0 +1,52 @@
+from src.multipart import FilePart, MultipartBody, read_file_slice
+from tests.conftest import parse_multipart
+
+
+def _parse(body):
+    data = b"".join(bytes(chunk) for chunk in body)
+    assert len(data) == len(body)
+    return parse_multipart(data, body.content_type)
+
+
+def test_multipart_body_round_trip():
+    frames = [b"\x00\x00\x00\x01header", b"frame1", b"frame2" * 100]
+    body = MultipartBody(
+        fields={"timestamp": "2021-01-01T00:00:00", "framerate": "25"},
+        files={"video": FilePart.from_buffers("video.h264", "video/h264", frames)},
+    )
+    form = _parse(body)
+    assert form["timestamp"].get_payload(decode=True) == b"2021-01-01T00:00:00"
+    assert form["framerate"].get_payload(decode=True) == b"25"
+    assert form["video"].get_filename() == "video.h264"
+    assert form["video"].get_content_type() == "video/h264"
+    assert form["video"].get_payload(decode=True) == b"".join(frames)
+
+
+def test_multipart_body_chunks_are_bounded():
+    frame = bytes(1_000_000)
+    body = MultipartBody(
+        files={"video": FilePart.from_buffers("video.h264", "video/h264", [frame])},
+        chunk_size=4096,
+    )
+    chunks = list(body)
+    assert max(len(chunk) for chunk in chunks) <= 4096
+    # the frame data is sliced, not copied
+    assert all(chunk.obj is frame for chunk in chunks if isinstance(chunk, memoryview))
+
+
+def test_multipart_body_progress():
+    progress = []
+    body = MultipartBody(
+        files={"video": FilePart.from_buffers("video.h264", "video/h264", [bytes(10_000)])},
+        chunk_size=1024,
+        progress=lambda sent, total: progress.append((sent, total)),
+    )
+    list(body)
+    assert progress[-1] == (len(body), len(body))
+    assert [sent for sent, _ in progress] == sorted(sent for sent, _ in progress)
+
+
+def test_read_file_slice(tmp_path):
+    path = tmp_path / "segment"
+    path.write_bytes(b"0123456789")
+    assert b"".join(read_file_slice(path, 2, 5, chunk_size=2)) == b"23456"
@@ -1,5 +1,7 @@
+import socket
 import time
 
+from src import framebus
 from src.outputs import NetworkOutput, MotionDetectionOutput
 
 
@@ -19,3 +21,121 @@ def test_motion_detection_output(default_camera):
     time.sleep(15)
     no.close()
     mo.close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_stream(port, duration):
+    data = b""
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            data += conn.recv(65536)
+    return data
+
+
+def test_network_secondary_stream(fake_camera):
+    camera = fake_camera
+    main_port, secondary_port = _free_port(), _free_port()
+    camera.configure(
+        {
+            "camera": {"secondary_resolution": "640x480", "secondary_bitrate": 300_000},
+            "outputs": {
+                "network": {
+                    "enabled": True,
+                    "socket_port": main_port,
+                    "secondary_socket_port": secondary_port,
+                }
+            },
+        }
+    )
+    camera.start()
+    encoders = camera._camera._encoders
+    assert str(encoders[camera.SECONDARY_SPLITTER_PORT].resolution) == "640x480"
+
+    main = _read_stream(main_port, 1)
+    secondary = _read_stream(secondary_port, 1)
+
+    # both streams begin with an SPS header, so a client can decode them from the start
+    assert main.startswith(b"\x00\x00\x00\x01\x27")
+    assert secondary.startswith(b"\x00\x00\x00\x01\x27")
+    # and the secondary stream is encoded at a far lower bitrate
+    assert len(secondary) < len(main) / 4
+    assert camera.secondary_video_output.frame.frame_num > 0
+
+
+def test_local_output(fake_camera, tmp_path):
+    camera = fake_camera
+    socket_path = str(tmp_path / "frames.sock")
+    camera.configure(
+        {
+            "outputs": {
+                "local": {
+                    "enabled": True,
+                    "shm_path": str(tmp_path / "frames"),
+                    "socket_path": socket_path,
+                }
+            }
+        }
+    )
+    camera.start()
+
+    frames = {}
+    with framebus.FrameBusReader(socket_path, timeout=2) as reader:
+        while len(frames) < 2:
+            frame = reader.read()
+            frames.setdefault(frame.kind, frame)
+        video, motion = frames[framebus.KIND_VIDEO], frames[framebus.KIND_MOTION]
+        # the video is readable from the start, and the motion vectors keep their shape
+        assert video.sps_header
+        assert bytes(video.data[:5]) == b"\x00\x00\x00\x01\x27"
+        assert framebus.motion_array(motion).shape == (motion.rows, motion.cols)
+        del frames, frame, video, motion
+
+
+def test_network_client_survives_reconfiguration(fake_camera):
+    camera = fake_camera
+    port = _free_port()
+    camera.configure({"outputs": {"network": {"enabled": True, "socket_port": port}}})
+    camera.start()
+    output = camera._outputs["network"]
+
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+        data = conn.recv(65536)
+        camera.configure({"camera": {"resolution": "1920x1080", "bitrate": 2_000_000}})
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            data += conn.recv(65536)
+
+    # the output, and the client's connection, were kept throughout
+    assert camera._outputs["network"] is output
+    assert data.startswith(b"\x00\x00\x00\x01\x27")
+    assert camera._camera._encoders[1].resolution == (1920, 1080)
+    # the motion data is shaped for the new resolution
+    assert camera.motion_output.motion_frame.motion_data.shape == (68, 121)
+
+
+def test_reconfiguration_restarts_outputs_which_cant_follow(fake_camera):
+    camera = fake_camera
+    camera.configure(
+        {
+            "outputs": {
+                "network": {
+                    "enabled": True,
+                    "socket_port": _free_port(),
+                    "secondary_socket_port": _free_port(),
+                }
+            }
+        }
+    )
+    camera.start()
+    output = camera._outputs["network"]
+
+    # the network output has to be restarted to serve a secondary stream
+    camera.configure({"camera": {"secondary_resolution": "640x480"}})
+    assert camera._outputs["network"] is not output
+    assert camera._outputs["network"].secondary_stream is not None
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from src import exceptions, profiler
+
+
+def _spin_until(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_profile_samples_every_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin_until, args=(stop,), name="SpinThread")
+    thread.start()
+    try:
+        result = profiler.profile(0.3, rate=200)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert 0 < result.samples
+    assert 0 < result.overhead < 0.5
+    spinning = [stack for stack in result.stacks if stack[0] == "SpinThread"]
+    assert spinning
+    # stacks run from the outermost frame to the innermost, and are labelled by function
+    for stack in spinning:
+        assert stack[1].startswith("_bootstrap (threading.py:")
+        assert f"_spin_until (test_profiler.py:{_spin_until.__code__.co_firstlineno})" in stack
+    # the sampling thread leaves itself out
+    assert threading.current_thread().name not in {stack[0] for stack in result.stacks}
+
+    lines = result.collapsed().splitlines()
+    assert len(lines) == len(result.stacks)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+def test_one_profile_at_a_time():
+    thread = threading.Thread(target=profiler.profile, args=(0.5,))
+    thread.start()
+    time.sleep(0.1)
+    with pytest.raises(exceptions.ProfilerBusy):
+        profiler.profile(0.1)
+    thread.join()
@@ -113,3 +113,33 @@ def test_camera_schema_invalid(
             vflip=vflip,
             hflip=hflip,
         )
+
+
+@pytest.mark.parametrize(
+    ["secondary_resolution", "valid"],
+    [
+        (None, True),
+        ("640x480", True),
+        ("1920x1080", True),
+        ("1920x1081", False),
+        ("2000x480", False),
+        ("640", False),
+        ("widexhigh", False),
+    ],
+)
+def test_camera_config_schema_secondary_resolution(secondary_resolution, valid):
+    params = dict(
+        revision=CameraRevision.IMX219,
+        resolution="1920x1080",
+        framerate=25,
+        bitrate=1_000_000,
+        awb_mode=AWBMode.AUTO,
+        vflip=False,
+        hflip=False,
+        secondary_resolution=secondary_resolution,
+    )
+    if valid:
+        assert CameraConfigSchema(**params).secondary_resolution == secondary_resolution
+    else:
+        with pytest.raises(ValidationError):
+            CameraConfigSchema(**params)
@@ -0,0 +1,59 @@
+import struct
+import time
+
+from src.sei import METADATA_UUID, SEIInjector, encode_metadata
+
+
+def _unescape(nal: bytes) -> bytes:
+    return nal.replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+def test_encode_metadata():
+    nal = encode_metadata(1_600_000_000.25, 42, motion=True)
+    assert nal.startswith(b"\x00\x00\x00\x01\x06")
+    assert nal.endswith(b"\x80")
+
+    rbsp = _unescape(nal[5:])
+    # user data unregistered, followed by its size
+    assert rbsp[0] == 5
+    payload = rbsp[2 : 2 + rbsp[1]]
+    assert payload[:16] == METADATA_UUID.bytes
+    version, timestamp_us, frame_num, flags = struct.unpack(">BQIB", payload[16:])
+    assert (version, timestamp_us, frame_num, flags) == (1, 1_600_000_000_250_000, 42, 1)
+
+
+def test_encode_metadata_prevents_start_code_emulation():
+    # frame 1 is encoded as 00 00 00 01, which would otherwise look like a start code
+    nal = encode_metadata(0, 1, motion=False)
+    assert b"\x00\x00\x01" not in nal[4:]
+    assert b"\x00\x00\x00" not in nal[4:]
+
+
+def test_injector():
+    injector = SEIInjector()
+    frame = b"\x00\x00\x00\x01\x21" + bytes(100)
+    data = injector.inject(frame, 7, time.time())
+    assert data.startswith(b"\x00\x00\x00\x01\x06")
+    assert data.endswith(frame)
+
+    stats = injector.stats()
+    assert stats["frames"] == 1
+    assert stats["bytes_added"] == len(data) - len(frame)
+
+
+def test_frames_carry_metadata(fake_camera):
+    fake_camera.start()
+    video_output = fake_camera.video_output
+    deadline = time.monotonic() + 5
+    while video_output.key_frame is None and time.monotonic() < deadline:
+        video_output.event.wait(1)
+    # let a few more frames through
+    time.sleep(0.2)
+
+    header, key_frame = video_output.key_frame
+    # headers aren't frames, so carry no metadata
+    assert header.data.startswith(b"\x00\x00\x00\x01\x27")
+    assert key_frame.data.startswith(b"\x00\x00\x00\x01\x06")
+    frame = video_output.frame
+    assert frame.sps_header or frame.data.startswith(b"\x00\x00\x00\x01\x06")
+    assert fake_camera.sei.stats()["frames"] >= 1
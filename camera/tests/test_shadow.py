@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+
+from src.outputs.motion_output import DetectMotion
+from src.shadow import ShadowDetector
+from src.types import MotionFrame, motion_dtype
+
+
+def _frame(frame_num: int, speed: int = 0) -> MotionFrame:
+    motion = np.zeros((12, 17), dtype=motion_dtype)
+    motion[2:6, 3:7] = (speed, 0, 100)
+    return MotionFrame(motion, frame_num, 1000 + frame_num / 30)
+
+
+def _wait_for(shadow: ShadowDetector, frames: int) -> dict:
+    deadline = time.monotonic() + 2
+    while shadow.stats()["frames"] < frames and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return shadow.stats()
+
+
+def test_disagreements_with_the_live_detector():
+    live = DetectMotion(sensitivity=10, min_blocks=6, min_frames=3)
+    shadow = ShadowDetector(DetectMotion(sensitivity=20, min_blocks=6, min_frames=3), 1)
+    for i in range(20):
+        # motion which only the live detector is sensitive enough to detect
+        frame = _frame(i, speed=15 if 10 <= i < 16 else 0)
+        start = time.perf_counter_ns()
+        event = live.detect(frame)
+        # the live detector doesn't run on the final frames, e.g. whilst recording an event
+        shadow.submit(frame, event, time.perf_counter_ns() - start if i < 18 else None, 3)
+        _wait_for(shadow, i + 1)
+    stats = shadow.stats()
+    shadow.close()
+
+    assert stats["candidate"] == {"sensitivity": 20, "min_blocks": 6, "min_frames": 3}
+    assert stats["run"] == 20
+    # compared from the third frame on, until the live detector stopped running
+    assert stats["compared"] == 16
+    assert (stats["live_only"], stats["candidate_only"]) == (4, 0)
+    assert [d["frame_num"] for d in stats["recent_disagreements"]] == [12, 13, 14, 15]
+    assert stats["recent_disagreements"][0]["boxes"] == [(48, 32, 112, 96)]
+    assert stats["cost_us"]["live"]["count"] == 18
+    assert stats["cost_us"]["candidate"]["count"] == 20
+
+
+class _Expensive:
+    """A candidate which uses 10ms of CPU time on every frame."""
+
+    def detect(self, motion_frame):
+        start = time.thread_time()
+        while time.thread_time() - start < 0.01:
+            pass
+
+
+def test_candidate_is_held_to_its_cpu_budget():
+    shadow = ShadowDetector(_Expensive(), cpu_budget=0.05)
+    start = time.monotonic()
+    for i in range(100):
+        shadow.submit(_frame(i), None, None, 1)
+        _wait_for(shadow, i + 1)
+        time.sleep(0.005)
+    elapsed = time.monotonic() - start
+    stats = shadow.stats()
+    shadow.close()
+
+    assert stats["frames"] == 100
+    assert stats["skipped_over_budget"] > 50
+    # the budget for the time taken, plus the second's worth it started with, and the frame
+    # which overspent it
+    assert stats["run"] * 0.01 <= 0.05 * (elapsed + 1) + 0.01
+
+
+def test_camera_submits_frames_to_the_shadow(fake_camera):
+    fake_camera.configure({"outputs": {"motion": {"enabled": True, "captured_before": 1}}})
+    fake_camera.start()
+    shadow = fake_camera.motion_output.shadow = ShadowDetector(DetectMotion(10, 6, 6), 1)
+    time.sleep(1.5)
+    fake_camera.stop()
+    stats = shadow.stats()
+    fake_camera.close()
+
+    assert stats["run"] > 0
+    # once the pre-event buffer had filled, the live detector ran too, and agreed on still frames
+    assert stats["compared"] > 0
+    assert stats["agreed"] == stats["compared"]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from src.snapshot import SnapshotCache
+
+
+class _Frame:
+    def __init__(self, data, frame_num):
+        self.data = data
+        self.frame_num = frame_num
+        self.timestamp = time.time()
+
+
+class _SlowDecoder:
+    def __init__(self, duration=0.2):
+        self.duration = duration
+        self.calls = 0
+
+    def __call__(self, data, width):
+        self.calls += 1
+        time.sleep(self.duration)
+        return b"jpeg:" + data + str(width).encode()
+
+
+def _key_frame(frame_num):
+    return _Frame(b"header", frame_num - 1), _Frame(b"idr", frame_num)
+
+
+def test_one_decode_serves_concurrent_requests():
+    decoder = _SlowDecoder()
+    cache = SnapshotCache(lambda: _key_frame(10), decode=decoder)
+
+    num_clients = 20
+    barrier = threading.Barrier(num_clients)
+    results = []
+
+    def client():
+        barrier.wait()
+        results.append(cache.get())
+
+    threads = [threading.Thread(target=client) for _ in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert decoder.calls == 1
+    assert len(results) == num_clients
+    assert all(snapshot.jpeg == b"jpeg:headeridrNone" for snapshot in results)
+    assert all(snapshot.frame_num == 10 for snapshot in results)
+
+
+def test_snapshot_is_cached_by_frame_number():
+    decoder = _SlowDecoder(duration=0)
+    key_frame = _key_frame(10)
+    cache = SnapshotCache(lambda: key_frame, ttl=0, decode=decoder)
+
+    cache.get()
+    cache.get()
+    # the ttl has expired, but the key frame hasn't changed, so there is no need to decode again
+    assert decoder.calls == 1
+
+    key_frame = _key_frame(20)
+    assert cache.get().frame_num == 20
+    assert decoder.calls == 2
+
+
+def test_snapshot_ttl():
+    decoder = _SlowDecoder(duration=0)
+    key_frame = _key_frame(10)
+    cache = SnapshotCache(lambda: key_frame, ttl=60, decode=decoder)
+
+    cache.get()
+    key_frame = _key_frame(20)
+    # still within the ttl, so the previous snapshot is served
+    assert cache.get().frame_num == 10
+    assert decoder.calls == 1
+
+
+def test_snapshot_widths_are_cached_separately():
+    decoder = _SlowDecoder(duration=0)
+    cache = SnapshotCache(lambda: _key_frame(10), decode=decoder)
+
+    assert cache.get(width=320).jpeg.endswith(b"320")
+    assert cache.get().jpeg.endswith(b"None")
+    assert cache.get(width=320) is not cache.get()
+    assert decoder.calls == 2
+
+
+def test_no_snapshot_before_first_key_frame():
+    cache = SnapshotCache(lambda: None, decode=_SlowDecoder())
+    assert cache.get() is None
+
+
+def test_only_the_most_recent_widths_are_cached():
+    decoder = _SlowDecoder(duration=0)
+    cache = SnapshotCache(lambda: _key_frame(10), decode=decoder, max_widths=2)
+
+    cache.get(width=320)
+    cache.get(width=640)
+    cache.get(width=320)
+    cache.get(width=1280)
+    assert list(cache._cache) == [320, 1280]
+    # 640 was evicted, so has to be decoded again
+    cache.get(width=640)
+    assert decoder.calls == 4
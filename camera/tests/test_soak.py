@@ -0,0 +1,83 @@
+import time
+
+from src import clock, soak
+
+
+def test_accelerated_clock():
+    previous = clock.set_clock(clock.AcceleratedClock(speed=1000, start=100))
+    try:
+        first = clock.now()
+        time.sleep(0.05)
+        assert 100 <= first < clock.now() - 40
+    finally:
+        clock.set_clock(previous)
+    assert abs(clock.now() - time.time()) < 1
+
+
+def _samples(threads_per_hour=0.0, drops=0):
+    return [
+        {
+            "time": hour * 3600,
+            "rss_bytes": 100e6,
+            "threads": 10 + hour * threads_per_hour,
+            "open_fds": 5,
+            "buffer_bytes": 1e6,
+            "frames_published": hour * 18_000,
+            "frames_handled": hour * 36_000,
+            "frames_dropped": hour * drops,
+        }
+        for hour in range(25)
+    ]
+
+
+def test_failures_from_growth_and_drift():
+    steady = {
+        "samples": _samples(),
+        "framerate": 5,
+        # each capture a little late, but no later as time goes on
+        "captures": [0, 60.1, 120, 180.2, 240, 300.2, 360.1, 420],
+        "capture_interval": 60,
+    }
+    report = soak.analyse(steady)
+    assert report["growth"]["threads"]["per_hour"] == 0
+    assert report["timelapse"]["slip_frames"] == 0
+    assert soak.failures(report) == []
+
+    leaking = {
+        "samples": _samples(threads_per_hour=1, drops=100),
+        "framerate": 5,
+        # a capture a little later than the last, every time
+        "captures": [i * 60.5 for i in range(200)],
+        "capture_interval": 60,
+    }
+    report = soak.analyse(leaking)
+    assert report["frames"]["drop_fraction"] > 0
+    failed = soak.failures(report)
+    assert len(failed) == 2
+    assert failed[0].startswith("threads grew by 1/hour")
+    assert report["timelapse"]["drift_seconds"] == 99.5
+    assert failed[1].startswith("timelapse slipped by 250 frames (50s")
+
+
+def test_soak_runs_the_pipeline(tmp_path):
+    run = soak.Soak(
+        tmp_path,
+        hours=0.2,
+        minutes=0.1,
+        capture_interval=30,
+        sample_every=60,
+        outputs=["timelapse"],
+    )
+    result = run.run()
+    assert type(clock.CLOCK) is clock.Clock
+
+    # 12 minutes of simulated time, sampled every minute
+    assert len(result["samples"]) == 13
+    assert result["samples"][-1]["time"] >= 720
+    assert result["samples"][-1]["frames_published"] > 0
+    # a timelapse image every 30 simulated seconds
+    report = soak.analyse(result)
+    assert report["timelapse"]["captures"] >= 20
+    # which didn't slip from their schedule. The soak is too short to judge growth by
+    limits = soak.Limits()._replace(**{name: float("inf") for name in report["growth"]})
+    assert soak.failures(report, limits) == []
@@ -0,0 +1,138 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.spool import UploadSpool
+from tests.conftest import parse_multipart
+
+
+class _StandInServer:
+    """A local HTTP server which records multipart uploads and can be taken down and back up."""
+
+    def __init__(self):
+        self.received = []
+        self.port = None
+        self._httpd = None
+
+    def up(self):
+        received = self.received
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                form = parse_multipart(body, self.headers["Content-Type"])
+                received.append(
+                    {
+                        "path": self.path,
+                        "seq": (
+                            form["seq"].get_payload(decode=True).decode() if "seq" in form else None
+                        ),
+                        "video": (
+                            form["video"].get_payload(decode=True) if "video" in form else None
+                        ),
+                    }
+                )
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", self.port or 0), Handler)
+        self._httpd.allow_reuse_address = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def down(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+@pytest.fixture()
+def stand_in_server():
+    server = _StandInServer()
+    server.up()
+    yield server
+    server.down()
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_spool_uploads_records(tmp_path, stand_in_server):
+    spool = UploadSpool(tmp_path, base_url=lambda: stand_in_server.url)
+    spool.put(
+        "/motion", fields={"seq": "0"}, files={"video": ("v.h264", "video/h264", [b"ab", b"cd"])}
+    )
+    assert _wait_for(lambda: spool.depth == 0)
+    spool.close()
+
+    assert stand_in_server.received == [{"path": "/motion", "seq": "0", "video": b"abcd"}]
+    metrics = spool.metrics()
+    assert metrics["uploaded"] == 1
+    assert metrics["depth_bytes"] == 0
+    assert metrics["drain_rate_records"] > 0
+
+
+def test_spool_survives_outage_and_sends_oldest_first(tmp_path, stand_in_server):
+    stand_in_server.down()
+    spool = UploadSpool(
+        tmp_path,
+        base_url=lambda: stand_in_server.url,
+        max_concurrency=1,
+        min_backoff=0.05,
+        max_backoff=0.2,
+    )
+    for i in range(5):
+        spool.put("/timelapse", fields={"seq": str(i)})
+
+    # whilst the server is down, everything stays on disk
+    assert _wait_for(lambda: spool.metrics()["failed_attempts"] > 0)
+    assert spool.depth == 5
+    assert spool.metrics()["depth_bytes"] > 0
+
+    stand_in_server.up()
+    assert _wait_for(lambda: spool.depth == 0)
+    spool.close()
+
+    assert [r["seq"] for r in stand_in_server.received] == ["0", "1", "2", "3", "4"]
+
+
+def test_spool_recovers_unsent_records_after_restart(tmp_path, stand_in_server):
+    spool = UploadSpool(tmp_path, base_url=lambda: None)
+    spool.put("/motion", fields={"seq": "0"}, files={"video": ("v.h264", "video/h264", b"xyz")})
+    spool.put("/motion", fields={"seq": "1"})
+    spool.close()
+
+    spool = UploadSpool(tmp_path, base_url=lambda: stand_in_server.url, max_concurrency=1)
+    assert _wait_for(lambda: spool.depth == 0)
+    spool.close()
+
+    assert [r["seq"] for r in stand_in_server.received] == ["0", "1"]
+    assert stand_in_server.received[0]["video"] == b"xyz"
+    # fully acknowledged segments are removed from disk
+    assert not list(tmp_path.glob("*.spool"))
+
+
+def test_spool_is_bounded(tmp_path):
+    spool = UploadSpool(tmp_path, base_url=lambda: None, max_bytes=4096, segment_bytes=1024)
+    for i in range(20):
+        spool.put("/motion", files={"video": ("v.h264", "video/h264", bytes(512))})
+
+    metrics = spool.metrics()
+    assert metrics["depth_bytes"] <= 4096 + 1024
+    assert metrics["dropped"] > 0
+    assert metrics["depth"] == 20 - metrics["dropped"]
+    spool.close()
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import time
+
+from src import startup
+
+
+def test_stages_are_only_recorded_once():
+    startup.reached("test_stage")
+    first = startup.stages()["test_stage"]
+    startup.reached("test_stage", time.time() + 10)
+    assert startup.stages()["test_stage"] == first
+    # measured from when the process started, which was before this test
+    assert 0 < first < time.time() - startup.PROCESS_START + 1
+
+
+def test_first_frame_is_recorded(fake_camera):
+    fake_camera.start()
+    deadline = time.monotonic() + 2
+    while "first_frame" not in startup.stages() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert startup.stages()["first_frame"] > 0
+
+
+def test_outputs_are_imported_on_first_use():
+    # in a fresh interpreter, as other tests will have used the outputs already
+    code = (
+        "import sys\n"
+        "from src import outputs\n"
+        "import src.camera\n"
+        "assert 'scipy' not in sys.modules and 'ffmpeg' not in sys.modules\n"
+        "assert 'requests' not in sys.modules\n"
+        "outputs.MotionDetectionOutput\n"
+        "assert 'scipy' in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,102 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from src import tracing
+
+
+@pytest.fixture()
+def tracer():
+    tracer = tracing.Tracer(capacity=8)
+    tracer.enable()
+    yield tracer
+
+
+def test_spans_are_exported_per_thread(tracer):
+    now = time.monotonic_ns()
+    tracer.add("publish", now - 2_000, now - 1_000, frame_num=3)
+
+    def record():
+        tracer.add("send", now - 500, now)
+
+    thread = threading.Thread(target=record, name="SocketThread")
+    thread.start()
+    thread.join()
+
+    events = tracer.export(seconds=10)["traceEvents"]
+    names = {event["args"]["name"] for event in events if event["ph"] == "M"}
+    spans = [event for event in events if event["ph"] == "X"]
+    assert names == {threading.current_thread().name, "SocketThread"}
+    assert [span["name"] for span in spans] == ["publish", "send"]
+    assert spans[0]["ts"] == (now - 2_000) / 1_000
+    assert spans[0]["dur"] == 1.0
+    assert spans[0]["args"] == {"frame": 3}
+    # spans without a frame number don't claim one
+    assert "args" not in spans[1]
+    assert spans[0]["tid"] != spans[1]["tid"]
+
+
+def test_ring_keeps_most_recent_spans(tracer):
+    now = time.monotonic_ns()
+    for i in range(20):
+        tracer.add("frame", now + i, now + i, frame_num=i)
+    frames = [
+        e["args"]["frame"] for e in tracer.export(seconds=10)["traceEvents"] if e["ph"] == "X"
+    ]
+    assert frames == list(range(12, 20))
+
+    # spans which ended too long ago are left out
+    tracer.add("old", now - 20 * 10**9, now - 20 * 10**9)
+    assert "old" not in [e["name"] for e in tracer.export(seconds=10)["traceEvents"]]
+
+
+def test_capacity_is_rounded_up_to_a_power_of_two(tracer):
+    tracer.add("frame", 1, 2)
+    tracer.enable(capacity=100)
+    assert tracer.capacity == 128
+    # changing the capacity starts afresh
+    assert tracer.stats()["spans"] == 0
+
+
+def test_disabled_tracing_records_nothing():
+    assert not tracing.TRACER.enabled
+    spans = tracing.TRACER.stats()["spans"]
+    start = tracing.start()
+    assert start == 0
+    tracing.end("publish", start)
+    assert tracing.TRACER.stats()["spans"] == spans
+
+
+def test_frames_are_traced_through_the_pipeline(fake_camera):
+    camera = fake_camera
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    camera.configure({"outputs": {"network": {"enabled": True, "socket_port": port}}})
+    tracing.TRACER.enable()
+    try:
+        camera.start()
+        with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+            deadline = time.monotonic() + 1
+            while time.monotonic() < deadline:
+                conn.recv(65536)
+        events = tracing.TRACER.export(seconds=10)["traceEvents"]
+    finally:
+        tracing.TRACER.disable()
+
+    threads = {event["tid"]: event["args"]["name"] for event in events if event["ph"] == "M"}
+    stages = {(threads[e["tid"]], e["name"]) for e in events if e["ph"] == "X"}
+    assert {
+        ("FakeEncoderThread-1", "encoder_write"),
+        ("FakeEncoderThread-1", "publish"),
+        ("NetworkVideoThread", "wakeup"),
+        ("NetworkVideoThread", "process_frame"),
+        ("NetworkSocketThread", "send"),
+    } <= stages
+
+    # a single frame can be followed from the encoder to the socket
+    sent = [e["args"]["frame"] for e in events if e["name"] == "send"]
+    published = {e["args"]["frame"] for e in events if e["name"] == "publish"}
+    assert sent and set(sent) <= published
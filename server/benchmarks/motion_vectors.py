@@ -0,0 +1,72 @@
+"""Measure the cost of decoding, and detecting motion in, the motion vectors streamed by cameras.
+
+Records are built in the same format as the camera's MotionVectorEncoder, from synthetic
+frames in which an object moves across a still scene, and then decoded and run through the
+MotionDetector as MotionVectorClient does:
+
+    $ python -m benchmarks.motion_vectors --resolution 1640x1232 --framerate 30 --cameras 8
+"""
+
+import argparse
+import time
+import zlib
+
+import numpy as np
+
+from src.utils.motion_vectors import FLAG_EMPTY, HEADER, MotionDetector, decode
+
+
+def synthetic_records(width: int, height: int, count: int):
+    """Return records for a scene in which an object crosses the frame for half of the time."""
+    rows, cols = (height + 15) // 16, (width + 15) // 16 + 1
+    size = rows // 5
+    records = []
+    for i in range(count):
+        vectors = np.zeros((rows, cols, 2), dtype=np.int8)
+        if i % (2 * count // 10) < count // 10:
+            x = (i * 2) % (cols - size)
+            vectors[rows // 2 : rows // 2 + size, x : x + size] = (12, -4)
+        if vectors.any():
+            flags, payload = 0, zlib.compress(vectors, 1)
+        else:
+            flags, payload = FLAG_EMPTY, b""
+        header = HEADER.pack(1, flags, rows, cols, i, time.time(), len(payload))
+        records.append((header, payload))
+    return records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="1640x1232")
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--cameras", type=int, default=8)
+    args = parser.parse_args()
+    width, height = map(int, args.resolution.split("x"))
+
+    records = synthetic_records(width, height, args.frames)
+    size = sum(len(header) + len(payload) for header, payload in records)
+
+    start = time.perf_counter_ns()
+    frames = [decode(header, payload) for header, payload in records]
+    decode_us = (time.perf_counter_ns() - start) / len(records) / 1_000
+
+    detector = MotionDetector(sensitivity=10, min_blocks=6, min_frames=6)
+    start = time.perf_counter_ns()
+    events = sum(detector.detect(frame) is not None for frame in frames)
+    detect_us = (time.perf_counter_ns() - start) / len(records) / 1_000
+
+    per_camera = (decode_us + detect_us) * args.framerate / 1_000_000
+    print(
+        f"{len(records)} frames, {size / len(records):,.0f} bytes/frame "
+        f"({size / len(records) * args.framerate * 8 / 1_000:,.1f}kbps per camera)"
+    )
+    print(f"decode {decode_us:.1f}μs/frame, detect {detect_us:.1f}μs/frame, {events} detections")
+    print(
+        f"{per_camera:.2%} of a core per camera at {args.framerate}fps, "
+        f"{per_camera * args.cameras:.2%} for {args.cameras} cameras"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare timelapse payload size and decode time: whole frame groups vs. single key frames.
+
+Previously, the camera sent the final group of pictures in its 30 frame buffer (an SPS header
+plus every frame after it) and the server decoded the whole group in order to keep the last
+frame. Now, the camera sends one access unit (SPS/PPS header plus one IDR frame).
+
+A test stream is encoded with libx264 to stand in for the Pi's encoder:
+
+    $ python -m benchmarks.timelapse_keyframe --resolution 1640x1232 --gop 25
+"""
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import ffmpeg
+
+from src.utils.h264 import keyframe_to_jpeg
+
+# H264 NAL unit types
+NAL_SLICE = 1
+NAL_IDR_SLICE = 5
+NAL_SPS = 7
+NAL_PPS = 8
+
+
+def encode_test_stream(path: Path, resolution: str, framerate: int, gop: int, seconds: int):
+    stream = ffmpeg.input(f"testsrc2=size={resolution}:rate={framerate}", f="lavfi", t=seconds)
+    stream = ffmpeg.output(
+        stream,
+        str(path),
+        vcodec="libx264",
+        pix_fmt="yuv420p",
+        g=gop,
+        bf=0,
+        f="h264",
+        **{"x264-params": "repeat-headers=1"},
+    )
+    ffmpeg.run(stream, cmd=["ffmpeg", "-hide_banner", "-loglevel", "error"], overwrite_output=True)
+
+
+def split_nal_units(data: bytes):
+    """Yield (nal_type, nal_bytes) for each NAL unit in an Annex B stream, incl. start codes."""
+    starts = []
+    i = data.find(b"\x00\x00\x01")
+    while i != -1:
+        # include the leading zero of a 4 byte start code
+        starts.append(i - 1 if i > 0 and data[i - 1] == 0 else i)
+        i = data.find(b"\x00\x00\x01", i + 3)
+    for start, end in zip(starts, starts[1:] + [len(data)]):
+        nal = data[start:end]
+        header_index = nal.index(b"\x00\x00\x01") + 3
+        yield nal[header_index] & 0x1F, nal
+
+
+def split_frames(data: bytes):
+    """Group NAL units into (is_header, is_key_frame, bytes) frames, as the Pi's encoder does."""
+    frames = []
+    pending = b""
+    for nal_type, nal in split_nal_units(data):
+        if nal_type in (NAL_SPS, NAL_PPS):
+            if frames and frames[-1][0]:
+                frames[-1] = (True, False, frames[-1][2] + nal)
+            else:
+                frames.append((True, False, nal))
+        elif nal_type in (NAL_SLICE, NAL_IDR_SLICE):
+            frames.append((False, nal_type == NAL_IDR_SLICE, pending + nal))
+            pending = b""
+        else:
+            # SEI and the like are attached to the following frame
+            pending += nal
+    return frames
+
+
+def frame_group_to_jpeg(frame_group: bytes, num_frames: int) -> bytes:
+    """Decode a whole group of pictures and keep the final frame, as the camera used to."""
+    stream = ffmpeg.input("pipe:", f="h264")
+    stream = ffmpeg.filter(stream, "select", f"eq(n,{num_frames - 1})")
+    stream = ffmpeg.output(stream, "pipe:", vframes=1, f="mjpeg", **{"q:v": 2})
+    return subprocess.run(
+        ffmpeg.compile(stream, cmd=["ffmpeg", "-hide_banner", "-loglevel", "error"]),
+        input=frame_group,
+        capture_output=True,
+        check=True,
+    ).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="1640x1232")
+    parser.add_argument("--framerate", type=int, default=25)
+    parser.add_argument("--gop", type=int, default=25, help="frames between key frames")
+    parser.add_argument("--buffer", type=int, default=30, help="old timelapse buffer length")
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "test.h264"
+        encode_test_stream(path, args.resolution, args.framerate, args.gop, seconds=10)
+        frames = split_frames(path.read_bytes())
+
+    old_payloads, new_payloads = [], []
+    # leave room at the end of the stream for the next key frame after each sample point
+    last_end = len(frames) - args.gop - 1
+    step = max(1, (last_end - args.buffer) // args.samples)
+    for end in range(args.buffer, last_end, step)[: args.samples]:
+        # the old approach: the final group of pictures in a ring buffer ending at this frame
+        buffer = frames[end - args.buffer : end]
+        header_indexes = [i for i, frame in enumerate(buffer) if frame[0]]
+        if not header_indexes:
+            # the old approach had nothing to send if the buffer was shorter than the GOP
+            continue
+        header_index = header_indexes[-1]
+        group = buffer[header_index:]
+        old_payloads.append((b"".join(f[2] for f in group), len(group) - 1))
+
+        # the new approach: the next header + IDR frame in the stream
+        i = next(i for i in range(end, len(frames) - 1) if frames[i][0] and frames[i + 1][1])
+        new_payloads.append(frames[i][2] + frames[i + 1][2])
+
+    def time_decode(fn, payloads):
+        durations = []
+        for payload in payloads:
+            start = time.perf_counter()
+            assert fn(*payload) if isinstance(payload, tuple) else fn(payload)
+            durations.append(time.perf_counter() - start)
+        return statistics.median(durations)
+
+    old_size = statistics.mean(len(p) for p, _ in old_payloads)
+    new_size = statistics.mean(len(p) for p in new_payloads)
+    old_decode = time_decode(frame_group_to_jpeg, old_payloads)
+    new_decode = time_decode(keyframe_to_jpeg, new_payloads)
+
+    print(f"{'':>10} {'payload':>12} {'decode':>10}")
+    print(f"{'old':>10} {old_size / 1e3:10.1f}kB {old_decode * 1e3:8.1f}ms")
+    print(f"{'new':>10} {new_size / 1e3:10.1f}kB {new_decode * 1e3:8.1f}ms")
+    print(f"{'ratio':>10} {old_size / new_size:11.1f}x {old_decode / new_decode:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
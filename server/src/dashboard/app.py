@@ -12,7 +12,7 @@ from sqlalchemy.engine import Engine
 
 from ..settings import load_settings
 from ..utils import sql
-from .utils import TimelapseEncoder, YouTubeMonitor
+from .utils import MotionVectorMonitor, TimelapseEncoder, YouTubeMonitor
 
 # first create and configure the Flask server
 server = Flask(__name__)
@@ -89,4 +89,8 @@ TimelapseEncoder = TimelapseEncoder()
 # register the routes by running the code during import
 from . import routes  # noqa: E402 F401
 
+# create a single application-level monitor class for detecting motion in the motion vectors
+# streamed by cameras. The motion events it detects are only logged, not recorded
+MotionVectorMonitor = MotionVectorMonitor()
+
 app.logger.info("App initialised in %s mode", os.environ["ENV"])
@@ -9,6 +9,7 @@ from flask import request, send_from_directory
 
 from ... import tasks
 from ...models import RegisteredCamera, TimelapseVideo, MotionVideo
+from ...utils.h264 import keyframe_to_image
 from ..app import app, server, sock
 
 
@@ -102,6 +103,30 @@ def save_timelapse_capture():
     return "Capture saved"
 
 
+@server.route("/process-new-timelapse-keyframe", methods=["POST"])
+def process_new_timelapse_keyframe():
+    """Receive, decode and save a timelapse capture sent as a single H264 key frame.
+
+    1 file is provided in the request.files attribute:
+        {
+            "keyframe": werkzeug.FileStorage,  # SPS/PPS header followed by one IDR frame
+        }
+
+    Metadata is provided in the request.form attribute:
+        {
+            "capture_time": iso8601 str,
+        }
+    """
+    data = {
+        "capture": keyframe_to_image(request.files["keyframe"].read()),
+        "capture_time": datetime.datetime.fromisoformat(request.form["capture_time"]),
+        "camera_ip_address": request.remote_addr,
+    }
+    tasks.save_timelapse_capture(data)
+
+    return "Capture saved"
+
+
 @sock.route("/ws")
 def ws(ws):
     import time
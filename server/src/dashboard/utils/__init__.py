@@ -1,4 +1,6 @@
+import collections
 import datetime
+import functools
 import io
 import shutil
 import tempfile
@@ -9,7 +11,7 @@ import dash_bootstrap_components as dbc
 import ffmpeg
 from dash import html
 from PIL import Image
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, RequestException
 from sqlalchemy import func
 
 
@@ -202,6 +204,124 @@ class YouTubeMonitor(threading.Thread):
             time.sleep(5)
 
 
+class MotionVectorMonitor(threading.Thread):
+    """Helper class for detecting motion in the motion vectors streamed by cameras.
+
+    This class runs a background thread which periodically checks which registered cameras have
+    their motion vectors output enabled, and keeps a MotionVectorClient connected to each of
+    them, detecting motion with the camera's own motion detection settings.
+
+    Each motion event detected is logged and kept in `events`, but nothing else: no video is
+    recorded for it, unlike the events detected by a camera's own motion output, so this is not
+    yet a replacement for running motion detection on the camera.
+    """
+
+    CHECK_INTERVAL = 30
+    # how long to wait for a camera's settings, so that one unresponsive camera can't hold up
+    # the others
+    CONFIG_TIMEOUT = 5
+    # the number of the most recent motion events to keep
+    MAX_EVENTS = 100
+
+    def __init__(self):
+        super().__init__(daemon=True, name="MotionVectorMonitor")
+        # camera_id -> ((address, detection settings), MotionVectorClient)
+        self.clients = {}
+        # the most recent motion events, across all cameras, oldest first
+        self.events = collections.deque(maxlen=self.MAX_EVENTS)
+        # camera name -> the event in progress, or which ended most recently
+        self.last_event = {}
+        self.start()
+
+    def run(self):
+        from ...models import RegisteredCamera
+        from ..app import app
+
+        app.logger.info("Motion vector monitoring thread running in background.")
+        while True:
+            registered = set()
+            for cam in RegisteredCamera.query.all():
+                registered.add(cam.camera_id)
+                try:
+                    wanted = self.wanted(cam)
+                except (RequestException, KeyError, ValueError) as e:
+                    # the camera is offline, still starting up, or otherwise unable to give its
+                    # settings. Any client already connected to it will reconnect once it is back
+                    app.logger.debug("Unable to get the settings of %s: %r", cam.name, e)
+                    continue
+                self.update(cam.camera_id, cam.name, wanted)
+
+            # stop streaming from cameras which have since been removed
+            for camera_id in set(self.clients) - registered:
+                self.update(camera_id, None, None)
+            time.sleep(self.CHECK_INTERVAL)
+
+    def wanted(self, cam):
+        """Return the address of the camera's motion vector stream along with its detection
+        settings, or None if it isn't streaming its motion vectors."""
+        config = cam.get_config(timeout=self.CONFIG_TIMEOUT)
+        address = cam.motion_vector_stream_address(config)
+        if address is None:
+            return None
+        motion_config = config["outputs"]["motion"]
+        settings = (
+            motion_config["sensitivity"],
+            motion_config["min_blocks"],
+            motion_config["min_frames"],
+        )
+        return address, settings
+
+    def update(self, camera_id, name, wanted):
+        """Connect to, reconnect to or disconnect from a camera, as `wanted`, which is None or
+        the address of the camera's motion vector stream along with its detection settings."""
+        from ...utils.motion_vectors import MotionDetector, MotionVectorClient
+        from ..app import app
+
+        current = self.clients.get(camera_id)
+        if current is not None and current[0] == wanted:
+            return
+        if current is not None:
+            app.logger.info("Disconnecting from the motion vectors of camera %s", camera_id)
+            current[1].close()
+            del self.clients[camera_id]
+        if wanted is not None:
+            address, settings = wanted
+            app.logger.info(
+                "Connecting to the motion vectors of %s at %s:%s", name, address[0], address[1]
+            )
+            client = MotionVectorClient(
+                address, MotionDetector(*settings), functools.partial(self.on_motion, name)
+            )
+            client.start()
+            self.clients[camera_id] = (wanted, client)
+
+    def on_motion(self, name, frame, boxes):
+        from ..app import app
+
+        timestamp = datetime.datetime.fromtimestamp(frame.timestamp)
+        # motion is detected in every frame of an event, so a frame following straight on from
+        # the last one with motion extends its event, rather than starting another
+        event = self.last_event.get(name)
+        if event is not None and event["last_frame_num"] == frame.frame_num - 1:
+            event["end"] = timestamp
+            event["frames"] += 1
+            event["last_frame_num"] = frame.frame_num
+            return
+
+        event = {
+            "camera": name,
+            "start": timestamp,
+            "end": timestamp,
+            "frames": 1,
+            "last_frame_num": frame.frame_num,
+            # the areas of motion in the first frame of the event
+            "boxes": boxes,
+        }
+        self.last_event[name] = event
+        self.events.append(event)
+        app.logger.info("Motion detected by %s at %s: %s", name, timestamp, boxes)
+
+
 def FolderRow(label, folders):
     return [
         dbc.Row(dbc.Col(html.H5(label))),
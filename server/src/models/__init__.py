@@ -94,9 +94,14 @@ class RegisteredCamera(db.Model):
             return data_dir / sub_dir
         return data_dir
 
-    def get_config(self):
-        """Return the configuration settings of the camera client."""
-        return requests.get(f"{self.client_url}/config").json()
+    def get_config(self, timeout=None):
+        """Return the configuration settings of the camera client.
+
+        Raises requests.HTTPError if the camera can't give them, e.g. whilst it is starting up.
+        """
+        response = requests.get(f"{self.client_url}/config", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
 
     @property
     def client_url(self):
@@ -109,6 +114,14 @@ class RegisteredCamera(db.Model):
         conf = self.get_config()
         return f"tcp://{self.ip_address}:{conf['outputs']['network']['socket_port']}"
 
+    def motion_vector_stream_address(self, config):
+        """Return the (ip, port) through which the camera streams its motion vectors, if any,
+        given the camera's configuration settings."""
+        conf = config["outputs"].get("motion_vectors", {})
+        if not conf.get("enabled"):
+            return None
+        return self.ip_address, conf["socket_port"]
+
     @property
     def dir_name(self):
         return "_".join(self.name.lower().split())
@@ -11,6 +11,7 @@ from PIL import Image
 
 from ..models import MotionVideo, RegisteredCamera, TimelapseImage
 from ..utils import run_in_background_process, run_in_background_thread
+from ..utils.h264 import measured_framerate, parse_sei_metadata
 
 
 class MotionEvent:
@@ -18,7 +19,7 @@ class MotionEvent:
         self,
         before_video: io.BytesIO,
         after_video: io.BytesIO,
-        framerate: int,
+        framerate: float,
     ):
         self.before_video = before_video
         self.after_video = after_video
@@ -74,8 +75,18 @@ def _process_motion_event(files, metadata):
         files["trigger_image"],
     )
 
+    # cameras embed the capture time of every frame in the stream, which tells us the rate at
+    # which the frames were actually captured, rather than the rate that was configured
+    frame_metadata = parse_sei_metadata(before.getbuffer()) + parse_sei_metadata(after.getbuffer())
+    framerate = measured_framerate(frame_metadata) or metadata["framerate"]
+    if frame_metadata:
+        print(
+            f"Motion video spans {frame_metadata[0].timestamp} to {frame_metadata[-1].timestamp}, "
+            f"captured at {framerate:.2f}fps (configured {metadata['framerate']}fps)"
+        )
+
     # produce and save the the video and associated images
-    motion_event = MotionEvent(before, after, metadata["framerate"])
+    motion_event = MotionEvent(before, after, framerate)
     motion_event.concat_video_parts()
 
     cam = RegisteredCamera.from_ip_address(metadata["camera_ip_address"])
@@ -0,0 +1,125 @@
+import datetime
+import io
+import re
+import struct
+import subprocess
+import typing as t
+import uuid
+
+import ffmpeg
+from PIL import Image
+
+
+def keyframe_to_jpeg(data: bytes, quality: int = 2) -> bytes:
+    """Decode a single H264 access unit (SPS/PPS header and one IDR frame) to a JPEG.
+
+    As there is only one frame to decode, there is no need to read and discard a whole group of
+    pictures, which makes this considerably cheaper than decoding a section of the video stream.
+    """
+    stream = ffmpeg.input("pipe:", f="h264")
+    stream = ffmpeg.output(stream, "pipe:", vframes=1, f="mjpeg", **{"q:v": quality})
+    proc = subprocess.run(
+        ffmpeg.compile(stream, cmd=["ffmpeg", "-hide_banner", "-loglevel", "error"]),
+        input=data,
+        capture_output=True,
+        check=True,
+    )
+    if not proc.stdout:
+        raise ValueError("Unable to decode key frame")
+    return proc.stdout
+
+
+def keyframe_to_image(data: bytes) -> Image.Image:
+    """Decode a single H264 access unit to a Pillow image."""
+    return Image.open(io.BytesIO(keyframe_to_jpeg(data)))
+
+
+# identifies the camera's capture metadata amongst any other SEI messages. This must match
+# METADATA_UUID in camera/src/sei.py
+SEI_METADATA_UUID = uuid.UUID("6d2f6f0e-9a53-4c8e-8f3c-70696d616e31")
+
+# version, wall-clock time in microseconds since the epoch, frame number, flags
+_SEI_METADATA_PAYLOAD = struct.Struct(">BQIB")
+_SEI_FLAG_MOTION = 0x01
+_START_CODE = re.compile(b"\x00\x00\x01")
+_EMULATION_PREVENTION = re.compile(b"\x00\x00\x03")
+
+
+class FrameMetadata(t.NamedTuple):
+    """The capture metadata embedded by the camera ahead of a single frame."""
+
+    timestamp: datetime.datetime
+    frame_num: int
+    motion: bool
+
+
+def iter_nal_units(data: bytes) -> t.Iterator[bytes]:
+    """Yield each NAL unit, excluding its start code, from an Annex B H264 stream."""
+    starts = [match.end() for match in _START_CODE.finditer(data)]
+    for start, next_start in zip(starts, starts[1:] + [len(data) + 3]):
+        # a 4 byte start code leaves a trailing zero on the preceding unit, which is harmless
+        yield data[start : next_start - 3]
+
+
+def _sei_messages(rbsp: bytes) -> t.Iterator[t.Tuple[int, bytes]]:
+    """Yield the (payload type, payload) of each message in an SEI NAL unit's RBSP."""
+    pos = 0
+    # stop at the rbsp trailing bits
+    while pos < len(rbsp) and rbsp[pos] != 0x80:
+        payload_type = payload_size = 0
+        while rbsp[pos] == 0xFF:
+            payload_type += 255
+            pos += 1
+        payload_type += rbsp[pos]
+        pos += 1
+        while rbsp[pos] == 0xFF:
+            payload_size += 255
+            pos += 1
+        payload_size += rbsp[pos]
+        pos += 1
+        yield payload_type, rbsp[pos : pos + payload_size]
+        pos += payload_size
+
+
+def parse_sei_metadata(data: bytes) -> t.List[FrameMetadata]:
+    """Return the capture metadata of every frame in an H264 stream which carries it.
+
+    Streams from cameras which don't embed metadata, and any other SEI messages, are ignored.
+    """
+    metadata = []
+    for nal_unit in iter_nal_units(bytes(data)):
+        if not nal_unit or nal_unit[0] & 0x1F != 6:
+            continue
+        rbsp = _EMULATION_PREVENTION.sub(b"\x00\x00", nal_unit[1:])
+        try:
+            for payload_type, payload in _sei_messages(rbsp):
+                # user data unregistered
+                if payload_type != 5 or payload[:16] != SEI_METADATA_UUID.bytes:
+                    continue
+                version, timestamp_us, frame_num, flags = _SEI_METADATA_PAYLOAD.unpack_from(
+                    payload, 16
+                )
+                if version != 1:
+                    continue
+                metadata.append(
+                    FrameMetadata(
+                        timestamp=datetime.datetime.fromtimestamp(timestamp_us / 1_000_000),
+                        frame_num=frame_num,
+                        motion=bool(flags & _SEI_FLAG_MOTION),
+                    )
+                )
+        except (IndexError, struct.error):
+            # a truncated or malformed message
+            continue
+    return metadata
+
+
+def measured_framerate(metadata: t.Sequence[FrameMetadata]) -> t.Optional[float]:
+    """Return the framerate at which the frames were actually captured, if it can be known."""
+    if len(metadata) < 2:
+        return None
+    elapsed = (metadata[-1].timestamp - metadata[0].timestamp).total_seconds()
+    frames = metadata[-1].frame_num - metadata[0].frame_num
+    if elapsed <= 0 or frames <= 0:
+        return None
+    return frames / elapsed
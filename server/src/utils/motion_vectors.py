@@ -0,0 +1,180 @@
+"""Decoding of, and motion detection on, the motion vectors streamed by cameras.
+
+Cameras which are too underpowered to detect motion themselves stream their motion vectors
+instead, encoded by camera/src/motion_vectors.py. Each record is a fixed size header followed
+by a zlib compressed payload of interleaved int8 x/y pairs, or no payload at all if the frame
+had no motion vectors worth sending.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import typing as t
+import zlib
+
+import numpy as np
+from scipy import ndimage
+
+# version, flags, rows, columns, frame number, timestamp, payload length
+HEADER = struct.Struct(">BBHHIdI")
+FLAG_EMPTY = 0x01
+
+
+class MotionVectorFrame(t.NamedTuple):
+    frame_num: int
+    timestamp: float
+    rows: int
+    cols: int
+    # int8 array of shape (rows, cols, 2) holding the x and y of each vector, or None if every
+    # vector was zero
+    vectors: t.Optional[np.ndarray]
+
+
+def decode(header: bytes, payload: bytes) -> MotionVectorFrame:
+    """Decode a single record, given its header and payload."""
+    version, flags, rows, cols, frame_num, timestamp, _ = HEADER.unpack(header)
+    if version != 1:
+        raise ValueError(f"Unsupported motion vector record version {version}")
+    vectors = None
+    if not flags & FLAG_EMPTY:
+        vectors = np.frombuffer(zlib.decompress(payload), dtype=np.int8).reshape(rows, cols, 2)
+    return MotionVectorFrame(frame_num, timestamp, rows, cols, vectors)
+
+
+def _read_exactly(conn: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while view:
+        n = conn.recv_into(view)
+        if not n:
+            raise ConnectionError("Motion vector stream closed")
+        view = view[n:]
+    return bytes(buf)
+
+
+def read_frames(conn: socket.socket) -> t.Iterator[MotionVectorFrame]:
+    """Yield each frame received on a connection to a camera, until it is closed."""
+    while True:
+        try:
+            header = _read_exactly(conn, HEADER.size)
+            payload = _read_exactly(conn, HEADER.unpack(header)[-1])
+        except ConnectionError:
+            return
+        yield decode(header, payload)
+
+
+# (x0, y0, x1, y1), in pixels
+Box = t.Tuple[int, int, int, int]
+
+
+def bounding_boxes(mask: np.ndarray, min_blocks: int) -> t.List[Box]:
+    """Return a box around each distinct area of motion with at least `min_blocks` blocks.
+
+    As with the camera's `get_bounding_boxes`, blocks are part of the same area if they are
+    adjacent in any direction, and boxes fully enclosed within another box are removed.
+    """
+    labels, _ = ndimage.label(mask, structure=np.ones((3, 3)))
+    boxes = [
+        (x.start * 16, y.start * 16, x.stop * 16, y.stop * 16)
+        for y, x in ndimage.find_objects(labels)
+        if mask[y, x].sum() >= min_blocks
+    ]
+    return [
+        box
+        for box in boxes
+        if not any(
+            box[0] > other[0] and box[1] > other[1] and box[2] < other[2] and box[3] < other[3]
+            for other in boxes
+        )
+    ]
+
+
+class MotionDetector:
+    """Server side equivalent of the camera's `DetectMotion`.
+
+    Motion is detected once there is an area of at least `min_blocks` adjacent vectors, each at
+    least `sensitivity` long, in each of `min_frames` consecutive frames. As on the camera, it
+    then continues to be detected in every frame with such an area, until there is a frame
+    without one.
+    """
+
+    def __init__(self, sensitivity: int, min_blocks: int, min_frames: int):
+        self.sensitivity = sensitivity
+        self.min_blocks = min_blocks
+        self.min_frames = min_frames
+        self._consecutive_motion_frames = 0
+
+    def detect(self, frame: MotionVectorFrame) -> t.Optional[t.List[Box]]:
+        """Return the boxes around each area of motion if motion is detected, otherwise None."""
+        boxes = None
+        if frame.vectors is not None:
+            # squared magnitudes, in a type which can hold them: (-128, -128) would overflow an
+            # int16
+            x = frame.vectors[..., 0].astype(np.int32)
+            y = frame.vectors[..., 1].astype(np.int32)
+            squared = x * x
+            squared += y * y
+            mask = squared >= self.sensitivity**2
+            if mask.sum() >= self.min_blocks:
+                boxes = bounding_boxes(mask, self.min_blocks)
+        if not boxes:
+            self._consecutive_motion_frames = 0
+            return None
+        if self._consecutive_motion_frames < self.min_frames - 1:
+            self._consecutive_motion_frames += 1
+            return None
+        return boxes
+
+
+class MotionVectorClient(threading.Thread):
+    """Read the motion vectors streamed by a camera, and detect motion in them.
+
+    `on_motion` is called with each frame in which motion is detected, and the boxes around the
+    areas in which it was found.
+    """
+
+    RECONNECT_INTERVAL = 5
+
+    def __init__(
+        self,
+        address: t.Tuple[str, int],
+        detector: MotionDetector,
+        on_motion: t.Callable[[MotionVectorFrame, t.List[Box]], None],
+    ):
+        super().__init__(daemon=True, name=f"MotionVectorClient-{address[0]}")
+        self.address = address
+        self.detector = detector
+        self.on_motion = on_motion
+        self.frames = 0
+        self._closed = threading.Event()
+        self._conn: t.Optional[socket.socket] = None
+
+    def run(self) -> None:
+        while not self._closed.is_set():
+            try:
+                self._conn = socket.create_connection(self.address, timeout=10)
+            except OSError:
+                logging.warning("Unable to connect to motion vector stream at %s:%d", *self.address)
+                self._closed.wait(self.RECONNECT_INTERVAL)
+                continue
+            with self._conn:
+                try:
+                    for frame in read_frames(self._conn):
+                        self.frames += 1
+                        boxes = self.detector.detect(frame)
+                        if boxes is not None:
+                            self.on_motion(frame, boxes)
+                except OSError:
+                    # includes timeouts, should the camera stop sending
+                    pass
+            self._closed.wait(self.RECONNECT_INTERVAL)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._conn is not None:
+            try:
+                self._conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.join()